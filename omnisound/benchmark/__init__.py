@@ -0,0 +1,15 @@
+# Copyright 2020 Mark S. Weiss
+
+from omnisound.src.note.adapter.note import MakeNoteConfig
+import omnisound.src.note.adapter.csound_note as csound_note
+
+
+def make_note_config() -> MakeNoteConfig:
+    """The MakeNoteConfig for CSound notes, with their attributes and casts, that the benchmarks build their notes
+       from"""
+    return MakeNoteConfig(cls_name=csound_note.CLASS_NAME,
+                          num_attributes=csound_note.NUM_ATTRIBUTES,
+                          make_note=csound_note.make_note,
+                          pitch_for_key=csound_note.pitch_for_key,
+                          attr_name_idx_map=csound_note.ATTR_NAME_IDX_MAP,
+                          attr_val_cast_map=csound_note.ATTR_VAL_CAST_MAP)
@@ -0,0 +1,47 @@
+# Copyright 2020 Mark S. Weiss
+
+# TO RUN:  python3 -m omnisound.benchmark.import_time_benchmark --module omnisound.src.container.song --top 10
+
+from optparse import OptionParser
+import subprocess
+import sys
+from typing import List, Tuple
+
+DEFAULT_MODULE = 'omnisound.src.container.song'
+DEFAULT_TOP = 10
+DEFAULT_NUM_RUNS = 5
+
+
+def import_times(module_name: str) -> List[Tuple[str, int, int]]:
+    """Imports `module_name` in a new interpreter with `-X importtime` and returns (module, self usecs,
+       cumulative usecs) for each module it imported, in the order the imports finished"""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module_name}'],
+                            capture_output=True, text=True, check=True)
+    times = []
+    # Lines are "import time: <self us> | <cumulative us> | <indented module name>", after a header line
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        self_usecs, cumulative_usecs, name = line[len('import time:'):].split('|')
+        if not self_usecs.strip().isdigit():
+            continue
+        times.append((name.strip(), int(self_usecs), int(cumulative_usecs)))
+    return times
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-m', '--module', dest='module', type='string', default=DEFAULT_MODULE)
+    parser.add_option('-t', '--top', dest='top', type='int', default=DEFAULT_TOP)
+    parser.add_option('-r', '--num-runs', dest='num_runs', type='int', default=DEFAULT_NUM_RUNS)
+    options, _ = parser.parse_args()
+
+    # The module being imported finishes last, so its cumulative time is the time of the whole import
+    total_usecs = min(import_times(options.module)[-1][2] for _ in range(options.num_runs))
+    times = import_times(options.module)
+    slowest = sorted(times, key=lambda t: t[1], reverse=True)[:options.top]
+
+    print(f'import {options.module}: {total_usecs / 1000:.1f} msecs, best of {options.num_runs}')
+    print(f'  {len(times)} modules imported, slowest by self time:')
+    for name, self_usecs, cumulative_usecs in slowest:
+        print(f'  {name:<60} {self_usecs / 1000:>8.1f} msecs  {cumulative_usecs / 1000:>8.1f} msecs cumulative')
@@ -0,0 +1,46 @@
+# Copyright 2020 Mark S. Weiss
+
+# TO RUN:  python3 -m omnisound.benchmark.note_iteration_benchmark --num-notes 100000
+
+from optparse import OptionParser
+from timeit import timeit
+
+from omnisound.benchmark import make_note_config
+from omnisound.src.container.note_sequence import NoteSequence
+import omnisound.src.note.adapter.csound_note as csound_note
+
+DEFAULT_NUM_NOTES = 100000
+DEFAULT_NUM_RUNS = 3
+
+
+def _make_note_uncached(note_attr_vals, attr_name_idx_map, attr_val_cast_map=None):
+    """Builds a new Note class for every note, which is what `make_note()` did before Note classes were
+       registered per schema. This is the baseline the registry is measured against."""
+    cls = csound_note._make_cls(dict(attr_name_idx_map), dict(attr_val_cast_map))
+    return cls(note_attr_vals)
+
+
+def iterate(note_sequence: NoteSequence) -> float:
+    total = 0.0
+    for note in note_sequence:
+        total += note.pitch
+    return total
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-n', '--num-notes', dest='num_notes', type='int', default=DEFAULT_NUM_NOTES)
+    parser.add_option('-r', '--num-runs', dest='num_runs', type='int', default=DEFAULT_NUM_RUNS)
+    options, _ = parser.parse_args()
+
+    mn = make_note_config()
+    seq = NoteSequence(num_notes=options.num_notes, mn=mn)
+
+    cached_secs = timeit(lambda: iterate(seq), number=options.num_runs) / options.num_runs
+    mn.make_note = _make_note_uncached
+    uncached_secs = timeit(lambda: iterate(seq), number=options.num_runs) / options.num_runs
+
+    print(f'iterate {options.num_notes} notes')
+    print(f'  class per note:   {uncached_secs:.3f} secs')
+    print(f'  class per schema: {cached_secs:.3f} secs')
+    print(f'  speedup:          {uncached_secs / cached_secs:.1f}x')
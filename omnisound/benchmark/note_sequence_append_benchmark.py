@@ -0,0 +1,66 @@
+# Copyright 2020 Mark S. Weiss
+
+# TO RUN:  python3 -m omnisound.benchmark.note_sequence_append_benchmark --num-notes 1000000
+
+from optparse import OptionParser
+from timeit import timeit
+
+from numpy import concatenate as np_concatenate
+
+from omnisound.benchmark import make_note_config
+from omnisound.src.container.note_sequence import NoteSequence
+from omnisound.src.note.adapter.note import MakeNoteConfig
+
+DEFAULT_NUM_NOTES = 1000000
+DEFAULT_EXTEND_SIZE = 16
+DEFAULT_NUM_RUNS = 1
+
+
+def build_by_append(mn: MakeNoteConfig, num_notes: int) -> NoteSequence:
+    note = NoteSequence.new_note(mn)
+    seq = NoteSequence(num_notes=0, mn=mn)
+    for _ in range(num_notes):
+        seq.append(note)
+    return seq
+
+
+def build_by_extend(mn: MakeNoteConfig, num_notes: int, extend_size: int) -> NoteSequence:
+    block = NoteSequence(num_notes=extend_size, mn=mn)
+    seq = NoteSequence(num_notes=0, mn=mn)
+    for _ in range(num_notes // extend_size):
+        seq.extend(block)
+    return seq
+
+
+def build_by_concatenate(mn: MakeNoteConfig, num_notes: int, extend_size: int) -> NoteSequence:
+    """Reallocates and copies the whole sequence on each extend, which is what `extend()` did before storage
+       had spare capacity. This is the baseline amortized growth is measured against. It is quadratic, so it
+       is run over fewer notes and the time is scaled up."""
+    block = NoteSequence(num_notes=extend_size, mn=mn)
+    seq = NoteSequence(num_notes=0, mn=mn)
+    for _ in range(num_notes // extend_size):
+        seq.note_attr_vals = np_concatenate((seq.note_attr_vals, block.note_attr_vals))
+    return seq
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-n', '--num-notes', dest='num_notes', type='int', default=DEFAULT_NUM_NOTES)
+    parser.add_option('-e', '--extend-size', dest='extend_size', type='int', default=DEFAULT_EXTEND_SIZE)
+    parser.add_option('-r', '--num-runs', dest='num_runs', type='int', default=DEFAULT_NUM_RUNS)
+    options, _ = parser.parse_args()
+
+    mn = make_note_config()
+    append_secs = timeit(lambda: build_by_append(mn, options.num_notes),
+                         number=options.num_runs) / options.num_runs
+    extend_secs = timeit(lambda: build_by_extend(mn, options.num_notes, options.extend_size),
+                         number=options.num_runs) / options.num_runs
+    # Concatenating is O(N^2), so time a tenth of the notes and scale by 100 to estimate the full run
+    baseline_num_notes = options.num_notes // 10
+    concatenate_secs = 100 * timeit(lambda: build_by_concatenate(mn, baseline_num_notes, options.extend_size),
+                                    number=options.num_runs) / options.num_runs
+
+    print(f'build a sequence of {options.num_notes} notes')
+    print(f'  append:                          {append_secs:.3f} secs')
+    print(f'  extend by {options.extend_size:<5}                  {extend_secs:.3f} secs')
+    print(f'  extend, reallocating (estimate): {concatenate_secs:.3f} secs')
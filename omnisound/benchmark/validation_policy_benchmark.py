@@ -0,0 +1,44 @@
+# Copyright 2020 Mark S. Weiss
+
+# TO RUN:  python3 -m omnisound.benchmark.validation_policy_benchmark --num-notes 100000
+
+from optparse import OptionParser
+from timeit import timeit
+
+from omnisound.benchmark import make_note_config
+from omnisound.src.container.measure import Measure
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.utils.validation_utils import validation_policy, ValidationPolicy
+
+DEFAULT_NUM_NOTES = 100000
+DEFAULT_NUM_RUNS = 3
+
+
+def iterate_and_set(measure: Measure):
+    """Reads and writes an attribute of each note from user code. Under BOUNDARY each write is still validated."""
+    for note in measure:
+        note.amplitude = note.amplitude + 1.0
+
+
+def transpose(measure: Measure):
+    """One call into the library, which then updates every note internally"""
+    measure.transpose(1)
+
+
+if __name__ == '__main__':
+    parser = OptionParser()
+    parser.add_option('-n', '--num-notes', dest='num_notes', type='int', default=DEFAULT_NUM_NOTES)
+    parser.add_option('-r', '--num-runs', dest='num_runs', type='int', default=DEFAULT_NUM_RUNS)
+    options, _ = parser.parse_args()
+
+    measure = Measure(meter=Meter(beat_note_dur=NoteDur.QUARTER, beats_per_measure=4),
+                      num_notes=options.num_notes, mn=make_note_config())
+
+    print(f'{options.num_notes} notes')
+    print(f'  {"policy":<10} {"iterate and set":>16} {"transpose":>12}')
+    for policy in ValidationPolicy:
+        with validation_policy(policy):
+            iterate_and_set_secs = timeit(lambda: iterate_and_set(measure),
+                                          number=options.num_runs) / options.num_runs
+            transpose_secs = timeit(lambda: transpose(measure), number=options.num_runs) / options.num_runs
+        print(f'  {policy.value:<10} {iterate_and_set_secs:>11.3f} secs {transpose_secs:>7.3f} secs')
@@ -4,18 +4,21 @@
 #  See implementation in mingus https://bspaans.github.io/python-mingus/doc/wiki/tutorialBarModule.html
 # TODO FEATURE ChordSequence, i.e. Progressions
 
+from contextlib import contextmanager
 from copy import copy
-from typing import Any, List, Tuple
+from typing import Any, Iterator, List, Optional, Tuple
 
-from numpy import copy as np_copy
-import pytest
+from numpy import all as np_all, argsort as np_argsort, array as np_array, concatenate as np_concatenate, \
+    diff as np_diff, memmap as np_memmap, repeat as np_repeat, searchsorted as np_searchsorted
 
-from omnisound.src.note.adapter.note import as_list, MakeNoteConfig, START_I
+from omnisound.src.note.adapter.note import MakeNoteConfig, START_I
 from omnisound.src.note.adapter.performance_attrs import PerformanceAttrs
 from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.modifier.meter import Meter, NoteDur
 from omnisound.src.modifier.swing import Swing
-from omnisound.src.utils.validation_utils import validate_optional_types, validate_type, validate_types
+from omnisound.src.utils.math_utils import approx_equal
+from omnisound.src.utils.validation_utils import trusted, validate_optional_types, validate_type, \
+    validate_type_choice, validate_types
 
 
 class MeasureSwingNotEnabledException(Exception):
@@ -46,10 +49,14 @@ class Measure(NoteSequence):
                  swing: Swing = None,
                  num_notes: int = None,
                  mn: MakeNoteConfig = None,
-                 performance_attrs: PerformanceAttrs = None):
+                 performance_attrs: PerformanceAttrs = None,
+                 storage: Optional[np_memmap] = None):
         validate_optional_types(('meter', meter, Meter), ('swing', swing, Swing),
                                 ('performance_attrs', performance_attrs, PerformanceAttrs))
-        super(Measure, self).__init__(num_notes=num_notes, mn=mn)
+        super(Measure, self).__init__(num_notes=num_notes, mn=mn, storage=storage)
+
+        # Support deferring sorting notes by start until the end of a block of edits, see `bulk_edit()`
+        self._bulk_edit_depth = 0
 
         # TODO Enforce duration of meter bpm and tempo and add unit test coverage, currently the onus is on
         #  the caller to put correct duration in note_config, as that is what is used to create notes, ignoring tempo
@@ -58,6 +65,9 @@ class Measure(NoteSequence):
         self._sort_notes_by_start_time()
 
         self.meter = meter or copy(Measure.DEFAULT_METER)
+        # The tempo the notes are timed at. The Meter can be shared with other Measures that are retimed without this
+        #  one, so this is kept on the Measure, see `set_tempo_for_measures()`.
+        self._tempo_qpm = self.meter.tempo_qpm
         self.swing = swing
         self.num_notes = num_notes or 0
         self.performance_attrs = performance_attrs
@@ -68,19 +78,55 @@ class Measure(NoteSequence):
         self.next_note_start = 0.0
         self.max_duration = self.meter.beats_per_measure * self.meter.beat_note_dur_secs
 
+    def _is_sorted_by_start_time(self) -> bool:
+        # Read without copying notes shared with a copy of this Measure, which are only copied if they are sorted
+        return bool(np_all(np_diff(self._notes_view()[:, START_I]) >= 0))
+
     def _sort_notes_by_start_time(self):
         # Sort notes by start time to manage adding on beat
         # The underlying NoteSequence stores the notes in a numpy array, which is a fixed-order data structure.
-        # So we compute an ordered array mapping note start times to their index in the underlying array, then
-        #  swap the values into the right indexes so the Notes in the underlying array are in sorted order
-        # TODO NUMPY COPY AND SORT AND COPY
-        sorted_notes_attr_vals = [as_list(note) for note in self]
-        sorted_notes_attr_vals.sort(key=lambda x: x[START_I])
-        # Now walk the dict of copied attributes, and write them back into the underlying notes at each index
-        for i, sorted_note_attr_vals in enumerate(sorted_notes_attr_vals):
-            note = self[i]
-            for j in range(len(sorted_note_attr_vals)):
-                note.note_attr_vals[j] = sorted_note_attr_vals[j]
+        # So we compute the order of the rows sorted by the start column and reorder all rows with one copy.
+        # The sort is stable so notes with the same start stay in the order they were added.
+        if self._bulk_edit_depth:
+            return
+        if self._is_sorted_by_start_time():
+            return
+        note_attr_vals = self._writable_notes_view()
+        note_attr_vals[:] = note_attr_vals[np_argsort(note_attr_vals[:, START_I], kind='stable')]
+
+    def _insert_sorted(self, note: Any) -> 'Measure':
+        """Inserts `note` after all notes with a start <= its start, so the measure stays sorted without sorting it.
+           Falls back to appending and sorting if the notes aren't sorted, e.g. because the caller set a note start
+           directly, or if sorting is deferred by `bulk_edit()`.
+        """
+        if self._bulk_edit_depth or not self._is_sorted_by_start_time():
+            super(Measure, self).append(note)
+            self._sort_notes_by_start_time()
+            return self
+        index = int(np_searchsorted(self._notes_view()[:, START_I], note.start, side='right'))
+        super(Measure, self).insert(index, note)
+        return self
+
+    @contextmanager
+    def bulk_edit(self) -> Iterator['Measure']:
+        """Context manager that defers keeping the notes sorted by start until the block exits, and then sorts them
+           once. Use when adding or editing many notes, e.g.:
+
+               with measure.bulk_edit():
+                   for note in notes:
+                       measure.append(note)
+
+           Inside the block notes are in the order they were added, so index access doesn't reflect start order.
+           Notes are also sorted on exit if starts were set directly on notes in the block. Blocks can be nested,
+           notes are sorted when the outermost block exits.
+        """
+        self._bulk_edit_depth += 1
+        try:
+            yield self
+        finally:
+            self._bulk_edit_depth -= 1
+            if not self._bulk_edit_depth:
+                self._sort_notes_by_start_time()
 
     # Beat state management
     def reset_current_beat(self):
@@ -122,13 +168,14 @@ class Measure(NoteSequence):
             raise ValueError(f'Sequence `to_add` must have a number of notes <= to the number of beats per measure')
 
         # Now iterate the beats per measure and assign each note in note_list to the next start time on the beat
-        for i, beat_start_time in enumerate(self.meter.beat_start_times_secs):
-            # There might be fewer notes being added than beats per measure
-            if i == len(to_add):
-                break
-            to_add[i].start = beat_start_time
+        with trusted():
+            for i, beat_start_time in enumerate(self.meter.beat_start_times_secs):
+                # There might be fewer notes being added than beats per measure
+                if i == len(to_add):
+                    break
+                to_add[i].start = beat_start_time
 
-        self.extend(to_add)
+            self.extend(to_add)
 
         return self
     # /Adding notes in sequence on the beat
@@ -136,15 +183,47 @@ class Measure(NoteSequence):
     # Updating Tempo and resetting note start and duration
     @property
     def tempo(self):
-        return self.meter.tempo
+        return self._tempo_qpm
 
     @tempo.setter
     def tempo(self, tempo: int):
-        self.meter.tempo = tempo
-        for note in self:
-            note.start *= (Measure.UNIT_TEMPO_QPM / tempo)
-            note.duration *= (Measure.UNIT_TEMPO_QPM / tempo)
-        self._sort_notes_by_start_time()
+        Measure.set_tempo_for_measures([self], tempo)
+
+    @staticmethod
+    def set_tempo_for_measures(measures: List['Measure'], tempo: int):
+        """Retimes all the notes in all of `measures` to `tempo`. Each note's start and duration is scaled by the
+           ratio of its measure's current tempo to the new tempo, so setting the tempo again doesn't compound, and the
+           start and duration columns of all the measures are scaled at once. Then each distinct Meter of the
+           measures is set to the new tempo once, even if it is shared by many measures.
+
+           Each measure's current tempo is the tempo its notes were last timed at, which is kept on the measure, not
+           read from its Meter. So a measure sharing a Meter with measures already retimed is still retimed.
+
+           Scaling by a positive factor doesn't change the order of the notes, so the measures aren't re-sorted.
+        """
+        validate_type_choice('tempo', tempo, (float, int))
+        if tempo <= 0:
+            raise ValueError(f'`tempo` must be > 0, tempo: {tempo}')
+        # A measure can be in more than one track or section, but is only retimed once
+        measures = list({id(measure): measure for measure in measures}.values())
+        if not measures:
+            return
+
+        scales = np_array([measure._tempo_qpm / tempo for measure in measures], dtype=float)
+        start_views, note_counts = NoteSequence.column_views_for_sequences(measures, 'start', retained=False)
+        duration_views, _ = NoteSequence.column_views_for_sequences(measures, 'duration', retained=False)
+        if sum(note_counts):
+            note_scales = np_repeat(scales, note_counts)
+            NoteSequence.write_column_views(start_views, np_concatenate(start_views) * note_scales)
+            NoteSequence.write_column_views(duration_views, np_concatenate(duration_views) * note_scales)
+
+        meters = {id(measure.meter): measure.meter for measure in measures}
+        for meter in meters.values():
+            meter.tempo = tempo
+        for measure, scale in zip(measures, scales.tolist()):
+            measure._tempo_qpm = tempo
+            measure.next_note_start *= scale
+            measure.max_duration = measure.meter.beats_per_measure * measure.meter.beat_note_dur_secs
 
     def _get_start_for_tempo(self, note: Any) -> float:
         # Get the ratio of the note start time to the duration of the entire measure, and then adjust for tempo
@@ -178,8 +257,7 @@ class Measure(NoteSequence):
         note.duration = actual_duration_secs
         note.start = self.next_note_start
         self.next_note_start += note.duration
-        super(Measure, self).append(note)
-        self._sort_notes_by_start_time()
+        self._insert_sorted(note)
 
         return self
 
@@ -199,11 +277,12 @@ class Measure(NoteSequence):
                               f'sum of note.durations {sum_of_durations} > '
                               f'measure.max_duration {self.max_duration}'))
 
-        for note in to_add:
-            note.duration = self._get_duration_for_tempo(note)
-            note.start = self.next_note_start
-            self.next_note_start += note.duration
-            super(Measure, self).append(note)
+        with trusted():
+            for note in to_add:
+                note.duration = self._get_duration_for_tempo(note)
+                note.start = self.next_note_start
+                self.next_note_start += note.duration
+                super(Measure, self).append(note)
         self._sort_notes_by_start_time()
 
         return self
@@ -211,11 +290,12 @@ class Measure(NoteSequence):
     def replace_notes_on_start(self, to_add: NoteSequence) -> 'Measure':
         self.remove((0, len(self)))
         self.next_note_start = 0.0
-        for note in to_add:
-            note.duration = self._get_duration_for_tempo(note)
-            note.start = self.next_note_start
-            self.next_note_start += note.duration
-            super(Measure, self).append(note)
+        with trusted():
+            for note in to_add:
+                note.duration = self._get_duration_for_tempo(note)
+                note.start = self.next_note_start
+                self.next_note_start += note.duration
+                super(Measure, self).append(note)
         self._sort_notes_by_start_time()
 
         return self
@@ -261,10 +341,19 @@ class Measure(NoteSequence):
         """Moves all notes in Measure according to how self.swing is configured.
         """
         if self.swing:
-            self.swing.apply_swing(self)
+            self.swing.apply_swing(self, beat_dur_secs=float(self.meter.beat_note_dur_secs))
         else:
             raise MeasureSwingNotEnabledException('Measure.apply_swing() called but swing is None in Measure')
 
+    @staticmethod
+    def apply_swing_to_measures(measures: List['Measure']):
+        """Applies each Measure's swing to it, for all the Measures that share a Swing in one batch"""
+        if any(measure.swing is None for measure in measures):
+            raise MeasureSwingNotEnabledException('Measure.apply_swing() called but swing is None in Measure')
+        Swing.apply_swing_to_note_sequences([measure.swing for measure in measures], measures,
+                                            beat_durs_secs=[float(measure.meter.beat_note_dur_secs)
+                                                            for measure in measures])
+
     def apply_phrasing(self):
         """Moves the first note in Measure forward and the last back by self.swing.swing.swing_factor.
            The idea is to slightly accentuate the metric phrasing of each measure. Handles boundary condition
@@ -287,20 +376,31 @@ class Measure(NoteSequence):
 
     # Apply to all notes
     def transpose(self, interval: int):
-        for note in self:
-            note.transpose(interval)
+        validate_type('interval', interval, int)
+        with trusted():
+            for note in self:
+                note.transpose(interval)
 
     # Dynamic setter for an attribute over all Notes in the Measure
     def get_attr(self, name: str) -> List[Any]:
         """Return list of all values for attribute `name` from all notes in the measure, in start time order"""
         validate_type('name', name, str)
-        return [getattr(note, name) for note in self]
+        # Attributes stored in the note array are read as one column. Others, e.g. MIDI channel, are Note attributes.
+        if name not in self.mn.attr_name_idx_map or not len(self):
+            return [getattr(note, name) for note in self]
+        # Apply the same cast the Note getter applies, e.g. CSound instrument is returned as an int
+        cast = self.note(0).attr_val_cast_map[name]
+        return [cast(val) for val in self.column(name)]
 
     def set_attr(self, name: str, val: Any):
         """Apply to all notes in note_list"""
         validate_type('name', name, str)
-        for note in self:
-            setattr(note, name, val)
+        if name not in self.mn.attr_name_idx_map:
+            for note in self:
+                setattr(note, name, val)
+            return
+        validate_type_choice('val', val, (float, int))
+        self.set_column(name, val)
 
     # NoteSequence note_list management
     # Wrap all parent methods to maintain invariant that note_list is sorted by note.start_time ascending
@@ -310,14 +410,13 @@ class Measure(NoteSequence):
         # This is a COPY operation so all modifications to note state must be done before
         #  append() in parent class, which will create new storage for the note and copy
         #  its values into the storage, and expose that storage through iterator/accessor interface.
-        super(Measure, self).append(note)
-        self._sort_notes_by_start_time()
-        return self
+        return self._insert_sorted(note)
 
     def extend(self, to_add: NoteSequence) -> 'Measure':
-        for note in to_add:
-            note.start = self._get_start_for_tempo(note)
-            note.duration = self._get_duration_for_tempo(note)
+        with trusted():
+            for note in to_add:
+                note.start = self._get_start_for_tempo(note)
+                note.duration = self._get_duration_for_tempo(note)
         super(Measure, self).extend(to_add)
         self._sort_notes_by_start_time()
         return self
@@ -357,26 +456,27 @@ class Measure(NoteSequence):
         return self.meter == other.meter and \
             self.swing == other.swing and \
             self.beat == other.beat and \
-            self.next_note_start == pytest.approx(other.next_note_start) and \
-            self.max_duration == pytest.approx(other.max_duration)
+            approx_equal(self.next_note_start, other.next_note_start) and \
+            approx_equal(self.max_duration, other.max_duration)
     # /Iterator support
 
     # TODO ALL CLASSES LIKE METER AND SWING NEED COPY AND ALL COPIES ARE DEEP COPIES
     @staticmethod
     def copy(source: 'Measure') -> 'Measure':
-        new_measure = Measure(meter=source.meter,
-                              swing=source.swing,
-                              num_notes=source.num_notes,
-                              mn=MakeNoteConfig.copy(source.mn),
-                              performance_attrs=source.performance_attrs)
-
-        # Copy the underlying np array from source note before constructing a Measure (and parent class NoteSequence)
-        #  from the source. This is because both of those __init__()s construct new storage and notes from the
-        #  measure's MakeNoteConfig. If that has attr_vals_default_map set it will use that to construct the notes.
-        #  But we want copy ctor semantics, not ctor semantics. So we have to repeat the same logic as is found
-        #  in NoteSequence.copy() and copy the underlying note storage from source to target.
-        new_measure.note_attr_vals = np_copy(source.note_attr_vals)
-
+        """Returns a copy of `source` that shares its notes copy-on-write, see `NoteSequence.copy()`"""
+        # Construct the Measure empty, rather than with `num_notes` notes that would be allocated and set from
+        #  the MakeNoteConfig's attr_vals_default_map only to be replaced. We want copy ctor semantics, not ctor
+        #  semantics. So the new Measure shares the underlying note storage of the source, as in NoteSequence.copy().
+        with trusted():
+            new_measure = Measure(meter=source.meter,
+                                  swing=source.swing,
+                                  num_notes=0,
+                                  mn=MakeNoteConfig.copy(source.mn),
+                                  performance_attrs=source.performance_attrs)
+        new_measure.num_notes = source.num_notes
+        NoteSequence._copy_storage(source, new_measure)
+
+        new_measure._tempo_qpm = source._tempo_qpm
         new_measure.beat = source.beat
         new_measure.next_note_start = source.next_note_start
         return new_measure
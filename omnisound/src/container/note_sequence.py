@@ -4,15 +4,20 @@
 # TODO EQUALITY TESTS EVERYWHERE
 # TODO COPY TESTS
 
-from typing import Any, Iterator, Sequence, Tuple, Union
+from bisect import bisect_right
+from numbers import Real
+from pathlib import Path
+from tempfile import TemporaryFile
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 
-from numpy import array as np_array, array_equal as np_array_equal, concatenate as np_concatenate, copy as np_copy, \
-    copyto as np_copyto, delete as np_delete, insert as np_insert
+from numpy import array_equal as np_array_equal, asarray as np_asarray, concatenate as np_concatenate, \
+    copy as np_copy, cumsum as np_cumsum, float64 as np_float64, int64 as np_int64, memmap as np_memmap, ndarray, \
+    zeros as np_zeros
 
 from omnisound.src.note.adapter.note import MakeNoteConfig
-from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_optional_type, \
-    validate_optional_type_choice, \
-    validate_sequence_of_type, validate_sequence_of_type_choice, validate_type, \
+from omnisound.src.utils.validation_utils import trusted, validate_optional_sequence_of_type, \
+    validate_optional_type, validate_optional_type_choice, \
+    validate_sequence_of_type, validate_sequence_of_type_choice, validate_type, validate_type_choice, \
     validate_types
 
 
@@ -20,14 +25,31 @@ class NoteSequenceInvalidAppendException(Exception):
     pass
 
 
+class _NotesShare:
+    """The notes of a sequence shared with its copies, as a read-only view, and the number of copies that still
+       share them. Copies release the share when they copy the notes into storage of their own, see `copy()`."""
+    def __init__(self, notes: ndarray):
+        self.notes = notes
+        self.num_copies = 0
+
+
 class NoteSequence:
     """Provides an iterator abstraction over a collection of Notes. Also owns the storage for the collection
        of Notes as a Numpy array of rank 2. The shape of the array is the number of note attributes and the
        depth of it is the number of note_attr_vals.
 
-       Because the underlying storage is fixed size, there is a default sequence length of 1, but the caller can
-       pre-allocate by providing a value for the `num_notes` argument. If note_attr_vals are added exceeding the size
-       of the array it is resized.
+       The caller can pre-allocate by providing a value for the `num_notes` argument. The underlying storage is a
+       buffer with spare capacity past the last note, so appending, extending or inserting notes only reallocates
+       when the buffer is full, and then capacity doubles. So building a sequence one note at a time is amortized
+       O(1) per note. `note_attr_vals` is always a view of just the rows holding notes.
+
+       The storage can also be a `numpy.memmap` passed as `storage`, e.g. from `new_memmap_storage()`, so a sequence
+       can be larger than memory. Then the notes are the first `num_notes` rows of `storage` and the rest is spare
+       capacity. If the memmap is backed by a named file opened for writing, growing the sequence extends the file
+       and maps it again, without copying the notes. An anonymous memmap grows into a new, larger anonymous memmap.
+
+       Copies share storage with the sequence they are copied from, copy-on-write, see `copy()`. So copying is
+       usually O(1) in the number of notes, and the notes are only copied when either sequence first writes them.
 
        Note that in this model a sequence of Notes exists upon the construction of a NoteSequence, even though
        no individual Note "objects" have been allocated. Each column in the array represents an attribute of a note.
@@ -41,17 +63,23 @@ class NoteSequence:
        row in the matrix and just an interface to read and write values for a single note, rather than manipulating
        all values at once.
 
-       NOTE: Appending to a child must be done directly and it also invalidates the range_map in any
+       NOTE: Appending to a child must be done directly and it also invalidates the child offsets in any
        sequence that the child is a child_sequence of. If you want to modify a Sequence B that is in A.child_sequences,
        you must 1) modify B, and then 2) call A.update_range_map().
     """
 
+    # Smallest storage buffer allocated when a sequence grows, so appending to an empty sequence doesn't
+    # reallocate for each of its first few notes
+    MIN_CAPACITY = 8
+
     def __init__(self,
                  num_notes: int = None,
                  child_sequences: Sequence['NoteSequence'] = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 storage: Optional[np_memmap] = None):
         validate_types(('num_notes', num_notes, int), ('num_attributes', mn.num_attributes, int),
                        ('attr_name_idx_map', mn.attr_name_idx_map, dict))
+        validate_optional_type('storage', storage, np_memmap)
         validate_optional_type('attr_val_default_map', mn.attr_val_default_map, dict)
         validate_sequence_of_type('attr_name_idx_map', mn.attr_name_idx_map.keys(), str)
         validate_sequence_of_type('attr_name_idx_map', mn.attr_name_idx_map.values(), int)
@@ -64,32 +92,312 @@ class NoteSequence:
         self.mn = mn
 
         # Construct empty 2D numpy array of the specified dimensions. Each row stores a Note's values.
-        rows = [[0.0] * self.mn.num_attributes for _ in range(num_notes)]
-        self.note_attr_vals = np_array(rows)
+        # Storage is a buffer with room for at least `num_notes` rows, of which the first `self._num_notes`
+        # are notes in the sequence. The rest is spare capacity so appends don't reallocate on every call.
+        if storage is not None:
+            if len(storage.shape) != 2 or storage.shape[1] != self.mn.num_attributes or num_notes > len(storage):
+                raise ValueError(f'`storage` must have `mn.num_attributes` columns and at least `num_notes` rows, '
+                                 f'shape: {storage.shape}')
+            self._note_attr_vals_buf = storage
+            self._num_notes = num_notes
+        else:
+            self._set_storage(np_zeros((num_notes, self.mn.num_attributes)), views_out=False)
+        # True if storage is a memmap passed in, or grown from one, so growing it keeps it memory-mapped
+        self._memmap_storage = storage is not None
+        # True if storage is a read-only view of the notes of the sequence this sequence was copied from, see `copy()`
+        self._shared_storage = False
+        # The share of the notes this sequence reads while `_shared_storage`, and the share of its own notes with its
+        #  copies, see `copy()`
+        self._storage_share: Optional[_NotesShare] = None
+        self._copy_share: Optional[_NotesShare] = None
+        # True if a writable view of the storage buffer has left the sequence, e.g. as the storage of a Note, so the
+        #  buffer can be written by something other than this sequence. Then copies don't share it, see `copy()`.
+        self._views_out = storage is not None
         if num_notes > 0:
             # THIS MUST NOT BE ALTERED
-            self._num_attributes = self.note_attr_vals.shape[1]
+            self._num_attributes = self._note_attr_vals_buf.shape[1]
 
-        if self.mn.attr_val_default_map:
+        # Notes already in `storage` are kept as they are
+        if self.mn.attr_val_default_map and storage is None:
             assert set(self.mn.attr_val_default_map.keys()) <= set(self.mn.attr_name_idx_map.keys())
-            for note_attr in self.note_attr_vals:
-                for attr_name, attr_val in self.mn.attr_val_default_map.items():
-                    note_attr[self.mn.attr_name_idx_map[attr_name]] = attr_val
+            for attr_name, attr_val in self.mn.attr_val_default_map.items():
+                self._note_attr_vals_buf[:, self.mn.attr_name_idx_map[attr_name]] = attr_val
 
         self.child_sequences = child_sequences or []
 
-        # Absolute index position over all sequences, that is self.note_attr_vals and the note_attr_vals of each
-        # child_sequence, and, recursively, any of its child sequences.
-        # So if this sequence has 10 notes and it has one child sequence with 11 notes then self.index
-        # will move from 0 to 20 and then reset to 0.
-        self.index = 0
-        self.range_map = {0: self}
+        # The recursively flattened child sequences, in index order, the offset of the first note of each from the
+        # end of this sequence's own notes, in ascending order, and the total number of notes in all of them.
+        # Offsets are relative to the end of this sequence's notes, so adding or removing notes in this sequence
+        # doesn't change them. See `update_range_map()`.
+        self._child_seqs: List['NoteSequence'] = []
+        self._child_offsets: List[int] = []
+        self._child_num_notes = 0
+        if self.child_sequences:
+            self.update_range_map()
+
+        # If this sequence's notes are stored in an array shared with other sequences, see `pack()`, the shared
+        # array, the offset of this sequence's first row in it, and the view of its rows used as storage
+        self._packed_storage: Optional[Tuple[ndarray, int, ndarray]] = None
+
+    # Manage storage
+    @property
+    def note_attr_vals(self) -> ndarray:
+        """The rows of the storage buffer that hold notes in this sequence, as a view, so writes through it
+           modify the notes. If the notes are shared with a copy of this sequence they are copied first.
+        """
+        note_attr_vals = self._writable_notes_view()
+        self._views_out = True
+        return note_attr_vals
+
+    @note_attr_vals.setter
+    def note_attr_vals(self, note_attr_vals: ndarray):
+        """Replaces the storage for notes in this sequence. The sequence takes ownership of `note_attr_vals`,
+           it is not copied, and capacity is reset to the number of rows in `note_attr_vals`.
+        """
+        # The caller can still write `note_attr_vals`
+        self._set_storage(note_attr_vals, views_out=True)
+
+    def _set_storage(self, note_attr_vals: ndarray, views_out: bool):
+        # An empty 1D array is an empty sequence, store it as 2D with no rows so it has a row width
+        if len(note_attr_vals.shape) == 1 and not len(note_attr_vals):
+            note_attr_vals = note_attr_vals.reshape((0, self.mn.num_attributes))
+        self._release_shares()
+        self._note_attr_vals_buf = note_attr_vals
+        self._num_notes = note_attr_vals.shape[0]
+        self._memmap_storage = False
+        self._shared_storage = False
+        self._views_out = views_out
+
+    @property
+    def capacity(self) -> int:
+        """Number of notes the storage buffer can hold before it must be reallocated to grow"""
+        return self._note_attr_vals_buf.shape[0]
+
+    def _reserve(self, num_notes_to_add: int, num_attributes: int):
+        """Ensures the storage buffer can hold `num_notes_to_add` more notes. When it can't, capacity grows to at
+           least double, so a sequence of appends reallocates and copies O(log N) times in total, i.e. each append
+           is amortized O(1). If the sequence is empty, its row width is reset to `num_attributes`, the width of the
+           notes being added.
+        """
+        num_notes_required = self._num_notes + num_notes_to_add
+        width_changed = not self._num_notes and self._note_attr_vals_buf.shape[1] != num_attributes
+        if num_notes_required <= self.capacity and not width_changed:
+            return
+        new_capacity = max(num_notes_required, 2 * self.capacity, NoteSequence.MIN_CAPACITY)
+        if self._memmap_storage and not width_changed:
+            self._note_attr_vals_buf = NoteSequence._grow_memmap_storage(self._note_attr_vals_buf, self._num_notes,
+                                                                         new_capacity)
+            return
+        new_buf = np_zeros((new_capacity, num_attributes))
+        new_buf[:self._num_notes] = self._note_attr_vals_buf[:self._num_notes]
+        self._note_attr_vals_buf = new_buf
+        self._memmap_storage = False
+        self._views_out = False
+
+    @staticmethod
+    def new_memmap_storage(num_notes: int, num_attributes: int, path: Optional[Path] = None) -> np_memmap:
+        """Returns zeroed storage for `num_notes` notes of `num_attributes` attributes, to pass to the constructor
+           as `storage`. The storage is memory-mapped from the file at `path`, which is created or truncated, or if
+           `path` is None from an anonymous temporary file that is removed when it is no longer mapped.
+        """
+        validate_types(('num_notes', num_notes, int), ('num_attributes', num_attributes, int))
+        validate_optional_type('path', path, Path)
+        # A zero-length file can't be mapped, so always map at least one row
+        shape = (max(num_notes, 1), num_attributes)
+        if path is not None:
+            return np_memmap(str(path), dtype=np_float64, mode='w+', shape=shape)
+        with TemporaryFile() as storage_file:
+            return np_memmap(storage_file, dtype=np_float64, mode='w+', shape=shape)
+
+    @staticmethod
+    def _grow_memmap_storage(storage: np_memmap, num_notes: int, capacity: int) -> np_memmap:
+        storage.flush()
+        # numpy extends the file to the size of the new shape when a writable memmap is opened, and the rows already
+        #  in the file are unchanged, so the notes don't need to be copied
+        if storage.filename is not None and storage.mode in ('r+', 'w+'):
+            return np_memmap(storage.filename, dtype=storage.dtype, mode='r+', offset=storage.offset,
+                             shape=(capacity, storage.shape[1]))
+        new_storage = NoteSequence.new_memmap_storage(capacity, storage.shape[1])
+        new_storage[:num_notes] = storage[:num_notes]
+        return new_storage
+
+    def _notes_view(self) -> ndarray:
+        """The rows of the storage buffer that hold notes, without copying notes shared with a copy of this
+           sequence. Only for reading, the view is read-only if they are shared.
+        """
+        return self._note_attr_vals_buf[:self._num_notes]
+
+    def _writable_notes_view(self) -> ndarray:
+        """The rows of the storage buffer that hold notes, copied first if they are shared, for writes by this
+           sequence and the containers and modifiers built on it. Unlike `note_attr_vals` the view isn't counted as
+           having left the sequence, so it mustn't be kept after the write.
+        """
+        self._materialize()
+        return self._note_attr_vals_buf[:self._num_notes]
+
+    def _materialize(self):
+        """Makes sure the notes aren't shared with another sequence before they are written. A copy copies the
+           notes it shares into storage of its own. A sequence whose copies still share its notes copies them into
+           a new buffer of the same capacity, and leaves the old one to the copies.
+        """
+        if self._shared_storage:
+            self._note_attr_vals_buf = np_copy(self._note_attr_vals_buf[:self._num_notes])
+            self._shared_storage = False
+            self._views_out = False
+            self._release_shares()
+        elif self._copy_share is not None:
+            # If every copy has since copied its notes, or been freed, the buffer can be written in place
+            if self._copy_share.num_copies:
+                self._note_attr_vals_buf = np_copy(self._note_attr_vals_buf)
+                self._views_out = False
+            self._copy_share = None
+
+    def _release_shares(self):
+        """Stops sharing notes with the sequence this sequence was copied from, and with its own copies"""
+        storage_share = getattr(self, '_storage_share', None)
+        if storage_share is not None:
+            storage_share.num_copies -= 1
+        self._storage_share = None
+        self._copy_share = None
+
+    def _can_share_storage(self) -> bool:
+        """Memory-mapped notes and notes packed with other sequences are written through the memmap or the packed
+           array, not only through this sequence, so they aren't shared with copies. Nor are notes of a buffer that
+           a view which left the sequence before the copy, e.g. the storage of a Note, can still write.
+        """
+        if self._memmap_storage:
+            return False
+        if self._packed_storage is not None and self.packed_offset(self._packed_storage[0]) is not None:
+            return False
+        if self._shared_storage:
+            return True
+        # A buffer that doesn't own its memory, e.g. one passed to `__setstate__()`, is a view of memory that
+        #  something else can write
+        return not self._views_out and self._note_attr_vals_buf.base is None
+
+    @staticmethod
+    def _copy_storage(source: 'NoteSequence', target: 'NoteSequence'):
+        """Makes the notes of `target` those of `source`. If it can, `target` stores a read-only view of the
+           notes of `source` and copies them into storage of its own before it first writes them. `source` keeps
+           its buffer, and copies it before it next writes it while any copy still shares it. Otherwise the notes
+           are copied now.
+        """
+        if not source._can_share_storage():
+            target._set_storage(np_copy(source._notes_view()), views_out=False)
+            return
+        if source._shared_storage:
+            # A copy of a copy shares the same notes, and is counted by the same share
+            share = source._storage_share
+            notes = source._note_attr_vals_buf
+        else:
+            # All copies share the same view, until `source` next writes its notes
+            if source._copy_share is None:
+                notes = source._note_attr_vals_buf[:source._num_notes]
+                notes.setflags(write=False)
+                source._copy_share = _NotesShare(notes)
+            share = source._copy_share
+            notes = share.notes
+        target._set_storage(notes, views_out=False)
+        target._shared_storage = True
+        if share is not None:
+            share.num_copies += 1
+            target._storage_share = share
+
+    def __del__(self):
+        # A copy freed before it writes its notes no longer shares them
+        self._release_shares()
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickles only the rows holding notes, not spare capacity, as one array. With pickle protocol 5 and a
+           `buffer_callback` the array is passed out-of-band as a raw buffer rather than copied into the pickle.
+           Memory-mapped, packed and shared notes are pickled as plain arrays of the notes.
+        """
+        state = self.__dict__.copy()
+        state['_note_attr_vals_buf'] = np_asarray(self._notes_view())
+        for attr_name in ('_memmap_storage', '_shared_storage', '_storage_share', '_copy_share', '_views_out',
+                          '_packed_storage'):
+            del state[attr_name]
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self._num_notes = self._note_attr_vals_buf.shape[0]
+        self._memmap_storage = False
+        # Arrays unpickled from out-of-band buffers can be read-only, and are then copied before the first write
+        self._shared_storage = not self._note_attr_vals_buf.flags.writeable
+        self._storage_share = None
+        self._copy_share = None
+        self._views_out = False
+        self._packed_storage = None
+
+    def _row_width(self) -> int:
+        """Number of attributes in each note stored in this sequence, or 0 if it is empty so any width is valid"""
+        return self._note_attr_vals_buf.shape[1] if self._num_notes else 0
+
+    # /Manage storage
+
+    # Contiguous storage shared by many sequences
+    @staticmethod
+    def pack(note_sequences: Sequence['NoteSequence']) -> Tuple[ndarray, ndarray]:
+        """Copies the notes of all of `note_sequences` into one array, in order, and makes the storage of each
+           sequence a view of its rows in that array, without spare capacity. So the notes of all the sequences are
+           contiguous, and an operation on an attribute of all of them, e.g. through `column_views_for_sequences()`,
+           is one array operation. Writes through either the sequences or the array modify the same notes.
+
+           Returns the array and the offset of the first row of each sequence, followed by the total number of rows.
+           Only the notes of each sequence itself are packed, not those of its child sequences. A sequence stops
+           sharing the array if its storage is reallocated, e.g. to add notes to it, and later changes to it
+           aren't seen in the array.
+        """
+        validate_sequence_of_type('note_sequences', note_sequences, NoteSequence)
+        if len({id(note_sequence) for note_sequence in note_sequences}) != len(note_sequences):
+            raise ValueError('`note_sequences` must not contain the same NoteSequence more than once')
+        row_widths = {note_sequence._row_width() for note_sequence in note_sequences} - {0}
+        if len(row_widths) > 1:
+            raise NoteSequenceInvalidAppendException('NoteSequences packed together must have the same number of '
+                                                     'attributes')
+        num_attributes = row_widths.pop() if row_widths else \
+            (note_sequences[0].mn.num_attributes if note_sequences else 0)
+
+        offsets = np_zeros(len(note_sequences) + 1, dtype=np_int64)
+        offsets[1:] = np_cumsum([note_sequence._num_notes for note_sequence in note_sequences])
+        packed = np_zeros((int(offsets[-1]), num_attributes))
+        for note_sequence, start, end in zip(note_sequences, offsets[:-1].tolist(), offsets[1:].tolist()):
+            packed[start:end] = note_sequence._notes_view()
+        NoteSequence.share_storage(note_sequences, packed, offsets)
+        return packed, offsets
+
+    @staticmethod
+    def share_storage(note_sequences: Sequence['NoteSequence'], packed: ndarray, offsets: ndarray):
+        """Makes the storage of each of `note_sequences` a view of its rows in `packed`, without copying, replacing
+           the notes it had. The notes of sequence `i` are rows `offsets[i]` up to `offsets[i + 1]`, as returned by
+           `pack()`. So `packed` can be any array of notes, e.g. one memory-mapped from a file.
+        """
+        if len(offsets) != len(note_sequences) + 1 or (len(offsets) and offsets[-1] != len(packed)):
+            raise ValueError('`offsets` must have one entry per sequence, followed by the number of rows in `packed`')
+        for note_sequence, start, end in zip(note_sequences, offsets[:-1].tolist(), offsets[1:].tolist()):
+            if end < start:
+                raise ValueError(f'`offsets` must be ascending, offsets: {start} {end}')
+            note_sequence.note_attr_vals = packed[start:end]
+            note_sequence._packed_storage = (packed, start, note_sequence._note_attr_vals_buf)
+
+    def packed_offset(self, packed: ndarray) -> Optional[int]:
+        """The offset of this sequence's first note in `packed` if its notes are still stored in `packed`, as set by
+           `pack()`, or None.
+        """
+        if self._packed_storage is None:
+            return None
+        packed_note_attr_vals, offset, storage = self._packed_storage
+        if packed_note_attr_vals is not packed or self._note_attr_vals_buf is not storage:
+            return None
+        return offset
+    # /Contiguous storage shared by many sequences
 
     def update_range_map(self):
-        # What we need is a data structure that defines the range of indexes covered by a particular NoteSequence
-        # and maps that to a reference to that NoteSequence.
-        # Example: This NoteSeq has 10 notes and it has two children, the first has 11 and the second has 12
-        #          The _index_range_map is: {10: self, 21: child_1, 33: child_2}
+        """Rebuilds the index of child sequences, which must be called after any child sequence, recursively, is
+           added to or has notes added or removed. Child sequences are flattened depth first, each followed by its
+           own children, and the offset of each is the number of notes in the child sequences before it.
+        """
         def _update_seq_subtree(update_seq, seqs_queue):
             seqs_queue.append(update_seq)
             for child in update_seq.child_sequences:
@@ -98,14 +406,27 @@ class NoteSequence:
         for child_seq in self.child_sequences:
             _update_seq_subtree(child_seq, child_seqs_queue)
 
-        last_index = len(self.note_attr_vals)
+        self._child_seqs = child_seqs_queue
+        self._child_offsets = []
+        child_num_notes = 0
         for seq in child_seqs_queue:
-            self.range_map[last_index] = seq
-            # Only add the actual length of the next sequence, because len() is overloaded for this type
-            # and gets the last key and sequence in the range map and adds the key to the length of that sequence's
-            # note_attr_vals. So if we take len(sequences) here rather than len(sequence.note_attr_vals) we will
-            # double count the last sequence in the current range_map
-            last_index += len(seq.note_attr_vals)
+            self._child_offsets.append(child_num_notes)
+            # Only add the number of notes in the sequence itself, because len() of a sequence includes its children,
+            # which are also in the queue
+            child_num_notes += seq._num_notes
+        self._child_num_notes = child_num_notes
+
+    @property
+    def range_map(self) -> Dict[int, 'NoteSequence']:
+        """Maps the index of the first note of this sequence and of each flattened child sequence to the sequence"""
+        range_map = {0: self}
+        for offset, seq in zip(self._child_offsets, self._child_seqs):
+            range_map[self._num_notes + offset] = seq
+        return range_map
+
+    def _sequences(self) -> List['NoteSequence']:
+        """This sequence and its flattened child sequences, in index order"""
+        return [self] + self._child_seqs
 
     # noinspection PyCallingNonCallable,PyArgumentList
     def _get_note_for_index(self, index: int) -> Any:
@@ -114,27 +435,19 @@ class NoteSequence:
         if index >= len(self):
             raise IndexError(f'`index` out of range index: {index} max_index: {len(self)}')
         # Simple case, index is in the range of self.attrs
-        if index < len(self.note_attr_vals):
-            return self.mn.make_note(self.note_attr_vals[index],
+        # The Note is made from this sequence's own storage and config, which are already validated
+        if index < self._num_notes:
+            note_attr_vals = self.note_attr_vals[index]
+        # Index is above the range of self.note_attr_vals, so it is in the range of one of the recursive
+        # flattened sequence of child_sequences. The child it is in is the last one whose offset is <= the index.
+        else:
+            child_index = index - self._num_notes
+            i = bisect_right(self._child_offsets, child_index) - 1
+            note_attr_vals = self._child_seqs[i].note_attr_vals[child_index - self._child_offsets[i]]
+        with trusted():
+            return self.mn.make_note(note_attr_vals,
                                      self.mn.attr_name_idx_map,
                                      attr_val_cast_map=self.mn.attr_val_cast_map)
-        # Index is above the range of self.note_attr_vals, so either it is in the range of one of the recursive
-        # flattened sequence of child_sequences, or it's invalid
-        else:
-            index_range_sum = len(self.note_attr_vals)
-            for index_range in self.range_map.keys():
-                # Dict keys are in order they were written, so ascending order, so each one is the max index
-                # for that range. So the first entry it is less than is the entry it is in range of.
-                if index < index_range:
-                    # Get the note attrs for the note_sequence for the range this index is in
-                    note_attrs = self.range_map[index_range]
-                    # Adjust index to access the note_attr_vals with offset of 0. The index entry from range_map
-                    # is the running sum of all the previous indexes so we need to subtract that from index
-                    adjusted_index = index - index_range_sum
-                    return self.mn.make_note(note_attrs[adjusted_index],
-                                             self.mn.attr_name_idx_map,
-                                             attr_val_cast_map=self.mn.attr_val_cast_map)
-                index_range_sum += index_range
 
     def note(self, index: int):
         return self._get_note_for_index(index)
@@ -142,13 +455,121 @@ class NoteSequence:
     # noinspection PyArgumentList
     def notes(self) -> Sequence[Any]:
         notes = []
-        for note_seq in self.range_map.values():
-            notes.extend([self.mn.make_note(note_seq.note_attr_vals[i],
-                                            self.mn.attr_name_idx_map,
-                                            attr_val_cast_map=self.mn.attr_val_cast_map)
-                          for i in range(note_seq.note_attr_vals.shape[0])])
+        with trusted():
+            for note_seq in self._sequences():
+                notes.extend([self.mn.make_note(note_seq.note_attr_vals[i],
+                                                self.mn.attr_name_idx_map,
+                                                attr_val_cast_map=self.mn.attr_val_cast_map)
+                              for i in range(note_seq.note_attr_vals.shape[0])])
         return notes
 
+    # Column access
+    def _attr_idx(self, attr_name: str) -> int:
+        validate_type('attr_name', attr_name, str)
+        if attr_name not in self.mn.attr_name_idx_map:
+            raise ValueError(f'`attr_name` {attr_name} is not a note attribute in `mn.attr_name_idx_map`')
+        return self.mn.attr_name_idx_map[attr_name]
+
+    @staticmethod
+    def _column_view(note_seq: 'NoteSequence', attr_idx: int, writable: bool = True, retained: bool = True) -> ndarray:
+        if not writable:
+            note_attr_vals = note_seq._notes_view()
+        elif retained:
+            note_attr_vals = note_seq.note_attr_vals
+        else:
+            note_attr_vals = note_seq._writable_notes_view()
+        return note_attr_vals[:, attr_idx]
+
+    def column_views(self, attr_name: str, writable: bool = True, retained: bool = True) -> List[ndarray]:
+        """Returns a writable view of the values of note attribute `attr_name` for each sequence this sequence spans,
+           that is self and then each of its (recursively flattened) child sequences, in index order. If `writable`
+           is False the views are only for reading, and notes shared with copies aren't copied first, see `copy()`.
+           If `retained` is False the caller only writes through the views and doesn't keep them after, so they
+           don't stop later copies from sharing the notes.
+        """
+        attr_idx = self._attr_idx(attr_name)
+        return [NoteSequence._column_view(note_seq, attr_idx, writable, retained) for note_seq in self._sequences()]
+
+    def column(self, attr_name: str) -> ndarray:
+        """Returns the values of note attribute `attr_name` for every note in the sequence, in index order, as stored,
+           i.e. without the casts Note getters apply. If the sequence has no child sequences this is a writable view
+           into the underlying storage, so `seq.column('pitch')[:] += 1` modifies the notes. If it does, the values
+           are spread over more than one array so this is a copy, and writes must go through `set_column()`.
+        """
+        views = self.column_views(attr_name)
+        if len(views) == 1:
+            return views[0]
+        return np_concatenate(views)
+
+    def set_column(self, attr_name: str, attr_val: Any) -> 'NoteSequence':
+        """Sets note attribute `attr_name` for every note in the sequence, including the notes in child sequences.
+           `attr_val` is either a scalar, including a numpy scalar, applied to every note, or a sequence of values with
+           one value per note, in index order.
+        """
+        views = self.column_views(attr_name, retained=False)
+        if isinstance(attr_val, Real):
+            for view in views:
+                view[:] = attr_val
+            return self
+
+        validate_type_choice('attr_val', attr_val, (ndarray, list, tuple))
+        attr_vals = np_asarray(attr_val, dtype=float)
+        if attr_vals.shape != (len(self),):
+            raise ValueError(f'`attr_val` must have one value per note, shape: {attr_vals.shape} len: {len(self)}')
+        NoteSequence.write_column_views(views, attr_vals)
+        return self
+
+    @staticmethod
+    def column_views_for_sequences(note_sequences: Sequence['NoteSequence'],
+                                   attr_name: str,
+                                   writable: bool = True,
+                                   retained: bool = True) -> Tuple[List[ndarray], List[int]]:
+        """Returns the writable views of note attribute `attr_name` for all of `note_sequences`, in order, with the
+           views of each sequence in the order of `column_views()`, and the number of notes in each sequence. So
+           the values for a batch of sequences can be concatenated, updated at once and written back with
+           `write_column_views()`. The notes of consecutive sequences packed together by `pack()` are one view.
+           If `writable` is False the views are only for reading, and if `retained` is False they aren't kept after
+           they are written, see `column_views()`.
+        """
+        views = []
+        note_counts = []
+        # Sequences whose notes are adjacent rows of one array from `pack()` share one view. `packed_run` is that
+        #  array, the attribute's column index and the first and end rows of the current run of adjacent sequences.
+        packed_run = None
+        for note_sequence in note_sequences:
+            packed = note_sequence._packed_storage[0] if note_sequence._packed_storage else None
+            offset = note_sequence.packed_offset(packed) if packed is not None else None
+            if offset is not None and not note_sequence.child_sequences:
+                attr_idx = note_sequence._attr_idx(attr_name)
+                num_notes = note_sequence._num_notes
+                if packed_run and packed_run[0] is packed and packed_run[1] == attr_idx and packed_run[3] == offset:
+                    packed_run[3] += num_notes
+                else:
+                    if packed_run:
+                        views.append(packed_run[0][packed_run[2]:packed_run[3], packed_run[1]])
+                    packed_run = [packed, attr_idx, offset, offset + num_notes]
+                note_counts.append(num_notes)
+                continue
+
+            if packed_run:
+                views.append(packed_run[0][packed_run[2]:packed_run[3], packed_run[1]])
+                packed_run = None
+            seq_views = note_sequence.column_views(attr_name, writable, retained)
+            views.extend(seq_views)
+            note_counts.append(sum(len(view) for view in seq_views))
+        if packed_run:
+            views.append(packed_run[0][packed_run[2]:packed_run[3], packed_run[1]])
+        return views, note_counts
+
+    @staticmethod
+    def write_column_views(views: Sequence[ndarray], attr_vals: ndarray):
+        """Writes `attr_vals` into `views` in order, each view taking the next `len(view)` values"""
+        offset = 0
+        for view in views:
+            view[:] = attr_vals[offset:offset + len(view)]
+            offset += len(view)
+    # /Column access
+
     # TODO METHOD TO COPY ONE NOTE TO ANOTHER
     @staticmethod
     def new_note(mn: MakeNoteConfig = None) -> Any:
@@ -162,8 +583,7 @@ class NoteSequence:
 
     # Manage iter / slice
     def __len__(self) -> int:
-        k, v = tuple(self.range_map.items())[-1]
-        return k + len(v.note_attr_vals)
+        return self._num_notes + self._child_num_notes
 
     # TODO UNIT TEST SLICE
     # TODO CORRECT HANDLING FOR NEGATIVE INDEXES
@@ -174,26 +594,46 @@ class NoteSequence:
         if isinstance(index, slice):
             return [self._get_note_for_index(i) for i in range(*index.indices(len(self)))]
 
+    # noinspection PyCallingNonCallable
     def __iter__(self) -> Iterator[Any]:
-        """Reset iter position. This behavior complements __next__ to make the
-           container support being iterated multiple times.
+        """Returns a new iterator over the Notes in the sequence, that is its own notes and then the notes of each
+           of its (recursively flattened) child sequences. Each iterator has its own position, so iterations over
+           the same sequence can be nested or run concurrently.
         """
-        self.index = 0
-        return self
+        make_note = self.mn.make_note
+        attr_name_idx_map = self.mn.attr_name_idx_map
+        attr_val_cast_map = self.mn.attr_val_cast_map
+        for note_seq in self._sequences():
+            note_attr_vals = note_seq.note_attr_vals
+            for i in range(len(note_attr_vals)):
+                # Don't yield inside the block, or the caller's code would run with validation skipped
+                with trusted():
+                    note = make_note(note_attr_vals[i], attr_name_idx_map, attr_val_cast_map=attr_val_cast_map)
+                yield note
+
+    def rows(self) -> Iterator[ndarray]:
+        """Returns an iterator over the row of note attribute values of each note, in index order, without making
+           a Note for each one. Each row is a view, so writes to it modify the note.
+        """
+        for note_seq in self._sequences():
+            yield from note_seq.note_attr_vals
 
-    # noinspection PyCallingNonCallable
-    def __next__(self) -> Any:
-        if self.index == len(self):
-            raise StopIteration
-        note = self._get_note_for_index(self.index)
-        self.index += 1
-        return note
+    def itertuples(self, attr_names: Optional[Sequence[str]] = None) -> Iterator[Tuple]:
+        """Returns an iterator over a tuple for each note, in index order, of the values of the note attributes in
+           `attr_names`, or of all note attributes in `mn.attr_name_idx_map` order. Values are Python floats as
+           stored, i.e. without the casts Note getters apply, and are copies, for read-only scans.
+        """
+        attr_names = attr_names or list(self.mn.attr_name_idx_map.keys())
+        attr_idxs = [self._attr_idx(attr_name) for attr_name in attr_names]
+        for note_seq in self._sequences():
+            # Convert each column to a list of Python floats once, rather than converting each numpy scalar
+            yield from zip(*(note_seq._notes_view()[:, attr_idx].tolist() for attr_idx in attr_idxs))
 
     def __eq__(self, other: 'NoteSequence') -> bool:
         # All child sequences must match and the notes in self in both NoteSequences must match
         if len(self.child_sequences) != len(other.child_sequences):
             return False
-        if not np_array_equal(self.note_attr_vals, other.note_attr_vals):
+        if not np_array_equal(self._notes_view(), other._notes_view()):
             return False
         for i, note_sequence in enumerate(self.child_sequences):
             if not np_array_equal(note_sequence, other.child_sequences[i]):
@@ -206,16 +646,15 @@ class NoteSequence:
         """NOTE: This only supports appending notes to this NoteSequence, not any of its children.
         """
         # Handle case of adding note to a currently empty sequence
-        if len(self.note_attr_vals) and self.note_attr_vals[0].shape != note.note_attr_vals.shape:
+        num_attributes = note.note_attr_vals.shape[0]
+        if self._row_width() and self._row_width() != num_attributes:
             raise NoteSequenceInvalidAppendException(
                     'Note added to a NoteSequence must have the same number of attributes')
         # Either this is the first note in the sequence, or it's not and we validated its shape conforms
-        num_attributes = note.note_attr_vals.shape[0]
-        new_note_idx = len(self.note_attr_vals)
-        # noinspection PyTypeChecker
-        self.note_attr_vals.resize(new_note_idx + 1, num_attributes)
-        np_copyto(self.note_attr_vals[new_note_idx], note.note_attr_vals)
-        self.update_range_map()
+        self._materialize()
+        self._reserve(1, num_attributes)
+        self._note_attr_vals_buf[self._num_notes] = note.note_attr_vals
+        self._num_notes += 1
         return self
 
     def append_child_sequence(self, child_sequence: 'NoteSequence') -> 'NoteSequence':
@@ -228,17 +667,17 @@ class NoteSequence:
 
     def extend(self, note_sequence: 'NoteSequence') -> 'NoteSequence':
         validate_type('note_sequence', note_sequence, NoteSequence)
-        if len(self.note_attr_vals) and self.note_attr_vals[0].shape != note_sequence.note_attr_vals[0].shape:
+        new_notes = note_sequence._notes_view()
+        if self._row_width() and self._row_width() != new_notes.shape[1]:
             raise NoteSequenceInvalidAppendException(
                 'NoteSequence extended to a NoteSequence must have the same number of attributes')
-        # Either this is the first note in the sequence, or it's not
-        # If it is, make this sequence the note_attr_vals of this sequence. If it is not, append these notes
-        # to the existing sequence -- we have already confirmed the shapes conform if existing sequence is not empty.
-        if len(self.note_attr_vals):
-            self.note_attr_vals = np_concatenate((self.note_attr_vals, note_sequence.note_attr_vals))
-        else:
-            self.note_attr_vals = np_copy(note_sequence.note_attr_vals)
-        self.update_range_map()
+        # Either this is the first note in the sequence, or it's not and we have already confirmed the shapes conform.
+        # Either way copy the new notes into spare capacity after the existing notes.
+        num_new_notes = new_notes.shape[0]
+        self._materialize()
+        self._reserve(num_new_notes, new_notes.shape[1])
+        self._note_attr_vals_buf[self._num_notes:self._num_notes + num_new_notes] = new_notes
+        self._num_notes += num_new_notes
         return self
 
     def __add__(self, to_add: Any) -> 'NoteSequence':
@@ -255,28 +694,26 @@ class NoteSequence:
         validate_type('index', index, int)
 
         new_notes = to_add.note_attr_vals
+        # Inserting a Note inserts its single row, inserting a NoteSequence inserts all of its rows
         if len(new_notes.shape) == 1:
-            new_notes_num_attributes = new_notes.shape[0]
-        else:
-            new_notes_num_attributes = new_notes.shape[1]
-        if len(self.note_attr_vals):
-            num_attributes = self.note_attr_vals.shape[1]
-        else:
-            num_attributes = 0
-        if num_attributes and num_attributes != new_notes_num_attributes:
+            new_notes = new_notes.reshape((1, new_notes.shape[0]))
+        new_notes_num_attributes = new_notes.shape[1]
+        if self._row_width() and self._row_width() != new_notes_num_attributes:
             raise NoteSequenceInvalidAppendException(
                     'NoteSequence inserted into a NoteSequence must have the same number of attributes')
-
-        if len(self.note_attr_vals):
-            self.note_attr_vals = np_insert(self.note_attr_vals, index, new_notes, axis=0)
-        else:
-            # Must copy the list of the underlying note array to initialize storage for a NoteSequence
-            # because NoteSequence arrays are 2D
-            if len(new_notes.shape) == 1:
-                new_notes = [new_notes]
-            self.note_attr_vals = np_copy(new_notes)
-
-        self.update_range_map()
+        if index < 0:
+            index += self._num_notes
+        if index < 0 or index > self._num_notes:
+            raise IndexError(f'`index` out of range index: {index} num_notes: {self._num_notes}')
+
+        # Shift the notes after `index` up into spare capacity and copy the new notes into the gap
+        num_new_notes = new_notes.shape[0]
+        self._materialize()
+        self._reserve(num_new_notes, new_notes_num_attributes)
+        buf = self._note_attr_vals_buf
+        buf[index + num_new_notes:self._num_notes + num_new_notes] = buf[index:self._num_notes].copy()
+        buf[index:index + num_new_notes] = new_notes
+        self._num_notes += num_new_notes
         return self
 
     def remove(self, range_to_remove: Tuple[int, int]) -> 'NoteSequence':
@@ -284,19 +721,36 @@ class NoteSequence:
         validate_sequence_of_type('range_to_remove', range_to_remove, int)
         # noinspection PyTupleAssignmentBalance
         range_start, range_end = range_to_remove
-        self.note_attr_vals = np_delete(self.note_attr_vals, range(range_start, range_end), axis=0)
-
-        self.update_range_map()
+        # Slicing a range clamps the bounds to the sequence and resolves negative indexes, as slicing the notes would
+        removed_idxs = range(self._num_notes)[range_start:range_end]
+        num_removed_notes = len(removed_idxs)
+        if not num_removed_notes:
+            return self
+        range_start, range_end = removed_idxs.start, removed_idxs.stop
+
+        # Shift the notes after the removed range down over it. Capacity is kept for later appends.
+        self._materialize()
+        buf = self._note_attr_vals_buf
+        buf[range_start:self._num_notes - num_removed_notes] = buf[range_end:self._num_notes].copy()
+        self._num_notes -= num_removed_notes
         return self
 
     @staticmethod
     def copy(source: 'NoteSequence') -> 'NoteSequence':
+        """Returns a copy of `source` that shares its notes, copy-on-write. The copy stores a read-only view of the
+           notes until either sequence writes them through any method that modifies notes, e.g. a Note, `rows()`,
+           `column()`, `set_column()`, `append()` or `remove()`, which first copies them. So a copy is O(1) in the
+           number of notes. The notes are copied immediately if they are memory-mapped, packed with other sequences,
+           or a writable view of them has left `source` since it allocated them, e.g. as a Note, a row of `rows()` or
+           `column()`, because that view could still write them. Writes by `set_column()`, the Meter and Swing don't
+           keep their views, so they don't stop notes being shared.
+        """
         validate_type('source', source, NoteSequence)
-        copy = NoteSequence(num_notes=len(source),
-                            child_sequences=source.child_sequences,
-                            mn=source.mn)
-        # Copy the underlying np array from source note sequence to target
-        copy.note_attr_vals = np_copy(source.note_attr_vals)
+        with trusted():
+            copy = NoteSequence(num_notes=0,
+                                child_sequences=source.child_sequences,
+                                mn=source.mn)
+        NoteSequence._copy_storage(source, copy)
         return copy
 
     # /Manage note list
@@ -1,6 +1,6 @@
 # Copyright 2019 Mark S. Weiss
 
-from typing import List, Sequence, Tuple
+from typing import Iterator, List, Sequence, Tuple
 
 from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.utils.validation_utils import (validate_optional_sequence_of_type, validate_sequence_of_type,
@@ -61,16 +61,9 @@ class NoteSequenceSequence(object):
             raise IndexError(f'`index` out of range index: {index} len(note_seq_seq): {len(self.note_seq_seq)}')
         self.note_seq_seq[index] = NoteSequence.copy(note_sequence)
 
-    def __iter__(self) -> 'NoteSequenceSequence':
-        self.index = 0
-        return self
-
-    def __next__(self) -> NoteSequence:
-        if self.index == len(self.note_seq_seq):
-            raise StopIteration
-        note_seq = self.note_seq_seq[self.index]
-        self.index += 1
-        return note_seq
+    def __iter__(self) -> Iterator[NoteSequence]:
+        """Returns a new iterator with its own position, so iterations can be nested or run concurrently"""
+        return iter(self.note_seq_seq)
 
     def __eq__(self, other: 'NoteSequenceSequence') -> bool:
         if not other or len(self) != len(other):
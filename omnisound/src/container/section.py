@@ -1,15 +1,19 @@
 # Copyright 2018 Mark S. Weiss
 
 from itertools import chain
-from typing import Any, List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from numpy import array as np_array, concatenate as np_concatenate, cumsum as np_cumsum, ndarray, \
+    zeros as np_zeros
 
 from omnisound.src.note.adapter.performance_attrs import PerformanceAttrs
 from omnisound.src.container.measure import Measure
+from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.container.note_sequence_sequence import NoteSequenceSequence
 from omnisound.src.modifier.meter import Meter
 from omnisound.src.modifier.swing import Swing
 from omnisound.src.utils.validation_utils import (validate_optional_sequence_of_type, validate_optional_types,
-                                                  validate_type)
+                                                  validate_type, validate_type_choice)
 
 
 class Section(NoteSequenceSequence):
@@ -18,17 +22,24 @@ class Section(NoteSequenceSequence):
        they will be applied to all Measures in the Section, which will apply them to all Notes in the Measure.
        Getters also behave like Measures, retrieving all values for an attribute for all Notes in all Measures
        flattened into a list.
+
+       If `contiguous` is True the Section stores the notes of all its Measures in one array, with each Measure's
+       notes a view of its rows, see `pack()`. Adding, removing or resizing Measures still works as usual, and the
+       array is rebuilt the next time it is needed. Operations on all the Measures, e.g. `set_attr()`, `quantize()`,
+       `apply_swing()` and changing the tempo, then run as one array operation.
     """
     def __init__(self,
                  measure_list: List[Measure],
                  meter: Optional[Meter] = None,
                  swing: Optional[Swing] = None,
                  name: str = None,
-                 performance_attrs: Optional[PerformanceAttrs] = None):
+                 performance_attrs: Optional[PerformanceAttrs] = None,
+                 contiguous: bool = False):
         validate_optional_types(('measure_list', measure_list, List),
                                 ('performance_attrs', performance_attrs, PerformanceAttrs),
                                 ('meter', meter, Meter), ('swing', swing, Swing),
                                 ('name', name, str))
+        validate_type('contiguous', contiguous, bool)
         validate_optional_sequence_of_type('measure_list', measure_list, Measure)
 
         measure_list = measure_list or []
@@ -46,12 +57,90 @@ class Section(NoteSequenceSequence):
         if swing:
             for measure in self.measure_list:
                 measure.swing = swing
-        self.index = 0
 
         if self._performance_attrs:
             for measure in self.measure_list:
                 measure.performance_attrs = self._performance_attrs
 
+        self.contiguous = contiguous
+        self._note_attr_vals = None
+        self._measure_offsets = None
+        if contiguous:
+            self.pack()
+
+    # Contiguous storage
+    def _is_packed(self) -> bool:
+        if self._note_attr_vals is None or len(self._measure_offsets) != len(self.measure_list) + 1:
+            return False
+        note_attr_vals = self._note_attr_vals
+        for measure, start, end in zip(self.measure_list,
+                                       self._measure_offsets[:-1].tolist(), self._measure_offsets[1:].tolist()):
+            if measure.packed_offset(note_attr_vals) != start or measure._num_notes != end - start:
+                return False
+        return True
+
+    def pack(self) -> 'Section':
+        """Stores the notes of all the Measures in the Section in one array, and sets `contiguous`. Does nothing if
+           they already are, i.e. no Measure was added, removed or resized since the last call. A Measure can only
+           be stored in one array, so a Measure in more than one contiguous Section or Track is moved to the array
+           of whichever was packed last.
+        """
+        self.contiguous = True
+        if not self._is_packed():
+            self._note_attr_vals, self._measure_offsets = NoteSequence.pack(self.measure_list)
+        return self
+
+    def use_storage(self, note_attr_vals: ndarray, measure_offsets: ndarray) -> 'Section':
+        """Makes the storage of each Measure a view of its rows in `note_attr_vals`, without copying, e.g. to use
+           notes memory-mapped from a file, and keeps it as the Section's array. The notes of Measure `i` are rows
+           `measure_offsets[i]` up to `measure_offsets[i + 1]`.
+        """
+        validate_type('note_attr_vals', note_attr_vals, ndarray)
+        NoteSequence.share_storage(self.measure_list, note_attr_vals, measure_offsets)
+        self._note_attr_vals = note_attr_vals
+        self._measure_offsets = measure_offsets
+        return self
+
+    def __getstate__(self) -> Dict[str, Any]:
+        """Each Measure pickles its own notes, so the array of a contiguous Section isn't pickled as well. It is
+           packed again when the Section is unpickled."""
+        state = self.__dict__.copy()
+        state['_note_attr_vals'] = None
+        state['_measure_offsets'] = None
+        return state
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        if self.contiguous:
+            self.pack()
+
+    def _pack_if_contiguous(self):
+        if self.contiguous:
+            self.pack()
+
+    @property
+    def note_attr_vals(self) -> ndarray:
+        """The notes of all the Measures, in order. If the Section is `contiguous` this is the array the Measures'
+           notes are stored in, so writes to it modify the notes. Otherwise it is a copy.
+        """
+        if self.contiguous:
+            self.pack()
+            return self._note_attr_vals
+        if not self.measure_list:
+            return np_zeros((0, 0))
+        return np_concatenate([measure._notes_view() for measure in self.measure_list])
+
+    @property
+    def measure_offsets(self) -> ndarray:
+        """The index in `note_attr_vals` of the first note of each Measure, followed by the total number of notes"""
+        if self.contiguous:
+            self.pack()
+            return self._measure_offsets
+        offsets = np_zeros(len(self.measure_list) + 1, dtype=int)
+        offsets[1:] = np_cumsum(np_array([measure._num_notes for measure in self.measure_list], dtype=int))
+        return offsets
+    # /Contiguous storage
+
     # Properties
     # Quantizing for all Measures in the Section
     @property
@@ -71,9 +160,10 @@ class Section(NoteSequenceSequence):
 
     @tempo.setter
     def tempo(self, tempo: int):
-        self.meter.tempo = tempo
-        for measure in self:
-            measure.tempo = tempo
+        self._pack_if_contiguous()
+        Measure.set_tempo_for_measures(self.measure_list, tempo)
+        if self.meter:
+            self.meter.tempo = tempo
     # /Properties
 
     def quantizing_on(self):
@@ -85,12 +175,14 @@ class Section(NoteSequenceSequence):
             measure.quantizing_off()
 
     def quantize(self):
-        for measure in self.measure_list:
-            measure.quantize()
+        """Quantizes each Measure using its own Meter, for all Measures in one batch"""
+        self._pack_if_contiguous()
+        Meter.quantize_note_sequences([measure.meter for measure in self.measure_list], self.measure_list)
 
     def quantize_to_beat(self):
-        for measure in self.measure_list:
-            measure.quantize_to_beat()
+        """Quantizes each Measure to the beats of its own Meter, for all Measures in one batch"""
+        self._pack_if_contiguous()
+        Meter.quantize_note_sequences_to_beat([measure.meter for measure in self.measure_list], self.measure_list)
     # /Quantizing for all Measures in the Section
 
     # Swing for all Measures in the Section
@@ -116,8 +208,8 @@ class Section(NoteSequenceSequence):
         return self
 
     def apply_swing(self) -> 'Section':
-        for measure in self.measure_list:
-            measure.apply_swing()
+        self._pack_if_contiguous()
+        Measure.apply_swing_to_measures(self.measure_list)
         return self
 
     def apply_phrasing(self) -> 'Section':
@@ -141,15 +233,36 @@ class Section(NoteSequenceSequence):
         return list(chain.from_iterable([measure.get_attr(name) for measure in self.measure_list]))
 
     def set_attr(self, name: str, val: Any):
-        for measure in self.measure_list:
-            measure.set_attr(name, val)
+        validate_type('name', name, str)
+        # Attributes stored in the note arrays of all the Measures are set a column at a time, see `Measure.set_attr()`
+        if not self.measure_list or any(name not in measure.mn.attr_name_idx_map for measure in self.measure_list):
+            for measure in self.measure_list:
+                measure.set_attr(name, val)
+            return
+        validate_type_choice('val', val, (float, int))
+        self._pack_if_contiguous()
+        views, _ = NoteSequence.column_views_for_sequences(self.measure_list, name, retained=False)
+        for view in views:
+            view[:] = val
+
+    def rows(self) -> Iterator[ndarray]:
+        """Returns an iterator over the row of note attribute values of each note in each Measure, in order,
+           without making a Note for each one. See `NoteSequence.rows()`."""
+        return chain.from_iterable(measure.rows() for measure in self.measure_list)
+
+    def itertuples(self, attr_names: Optional[Sequence[str]] = None) -> Iterator[Tuple]:
+        """Returns an iterator over a tuple of the values of the note attributes in `attr_names` for each note in
+           each Measure, in order. See `NoteSequence.itertuples()`."""
+        return chain.from_iterable(measure.itertuples(attr_names) for measure in self.measure_list)
     # Getters and setters for all core note properties, get from all notes, apply to all notes
 
     # noinspection PyTypeChecker
     @staticmethod
     def copy(source: 'Section') -> 'Section':
+        """Copies each Measure copy-on-write, see `Measure.copy()`, so a copy that isn't contiguous is O(measures)"""
         measure_list = None
         if source.measure_list:
             measure_list = [Measure.copy(measure) for measure in source.measure_list]
 
-        return Section(measure_list=measure_list, performance_attrs=source._performance_attrs)
+        return Section(measure_list=measure_list, performance_attrs=source._performance_attrs,
+                       contiguous=source.contiguous)
@@ -1,8 +1,10 @@
 # Copyright 2018 Mark S. Weiss
 
-from typing import List, Optional, Tuple, Union
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING, Union
 
 from omnisound.src.note.adapter.performance_attrs import PerformanceAttrs
+from omnisound.src.container.measure import Measure
 from omnisound.src.container.track import Track
 from omnisound.src.modifier.meter import Meter
 from omnisound.src.modifier.swing import Swing
@@ -10,6 +12,10 @@ from omnisound.src.utils.validation_utils import (validate_optional_sequence_of_
                                                   validate_optional_types, validate_sequence_of_type,
                                                   validate_type)
 
+# Only imported when a Song is shared, see `to_shared_memory()`
+if TYPE_CHECKING:
+    from omnisound.src.container.song_shared_memory import SharedSong
+
 
 class Song:
     """A song represents a final composition/performance. It consists of a collection of Tracks. Songs are
@@ -34,7 +40,6 @@ class Song:
                                 ('performance_attrs', performance_attrs, PerformanceAttrs))
         self.name = name
         self.track_map = {}
-        self.index = 0
 
         track_list = []
         if to_add:
@@ -81,9 +86,13 @@ class Song:
 
     @tempo.setter
     def tempo(self, tempo: int):
+        """Retimes the measures of all the tracks in one pass, then sets the song and track Meters to `tempo`"""
+        Measure.set_tempo_for_measures([measure for track in self.track_list for measure in track.measure_list],
+                                       tempo)
         self.meter.tempo = tempo
         for track in self.track_list:
-            track.tempo = tempo
+            if track.meter:
+                track.meter.tempo = tempo
 
     def quantizing_on(self):
         for track in self.track_list:
@@ -125,8 +134,8 @@ class Song:
         return self
 
     def apply_swing(self) -> 'Song':
-        for track in self.track_list:
-            track.apply_swing()
+        # Swing the Measures of all Tracks at once, so Tracks that share a Swing draw from it in one batch
+        Measure.apply_swing_to_measures([measure for track in self.track_list for measure in track.measure_list])
         return self
 
     def apply_phrasing(self) -> 'Song':
@@ -214,16 +223,9 @@ class Song:
             raise IndexError(f'`index` out of range index: {index} len(track_list): {len(self.track_list)}')
         return self.track_list[index]
 
-    def __iter__(self) -> 'Song':
-        self.index = 0
-        return self
-
-    def __next__(self) -> Track:
-        if self.index == len(self.track_list):
-            raise StopIteration
-        track = self.track_list[self.index]
-        self.index += 1
-        return track
+    def __iter__(self) -> Iterator[Track]:
+        """Returns a new iterator with its own position, so iterations can be nested or run concurrently"""
+        return iter(self.track_list)
 
     def __eq__(self, other: 'Song') -> bool:
         if not other or len(self) != len(other):
@@ -231,8 +233,49 @@ class Song:
         return all(self.track_list[i] == other.track_list[i] for i in range(len(self.track_list)))
     # /Iter / slice support
 
+    # Saving and loading
+    def save(self, path: Path):
+        """Saves the Song to an archive of NumPy arrays at `path`, a directory of `.npy` files, or one `.npz` file if
+           `path` has that suffix. See `song_archive` for what is stored.
+        """
+        from omnisound.src.container.song_archive import save_song
+        save_song(self, path)
+
+    @staticmethod
+    def load(path: Path, mmap: bool = True, track_names: Optional[Sequence[str]] = None) -> 'Song':
+        """Loads a Song saved with `save()`. Each Track's notes are stored in one array loaded from the archive, and
+           each of its Measures' notes are a view of that array. If `mmap` is True the arrays of a directory archive
+           are memory-mapped, so notes are only read from disk when accessed, and changes to them aren't written
+           back to the archive. If `track_names` is given only those Tracks are loaded.
+        """
+        from omnisound.src.container.song_archive import load_song
+        return load_song(path, mmap=mmap, track_names=track_names)
+    # /Saving and loading
+
+    # Sharing with other processes
+    def to_shared_memory(self, name: Optional[str] = None) -> 'SharedSong':
+        """Copies the notes of the Song into a shared memory block, named `name` or a name chosen by the OS. Returns
+           a `SharedSong` holding the block, a copy of this Song whose notes are views of the block, and the small
+           descriptor other processes pass to `attach_shared_memory()`, e.g. as the argument of a pool task, to build
+           the same Song over the same notes without copying or pickling them. See `song_shared_memory`.
+        """
+        from omnisound.src.container.song_shared_memory import SharedSong
+        return SharedSong.export(self, name=name)
+
+    @staticmethod
+    def attach_shared_memory(descriptor: Dict[str, Any], track_names: Optional[Sequence[str]] = None) -> 'SharedSong':
+        """Returns a `SharedSong` holding a Song whose notes are views of the shared memory block of a Song
+           exported by `to_shared_memory()` with `descriptor`. If `track_names` is given only those Tracks are
+           attached.
+        """
+        from omnisound.src.container.song_shared_memory import SharedSong
+        return SharedSong.attach(descriptor, track_names=track_names)
+    # /Sharing with other processes
+
     @staticmethod
     def copy(source: 'Song') -> 'Song':
+        """Copies each Track copy-on-write, see `Track.copy()`, so a copy of a Song whose Tracks aren't contiguous is
+           O(tracks + measures), and notes are only copied when they are first written"""
         track_list = None
         if source.track_list:
             track_list = [Track.copy(track) for track in source.track_list]
@@ -0,0 +1,311 @@
+# Copyright 2020 Mark S. Weiss
+
+"""Saves Songs to, and loads them from, archives of NumPy arrays, see `Song.save()` and `Song.load()`.
+
+   An archive is either a directory of `.npy` files, or a single `.npz` file if the path has that suffix. For each
+   Track it stores the notes of all its Measures as one array, the offset of each Measure's first note in it, the
+   tempo each Measure's notes are timed at, and the index of each Measure's Meter and Swing in the tables of Meters
+   and Swings in the header. The header is JSON and
+   holds those tables, the Song's name, Meter and Swing, and for each Track its name, class, MIDI channel,
+   instrument, Meter, Swing and note config. A note config's functions, i.e. its make_note, pitch_for_key and casts,
+   are stored as references to the module level functions of the note adapter, so they are imported again on load.
+
+   Only the notes of each Measure itself are saved, not those of any child sequences, and PerformanceAttrs are not
+   saved. A Swing is saved with its seed, so the random jitter it produces after loading starts again from the seed.
+"""
+
+from importlib import import_module
+from json import dumps as json_dumps, loads as json_loads
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+
+from numpy import array as np_array, float64 as np_float64, int64 as np_int64, load as np_load, ndarray, \
+    save as np_save, savez as np_savez
+
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.song import Song
+from omnisound.src.container.track import MidiTrack, Track
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.modifier.swing import Swing
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.utils.validation_utils import trusted, validate_optional_sequence_of_type, validate_type
+
+ARCHIVE_FORMAT_VERSION = 2
+NPZ_SUFFIX = '.npz'
+NPY_SUFFIX = '.npy'
+HEADER_FILE_NAME = 'song.json'
+HEADER_KEY = 'header'
+NO_SWING_IDX = -1
+TRACK_CLASSES = {cls.__name__: cls for cls in (Track, MidiTrack)}
+
+
+class SongArchiveException(Exception):
+    pass
+
+
+# Note config
+def _callable_ref(func: Callable) -> str:
+    """Returns the reference the archive stores for `func`. Raises `SongArchiveException` if `func` can't be imported
+       again from it on load, e.g. a lambda or a nested function, so that saving fails rather than loading.
+    """
+    ref = f'{getattr(func, "__module__", None)}:{getattr(func, "__qualname__", None)}'
+    try:
+        resolved = _resolve_callable_ref(ref)
+    except (AttributeError, ImportError, ValueError):
+        resolved = None
+    if resolved is not func:
+        raise SongArchiveException(f'Note config functions must be module level functions or classes to be saved, '
+                                   f'func: {func!r}')
+    return ref
+
+
+def _resolve_callable_ref(ref: str) -> Callable:
+    module_name, qualname = ref.split(':')
+    func = import_module(module_name)
+    for name in qualname.split('.'):
+        func = getattr(func, name)
+    return func
+
+
+def _note_config_header(mn: MakeNoteConfig) -> Dict[str, Any]:
+    return {'cls_name': mn.cls_name,
+            'num_attributes': mn.num_attributes,
+            'make_note': _callable_ref(mn.make_note),
+            'pitch_for_key': _callable_ref(mn.pitch_for_key),
+            'attr_name_idx_map': dict(mn.attr_name_idx_map),
+            'attr_val_default_map': {attr_name: float(attr_val)
+                                     for attr_name, attr_val in mn.attr_val_default_map.items()},
+            'attr_val_cast_map': {attr_name: _callable_ref(cast) for attr_name, cast in mn.attr_val_cast_map.items()}}
+
+
+def _note_config_from_header(header: Mapping[str, Any]) -> MakeNoteConfig:
+    return MakeNoteConfig(cls_name=header['cls_name'],
+                          num_attributes=header['num_attributes'],
+                          make_note=_resolve_callable_ref(header['make_note']),
+                          pitch_for_key=_resolve_callable_ref(header['pitch_for_key']),
+                          attr_name_idx_map=header['attr_name_idx_map'],
+                          attr_val_default_map=header['attr_val_default_map'],
+                          attr_val_cast_map={attr_name: _resolve_callable_ref(ref)
+                                             for attr_name, ref in header['attr_val_cast_map'].items()})
+# /Note config
+
+
+# Meters and Swings
+def _meter_header(meter: Meter) -> Dict[str, Any]:
+    return {'beats_per_measure': meter.beats_per_measure,
+            'beat_note_dur': meter.beat_note_dur.value,
+            'tempo': meter.tempo_qpm,
+            'quantizing': meter.quantizing}
+
+
+def _meter_from_header(header: Mapping[str, Any]) -> Meter:
+    meter = Meter(beats_per_measure=header['beats_per_measure'],
+                  beat_note_dur=NoteDur(header['beat_note_dur']),
+                  quantizing=header['quantizing'])
+    # Tempo can be a float after a tempo change, which the constructor doesn't accept
+    meter.tempo = header['tempo']
+    return meter
+
+
+def _swing_header(swing: Swing) -> Dict[str, Any]:
+    return {'swing_on': swing.swing_on,
+            'swing_range': swing.swing_range,
+            'swing_direction': swing.swing_direction.value,
+            'swing_jitter_type': swing.swing_jitter_type.value,
+            'swing_ratio': swing.swing_ratio,
+            'seed': swing.seed}
+
+
+def _swing_from_header(header: Mapping[str, Any]) -> Swing:
+    return Swing(swing_on=header['swing_on'],
+                 swing_range=header['swing_range'],
+                 swing_direction=Swing.SwingDirection(header['swing_direction']),
+                 swing_jitter_type=Swing.SwingJitterType(header['swing_jitter_type']),
+                 swing_ratio=header['swing_ratio'],
+                 seed=header['seed'])
+
+
+class _ObjectTable:
+    """Assigns each distinct object, by identity, an index in the order first seen, so objects shared by many
+       Measures, Tracks and the Song are stored once"""
+    def __init__(self, to_header: Callable[[Any], Dict[str, Any]]):
+        self._to_header = to_header
+        self._idxs: Dict[int, int] = {}
+        self.headers: List[Dict[str, Any]] = []
+
+    def idx(self, obj: Optional[Any]) -> Optional[int]:
+        if obj is None:
+            return None
+        idx = self._idxs.get(id(obj))
+        if idx is None:
+            idx = self._idxs[id(obj)] = len(self.headers)
+            self.headers.append(self._to_header(obj))
+        return idx
+# /Meters and Swings
+
+
+# Reading and writing arrays
+def _track_array_name(track_idx: int, suffix: str = '') -> str:
+    return f'track_{track_idx}{suffix}'
+
+
+def _write_archive(path: Path, header: Mapping[str, Any], arrays: Mapping[str, ndarray]):
+    header_json = json_dumps(header)
+    if path.suffix == NPZ_SUFFIX:
+        np_savez(str(path), **{HEADER_KEY: np_array(header_json)}, **arrays)
+        return
+    path.mkdir(parents=True, exist_ok=True)
+    (path / HEADER_FILE_NAME).write_text(header_json)
+    for name, array in arrays.items():
+        np_save(str(path / f'{name}{NPY_SUFFIX}'), array)
+
+
+class _ArchiveReader:
+    """Reads the header of an archive when opened, and each array only when it is requested. Arrays in a directory
+       archive can be memory-mapped, copy-on-write, so pages are only read from the file when notes are accessed,
+       and changes to the notes aren't written back to the file. Arrays in an `.npz` file are read when requested.
+    """
+    def __init__(self, path: Path, mmap: bool):
+        self._path = path
+        self._mmap_mode = 'c' if mmap else None
+        if path.suffix == NPZ_SUFFIX:
+            self._npz = np_load(str(path))
+            self.header = json_loads(str(self._npz[HEADER_KEY]))
+        else:
+            self._npz = None
+            self.header = json_loads((path / HEADER_FILE_NAME).read_text())
+        if self.header.get('version') != ARCHIVE_FORMAT_VERSION:
+            raise SongArchiveException(f'Unsupported song archive version: {self.header.get("version")}')
+
+    def array(self, name: str) -> ndarray:
+        if self._npz is not None:
+            return self._npz[name]
+        return np_load(str(self._path / f'{name}{NPY_SUFFIX}'), mmap_mode=self._mmap_mode)
+# /Reading and writing arrays
+
+
+def _track_note_config(track: Track) -> Optional[MakeNoteConfig]:
+    if not track.measure_list:
+        return None
+    mn = track.measure_list[0].mn
+    for measure in track.measure_list:
+        if measure.mn.cls_name != mn.cls_name or measure.mn.attr_name_idx_map != mn.attr_name_idx_map or \
+                measure.mn.attr_val_cast_map != mn.attr_val_cast_map:
+            raise SongArchiveException(f'All Measures in a Track must have the same note attributes to be saved, '
+                                       f'track: {track.name}')
+    return mn
+
+
+def song_header_and_arrays(song: Song) -> Tuple[Dict[str, Any], Dict[str, ndarray]]:
+    """Returns the header and the named arrays that store `song`, as saved by `save_song()`"""
+    validate_type('song', song, Song)
+    meters = _ObjectTable(_meter_header)
+    swings = _ObjectTable(_swing_header)
+    track_headers = []
+    arrays = {}
+    for track_idx, track in enumerate(song.track_list):
+        if type(track).__name__ not in TRACK_CLASSES:
+            raise SongArchiveException(f'Unsupported Track class: {type(track).__name__}')
+        mn = _track_note_config(track)
+        track_headers.append({'name': track.name,
+                              'cls': type(track).__name__,
+                              'channel': getattr(track, 'channel', None),
+                              'instrument': track.instrument,
+                              'contiguous': track.contiguous,
+                              'meter': meters.idx(track.meter),
+                              'swing': swings.idx(track.swing),
+                              'note_config': _note_config_header(mn) if mn else None})
+        arrays[_track_array_name(track_idx)] = track.note_attr_vals
+        arrays[_track_array_name(track_idx, '_measure_offsets')] = track.measure_offsets.astype(np_int64)
+        arrays[_track_array_name(track_idx, '_measure_meters')] = \
+            np_array([meters.idx(measure.meter) for measure in track.measure_list], dtype=np_int64)
+        arrays[_track_array_name(track_idx, '_measure_tempos')] = \
+            np_array([measure.tempo for measure in track.measure_list], dtype=np_float64)
+        swing_idxs = [swings.idx(measure.swing) for measure in track.measure_list]
+        arrays[_track_array_name(track_idx, '_measure_swings')] = \
+            np_array([NO_SWING_IDX if swing_idx is None else swing_idx for swing_idx in swing_idxs], dtype=np_int64)
+
+    header = {'version': ARCHIVE_FORMAT_VERSION,
+              'name': song.name,
+              'meter': meters.idx(song.meter),
+              'swing': swings.idx(song.swing),
+              'meters': meters.headers,
+              'swings': swings.headers,
+              'tracks': track_headers}
+    return header, arrays
+
+
+def save_song(song: Song, path: Path):
+    validate_type('path', path, Path)
+    header, arrays = song_header_and_arrays(song)
+    _write_archive(path, header, arrays)
+
+
+def _load_track(header: Mapping[str, Any], array: Callable[[str], ndarray], track_idx: int,
+                meters: Sequence[Meter], swings: Sequence[Swing]) -> Track:
+    track_header = header['tracks'][track_idx]
+    track_cls = TRACK_CLASSES[track_header['cls']]
+    kwargs = {'channel': track_header['channel']} if track_cls is MidiTrack else {}
+    meter_idx = track_header['meter']
+    swing_idx = track_header['swing']
+    # Build the Track empty, so setting its meter, swing and instrument doesn't write to the notes, and then add its
+    #  Measures, each already with its own Meter and Swing and with its notes stored as a view of the loaded array
+    track = track_cls(name=track_header['name'],
+                      meter=None if meter_idx is None else meters[meter_idx],
+                      swing=None if swing_idx is None else swings[swing_idx],
+                      contiguous=track_header['contiguous'],
+                      **kwargs)
+    track._instrument = track_header['instrument']
+
+    measure_meter_idxs = array(_track_array_name(track_idx, '_measure_meters')).tolist()
+    if not measure_meter_idxs:
+        return track
+    mn = _note_config_from_header(track_header['note_config'])
+    measure_swing_idxs = array(_track_array_name(track_idx, '_measure_swings')).tolist()
+    measure_tempos = array(_track_array_name(track_idx, '_measure_tempos')).tolist()
+    with trusted():
+        for measure_meter_idx, measure_swing_idx, measure_tempo in \
+                zip(measure_meter_idxs, measure_swing_idxs, measure_tempos):
+            measure = Measure(meter=meters[measure_meter_idx],
+                              swing=None if measure_swing_idx == NO_SWING_IDX else swings[measure_swing_idx],
+                              num_notes=0,
+                              mn=mn)
+            measure._tempo_qpm = measure_tempo
+            track.measure_list.append(measure)
+    track.use_storage(array(_track_array_name(track_idx)), array(_track_array_name(track_idx, '_measure_offsets')))
+    return track
+
+
+def load_song(path: Path, mmap: bool = True, track_names: Optional[Sequence[str]] = None) -> Song:
+    validate_type('path', path, Path)
+    validate_type('mmap', mmap, bool)
+    validate_optional_sequence_of_type('track_names', track_names, str)
+    reader = _ArchiveReader(path, mmap)
+    return song_from_header_and_arrays(reader.header, reader.array, track_names=track_names)
+
+
+def song_from_header_and_arrays(header: Mapping[str, Any],
+                                array: Callable[[str], ndarray],
+                                track_names: Optional[Sequence[str]] = None) -> Song:
+    """Builds a Song from a header returned by `song_header_and_arrays()` and `array`, which returns each of its
+       arrays by name. Each Track's Measures store their notes as views of the Track's array, which isn't copied.
+       If `track_names` is given only those Tracks are built.
+    """
+    track_idxs = range(len(header['tracks']))
+    if track_names is not None:
+        names = [track_header['name'] for track_header in header['tracks']]
+        missing_names = set(track_names) - set(names)
+        if missing_names:
+            raise SongArchiveException(f'Tracks not in song archive: {sorted(missing_names)}')
+        track_idxs = [track_idx for track_idx in track_idxs if names[track_idx] in track_names]
+    meters = [_meter_from_header(meter_header) for meter_header in header['meters']]
+    swings = [_swing_from_header(swing_header) for swing_header in header['swings']]
+    track_list = [_load_track(header, array, track_idx, meters, swings) for track_idx in track_idxs]
+
+    # Set the Song's Meter and Swing after adding the Tracks, so they don't replace those of each Track
+    song = Song(to_add=track_list, name=header['name'])
+    if header['meter'] is not None:
+        song._meter = meters[header['meter']]
+    if header['swing'] is not None:
+        song._swing = swings[header['swing']]
+    return song
@@ -0,0 +1,122 @@
+# Copyright 2020 Mark S. Weiss
+
+"""Shares the notes of a Song with other processes through `multiprocessing.shared_memory`, see
+   `Song.to_shared_memory()` and `Song.attach_shared_memory()`.
+
+   Exporting a Song copies the arrays that `song_archive` saves, i.e. the notes of each Track and the offset, Meter
+   and Swing of each of its Measures, into one shared memory block. The descriptor of the export holds the name of
+   the block, the offset, shape and dtype of each array in it, and the `song_archive` header, so it is small and
+   cheap to pickle, and is all a worker needs to attach. Attaching builds the Song's Tracks and Measures with their
+   notes stored as views of the block, so no notes are copied or pickled. Writes to the notes in any process are
+   seen by every process attached to the block.
+
+   The process that exports a Song owns the block and must `unlink()` it when all processes are done with it. Every
+   process must `close()` its `SharedSong` before exiting, after it releases every Track, Measure, Note and array
+   it took from the Song, because the block can't be closed while views of it exist.
+"""
+
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Dict, Mapping, Optional, Sequence
+
+from numpy import dtype as np_dtype, ndarray
+
+from omnisound.src.container.song import Song
+from omnisound.src.container.song_archive import song_from_header_and_arrays, song_header_and_arrays
+from omnisound.src.container.song_archive import SongArchiveException
+from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_type
+
+# Offset of each array in the block is a multiple of this, so every array is aligned for its dtype
+ARRAY_ALIGNMENT = 64
+
+
+class SharedSongException(Exception):
+    pass
+
+
+class SharedSong:
+    """A shared memory block holding the notes of a Song, the descriptor other processes pass to `attach()` to
+       use the same block, and the Song built over the block. The Song is built the first time it is used, so
+       exporting a Song doesn't also build a copy of it. Its notes are views of the block, so it must not be used
+       after `close()`.
+    """
+    def __init__(self,
+                 shared_memory: SharedMemory = None,
+                 descriptor: Dict[str, Any] = None,
+                 track_names: Optional[Sequence[str]] = None):
+        self.shared_memory = shared_memory
+        self.descriptor = descriptor
+        self.track_names = track_names
+        self._song = None
+
+    @staticmethod
+    def _array(shared_memory: SharedMemory, array_descriptor: Mapping[str, Any]) -> ndarray:
+        return ndarray(tuple(array_descriptor['shape']), dtype=np_dtype(array_descriptor['dtype']),
+                       buffer=shared_memory.buf, offset=array_descriptor['offset'])
+
+    @property
+    def song(self) -> Song:
+        """The Song, or only its Tracks in `track_names` if set, with its notes stored as views of the block"""
+        if self._song is None:
+            array_descriptors = self.descriptor['arrays']
+            try:
+                self._song = song_from_header_and_arrays(
+                    self.descriptor['header'],
+                    lambda name: SharedSong._array(self.shared_memory, array_descriptors[name]),
+                    track_names=self.track_names)
+            except SongArchiveException as e:
+                raise SharedSongException(str(e))
+        return self._song
+
+    @staticmethod
+    def export(song: Song, name: Optional[str] = None) -> 'SharedSong':
+        """Copies the notes of `song` into a new shared memory block, named `name` or a name chosen by the OS, and
+           returns the block and its descriptor. The `song` of the returned `SharedSong` is a copy of `song` whose
+           notes are views of the block, e.g. to read the results of workers that write to the block."""
+        validate_type('song', song, Song)
+        header, arrays = song_header_and_arrays(song)
+        array_descriptors = {}
+        size = 0
+        for array_name, array in arrays.items():
+            array_descriptors[array_name] = {'offset': size, 'shape': list(array.shape), 'dtype': array.dtype.str}
+            size += -(-array.nbytes // ARRAY_ALIGNMENT) * ARRAY_ALIGNMENT
+        # A block can't be empty, e.g. for a Song with no Tracks
+        shared_memory = SharedMemory(name=name, create=True, size=max(size, 1))
+        for array_name, array in arrays.items():
+            SharedSong._array(shared_memory, array_descriptors[array_name])[...] = array
+        descriptor = {'shared_memory_name': shared_memory.name, 'arrays': array_descriptors, 'header': header}
+        return SharedSong(shared_memory=shared_memory, descriptor=descriptor)
+
+    @staticmethod
+    def attach(descriptor: Dict[str, Any], track_names: Optional[Sequence[str]] = None) -> 'SharedSong':
+        """Attaches to the block of an exported Song, by its `descriptor`, and builds the Song over it. If
+           `track_names` is given only those Tracks are built, e.g. the Tracks a worker processes, because building
+           a Track is O(measures).
+        """
+        validate_optional_sequence_of_type('track_names', track_names, str)
+        try:
+            shared_memory = SharedMemory(name=descriptor['shared_memory_name'])
+        except FileNotFoundError:
+            raise SharedSongException(f'No shared memory block for Song, name: {descriptor["shared_memory_name"]}')
+        shared_song = SharedSong(shared_memory=shared_memory, descriptor=descriptor, track_names=track_names)
+        # Build the Song now, so a Track missing from the Song fails here rather than on first use
+        try:
+            _ = shared_song.song
+        except SharedSongException:
+            shared_memory.close()
+            raise
+        return shared_song
+
+    def close(self):
+        """Detaches this process from the block. The Song's notes are views of the block, so it is released too."""
+        self._song = None
+        self.shared_memory.close()
+
+    def unlink(self):
+        """Frees the block once every process has closed it. Only the process that exported the Song calls this."""
+        self.shared_memory.unlink()
+
+    def __enter__(self) -> 'SharedSong':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
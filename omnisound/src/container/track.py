@@ -37,7 +37,8 @@ class Track(Section):
                  swing: Optional[Swing] = None,
                  name: str = None,
                  instrument: Optional[Union[float, int]] = None,
-                 performance_attrs: Optional[PerformanceAttrs] = None):
+                 performance_attrs: Optional[PerformanceAttrs] = None,
+                 contiguous: bool = False):
         validate_optional_types(('meter', meter, Meter),
                                 ('swing', swing, Swing),
                                 ('performance_attrs', performance_attrs, PerformanceAttrs))
@@ -61,17 +62,15 @@ class Track(Section):
                                     meter=meter,
                                     swing=swing,
                                     name=name,
-                                    performance_attrs=performance_attrs)
+                                    performance_attrs=performance_attrs,
+                                    contiguous=contiguous)
 
         self.name = name
         self._instrument = instrument
-        self.index = 0
 
         # Set the instrument stored at the Track level. Also if an `instrument` was passed in,
         # modify all Measures, which will in turn modify all of their Notes
         if instrument:
-            for measure in measure_list:
-                measure.set_attr('instrument', instrument)
             self.instrument = instrument
         else:
             self.instrument = Track.DEFAULT_INSTRUMENT
@@ -92,8 +91,7 @@ class Track(Section):
 
     @instrument.setter
     def instrument(self, instrument: Union[float, int]):
-        for measure in self.measure_list:
-            measure.set_attr('instrument', instrument)
+        self.set_attr('instrument', instrument)
         self._instrument = instrument
 
     @property
@@ -102,9 +100,10 @@ class Track(Section):
 
     @tempo.setter
     def tempo(self, tempo: int):
-        self.meter.tempo = tempo
-        for measure in self.measure_list:
-            measure.tempo = tempo
+        self._pack_if_contiguous()
+        Measure.set_tempo_for_measures(self.measure_list, tempo)
+        if self.meter:
+            self.meter.tempo = tempo
 
     def next_note(self) -> Union[Any, None]:
         for measure in self:
@@ -157,16 +156,29 @@ class Track(Section):
 
     @staticmethod
     def copy(source_track: 'Track') -> 'Track':
-        measure_list = None
-        if source_track.measure_list:
-            # noinspection PyTypeChecker
-            measure_list = [Measure.copy(measure) for measure in source_track.measure_list]
-        return Track(to_add=measure_list,
-                     name=source_track.name,
-                     instrument=source_track.instrument,
-                     meter=source_track._meter,
-                     swing=source_track._swing,
-                     performance_attrs=source_track._performance_attrs)
+        """Copies each Measure copy-on-write, see `Measure.copy()`, so a copy that isn't contiguous is O(measures).
+           The copied notes already have the source Track's instrument, so it isn't set on them again.
+        """
+        # Build the Track empty, so setting its instrument doesn't write to, and so copy, the notes of every Measure
+        track = Track(name=source_track.name,
+                      meter=source_track._meter,
+                      swing=source_track._swing,
+                      performance_attrs=source_track._performance_attrs)
+        track._instrument = source_track.instrument
+        # noinspection PyTypeChecker
+        measure_list = [Measure.copy(measure) for measure in source_track.measure_list]
+        # Measures take the Track's Meter, Swing and PerformanceAttrs, as when passed to the constructor
+        for measure in measure_list:
+            if track._meter:
+                measure.meter = track._meter
+            if track._swing:
+                measure.swing = track._swing
+            if track._performance_attrs:
+                measure.performance_attrs = track._performance_attrs
+        track.measure_list.extend(measure_list)
+        if source_track.contiguous:
+            track.pack()
+        return track
 
 
 class MidiTrack(Track):
@@ -176,7 +188,8 @@ class MidiTrack(Track):
                  name: Optional[str] = None,
                  instrument: Optional[int] = None,
                  channel: Optional[int] = None,
-                 performance_attrs: Optional[PerformanceAttrs] = None):
+                 performance_attrs: Optional[PerformanceAttrs] = None,
+                 contiguous: bool = False):
         validate_optional_type('channel', channel, int)
         self.channel = channel
         super(MidiTrack, self).__init__(to_add=to_add,
@@ -184,4 +197,5 @@ class MidiTrack(Track):
                                         swing=swing,
                                         name=name,
                                         instrument=instrument,
-                                        performance_attrs=performance_attrs)
+                                        performance_attrs=performance_attrs,
+                                        contiguous=contiguous)
@@ -5,6 +5,7 @@ from typing import Any, Union
 from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.generator.chord_globals import HarmonicChord
+from omnisound.src.generator.pitch_tables import chord_pitches
 from omnisound.src.generator.scale_globals import MajorKey, MinorKey
 from omnisound.src.generator.scale import Scale
 from omnisound.src.utils.mingus_utils import set_notes_pitches_to_mingus_keys
@@ -44,21 +45,17 @@ class Chord(NoteSequence):
         self.octave = octave
         self.pitch_for_key = mn.pitch_for_key
         self.num_attributes = mn.num_attributes
-        # Get the list of keys in the chord as string names from mingus
+        # Get the list of keys in the chord as string names from mingus, and their pitches, from the pitch table
         self.key = key
-        self.mingus_chord = Chord.get_mingus_chord_for_harmonic_chord(key, harmonic_chord)
+        mingus_chord, pitches = chord_pitches(harmonic_chord, key, octave, self.pitch_for_key)
+        self.mingus_chord = list(mingus_chord)
         # Construct the sequence of notes for the chord in the NoteSequence base class
         super(Chord, self).__init__(num_notes=len(self.mingus_chord),
                                     mn=mn)
 
-        # Convert to Notes for this chord's note_type with pitch assigned for the key in the chord
+        # Set the pitch of each Note to the pitch for this chord's note_type of the key in the chord
         self._mingus_key_to_key_enum_mapping = Scale.get_mingus_key_to_key_enum_mapping(self.matched_key_type)
-        set_notes_pitches_to_mingus_keys(self.mingus_chord,
-                                         self._mingus_key_to_key_enum_mapping,
-                                         self,
-                                         self.pitch_for_key,
-                                         self.octave,
-                                         validate=False)
+        self._writable_notes_view()[:, mn.attr_name_idx_map['pitch']] = pitches
 
     @staticmethod
     def get_key_type(key, harmonic_chord):
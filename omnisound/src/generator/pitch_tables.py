@@ -0,0 +1,77 @@
+# Copyright 2020 Mark S. Weiss
+
+"""
+Memoized pitches of the keys of each Chord and Scale. Building a Chord or Scale asks mingus for the names of its
+keys, maps each name to a key enum and converts each key to a pitch with the note adapter's `pitch_for_key()`.
+The result only depends on the harmonic chord or scale, the key, the octave and `pitch_for_key()`, so each table
+entry is built the first time it is requested and every later Chord or Scale copies its pitches from the table.
+"""
+
+from typing import Any, Callable, Dict, List, Tuple, Union
+
+from numpy import array as np_array, ndarray
+
+from omnisound.src.generator.chord_globals import HarmonicChord
+from omnisound.src.generator.scale_globals import HarmonicScale, MajorKey, MinorKey, MAJOR_KEY_DICT, MINOR_KEY_DICT
+from omnisound.src.utils.enum_utils import enum_to_dict_reverse_mapping
+
+PitchForKey = Callable[[Union[MajorKey, MinorKey], int], Union[float, int]]
+
+MINGUS_KEY_TO_KEY_ENUM_MAPPINGS = {MajorKey: enum_to_dict_reverse_mapping(MajorKey),
+                                   MinorKey: enum_to_dict_reverse_mapping(MinorKey)}
+
+# (harmonic_chord, key, octave, pitch_for_key) -> (mingus key names, pitches)
+_CHORD_PITCH_TABLE: Dict[Tuple[HarmonicChord, Any, int, PitchForKey], Tuple[Tuple[str, ...], ndarray]] = {}
+# (harmonic_scale, key, octave, pitch_for_key) -> (key enums, pitches)
+_SCALE_PITCH_TABLE: Dict[Tuple[HarmonicScale, Any, int, PitchForKey], Tuple[Tuple[Any, ...], ndarray]] = {}
+
+
+def _pitches(mingus_keys: List[str], key_type: Any, pitch_for_key: PitchForKey, octave: int) -> ndarray:
+    mingus_key_to_key_enum_mapping = MINGUS_KEY_TO_KEY_ENUM_MAPPINGS[key_type]
+    pitches = np_array([pitch_for_key(mingus_key_to_key_enum_mapping[mingus_key.upper()], octave=octave)
+                        for mingus_key in mingus_keys], dtype=float)
+    # Shared by every Chord or Scale built from this entry, which copy it
+    pitches.setflags(write=False)
+    return pitches
+
+
+def chord_pitches(harmonic_chord: HarmonicChord,
+                  key: Union[MajorKey, MinorKey],
+                  octave: int,
+                  pitch_for_key: PitchForKey) -> Tuple[Tuple[str, ...], ndarray]:
+    """Returns the mingus names of the keys in the chord and the pitch of each key, in chord order"""
+    table_key = (harmonic_chord, key, octave, pitch_for_key)
+    entry = _CHORD_PITCH_TABLE.get(table_key)
+    if entry is None:
+        mingus_keys = harmonic_chord.value(key.name)
+        entry = (tuple(mingus_keys), _pitches(mingus_keys, type(key), pitch_for_key, octave))
+        _CHORD_PITCH_TABLE[table_key] = entry
+    return entry
+
+
+def scale_pitches(harmonic_scale: HarmonicScale,
+                  key: Union[MajorKey, MinorKey],
+                  octave: int,
+                  pitch_for_key: PitchForKey) -> Tuple[Tuple[Any, ...], ndarray]:
+    """Returns the key enums of the keys in the scale and the pitch of each key, in ascending order"""
+    table_key = (harmonic_scale, key, octave, pitch_for_key)
+    entry = _SCALE_PITCH_TABLE.get(table_key)
+    if entry is None:
+        # Scales are constructed with the key type, MajorKey or MinorKey, not a key
+        str_key_dict = MAJOR_KEY_DICT if key is MajorKey else MINOR_KEY_DICT
+        mingus_keys = harmonic_scale.value(list(str_key_dict.keys())[0]).ascending()
+        # Trim the last element because mingus returns the first note in the next octave along with all the
+        # notes in the scale of the octave requested. This behavior is observed and not exhaustively tested
+        # so check and only remove if the first and last note returned are the same.
+        if mingus_keys[0] == mingus_keys[-1]:
+            mingus_keys = mingus_keys[:-1]
+        mingus_key_to_key_enum_mapping = MINGUS_KEY_TO_KEY_ENUM_MAPPINGS[key]
+        entry = (tuple(mingus_key_to_key_enum_mapping[mingus_key.upper()] for mingus_key in mingus_keys),
+                 _pitches(mingus_keys, key, pitch_for_key, octave))
+        _SCALE_PITCH_TABLE[table_key] = entry
+    return entry
+
+
+def clear_pitch_tables():
+    _CHORD_PITCH_TABLE.clear()
+    _SCALE_PITCH_TABLE.clear()
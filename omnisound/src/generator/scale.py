@@ -13,10 +13,8 @@ from typing import Union
 
 from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.container.note_sequence import NoteSequence
-from omnisound.src.generator.scale_globals import (HarmonicScale, MajorKey,
-                                                   MinorKey, MAJOR_KEY_DICT, MINOR_KEY_DICT)
-from omnisound.src.utils.mingus_utils import set_notes_pitches_to_mingus_keys
-from omnisound.src.utils.enum_utils import enum_to_dict_reverse_mapping
+from omnisound.src.generator.pitch_tables import MINGUS_KEY_TO_KEY_ENUM_MAPPINGS, scale_pitches
+from omnisound.src.generator.scale_globals import HarmonicScale, MajorKey, MinorKey
 from omnisound.src.utils.validation_utils import validate_type_reference_choice, validate_types
 
 
@@ -27,8 +25,8 @@ class Scale(NoteSequence):
        and a root key. Uses mingus.scale to then retrieve the notes in the scale and provide methods to manage
        and generate Notes. Derives from NoteSequence so acts as a standard Note container.
     """
-    MAJOR_KEY_REVERSE_MAP = enum_to_dict_reverse_mapping(MajorKey)
-    MINOR_KEY_REVERSE_MAP = enum_to_dict_reverse_mapping(MinorKey)
+    MAJOR_KEY_REVERSE_MAP = MINGUS_KEY_TO_KEY_ENUM_MAPPINGS[MajorKey]
+    MINOR_KEY_REVERSE_MAP = MINGUS_KEY_TO_KEY_ENUM_MAPPINGS[MinorKey]
     KEY_MAPS = {'MajorKey': MAJOR_KEY_REVERSE_MAP, 'MinorKey': MINOR_KEY_REVERSE_MAP}
 
     def __init__(self,
@@ -49,26 +47,13 @@ class Scale(NoteSequence):
         self.octave = octave
         self.harmonic_scale = harmonic_scale
 
-        # Get the mingus keys (pitches) for the musical scale (`scale_type`) with its root at `key`
-        str_key_dict = MAJOR_KEY_DICT if self.is_major_key else MINOR_KEY_DICT
-        mingus_keys = harmonic_scale.value(list(str_key_dict.keys())[0]).ascending()
-        # Trim the last element because mingus returns the first note in the next octave along with all the
-        # notes in the scale of the octave requested. This behavior is observed and not exhaustively tested
-        # so check and only remove if the first and last note returned are the same.
-        if mingus_keys[0] == mingus_keys[-1]:
-            mingus_keys = mingus_keys[:-1]
-        mingus_key_to_key_enum_mapping = Scale.KEY_MAPS[matched_key_type.__name__]
-        self.keys = [mingus_key_to_key_enum_mapping[mingus_key.upper()] for mingus_key in mingus_keys]
+        # Get the keys and their pitches for the musical scale (`scale_type`) with its root at `key`
+        keys, pitches = scale_pitches(harmonic_scale, key, octave, mn.pitch_for_key)
+        self.keys = list(keys)
 
         # Construct the sequence of notes for the chord in the NoteSequence base class
-        super(Scale, self).__init__(num_notes=len(mingus_keys), mn=mn)
-
-        set_notes_pitches_to_mingus_keys(mingus_keys,
-                                         mingus_key_to_key_enum_mapping,
-                                         self,
-                                         mn.pitch_for_key,
-                                         self.octave,
-                                         validate=False)
+        super(Scale, self).__init__(num_notes=len(self.keys), mn=mn)
+        self._writable_notes_view()[:, mn.attr_name_idx_map['pitch']] = pitches
 
     @staticmethod
     def get_mingus_key_to_key_enum_mapping(key_type: Union[MajorKey, MinorKey]):
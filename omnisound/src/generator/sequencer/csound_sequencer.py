@@ -5,6 +5,7 @@ from typing import Optional, Union
 from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.note.adapter.csound_note import (ATTR_NAME_IDX_MAP, ATTR_VAL_CAST_MAP, CLASS_NAME,
                                                     pitch_for_key, make_note, NUM_ATTRIBUTES)
+from omnisound.src.generator.sequencer.pattern_cache import PatternCache
 from omnisound.src.generator.sequencer.sequencer import Sequencer
 from omnisound.src.modifier.meter import Meter
 from omnisound.src.modifier.swing import Swing
@@ -18,7 +19,8 @@ class CSoundSequencer(Sequencer):
                  meter: Optional[Meter] = None,
                  swing: Optional[Swing] = None,
                  player: Optional[Union[CSoundCSDPlayer, CSoundInteractivePlayer]] = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 pattern_cache: Optional[PatternCache] = None):
         if not mn:
             mn = MakeNoteConfig(cls_name=CLASS_NAME,
                                 num_attributes=NUM_ATTRIBUTES,
@@ -31,4 +33,5 @@ class CSoundSequencer(Sequencer):
                                               meter=meter,
                                               swing=swing,
                                               player=player,
-                                              mn=mn)
+                                              mn=mn,
+                                              pattern_cache=pattern_cache)
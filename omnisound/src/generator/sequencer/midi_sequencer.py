@@ -7,6 +7,7 @@ from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.note.adapter.midi_note import (ATTR_NAME_IDX_MAP, ATTR_VAL_CAST_MAP, CLASS_NAME,
                                                   pitch_for_key, make_note, NUM_ATTRIBUTES)
 from omnisound.src.generator.chord import Chord
+from omnisound.src.generator.sequencer.pattern_cache import PatternCache
 from omnisound.src.generator.sequencer.sequencer import Sequencer
 from omnisound.src.modifier.meter import Meter
 from omnisound.src.modifier.swing import Swing
@@ -22,7 +23,8 @@ class MidiSingleTrackSequencer(Sequencer):
                  meter: Optional[Meter] = None,
                  swing: Optional[Swing] = None,
                  arpeggiator_chord: Optional[Chord] = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 pattern_cache: Optional[PatternCache] = None):
         if not mn:
             mn = MakeNoteConfig(cls_name=CLASS_NAME,
                                 num_attributes=NUM_ATTRIBUTES,
@@ -37,7 +39,8 @@ class MidiSingleTrackSequencer(Sequencer):
                 swing=swing,
                 arpeggiator_chord=arpeggiator_chord,
                 player=MidiInteractiveSingleTrackPlayer(append_mode=MidiPlayerAppendMode.AppendAfterPreviousNote),
-                mn=mn)
+                mn=mn,
+                pattern_cache=pattern_cache)
 
 
 class MidiMultitrackSequencer(Sequencer):
@@ -47,7 +50,8 @@ class MidiMultitrackSequencer(Sequencer):
                  meter: Optional[Meter] = None,
                  swing: Optional[Swing] = None,
                  arpeggiator_chord: Optional[Chord] = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 pattern_cache: Optional[PatternCache] = None):
         if not mn:
             mn = MakeNoteConfig(cls_name=CLASS_NAME,
                                 num_attributes=NUM_ATTRIBUTES,
@@ -62,7 +66,8 @@ class MidiMultitrackSequencer(Sequencer):
               swing=swing,
               arpeggiator_chord=arpeggiator_chord,
               player=MidiInteractiveMultitrackPlayer(append_mode=MidiPlayerAppendMode.AppendAfterPreviousNote),
-              mn=mn)
+              mn=mn,
+              pattern_cache=pattern_cache)
 
 
 class MidiWriterSequencer(Sequencer):
@@ -72,7 +77,8 @@ class MidiWriterSequencer(Sequencer):
                  meter: Optional[Meter] = None,
                  swing: Optional[Swing] = None,
                  midi_file_path: Path = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 pattern_cache: Optional[PatternCache] = None):
         if not mn:
             mn = MakeNoteConfig(cls_name=CLASS_NAME,
                                 num_attributes=NUM_ATTRIBUTES,
@@ -87,4 +93,5 @@ class MidiWriterSequencer(Sequencer):
               swing=swing,
               player=MidiWriter(append_mode=MidiPlayerAppendMode.AppendAfterPreviousNote,
                                 midi_file_path=midi_file_path),
-              mn=mn)
+              mn=mn,
+              pattern_cache=pattern_cache)
@@ -0,0 +1,117 @@
+# Copyright 2020 Mark S. Weiss
+
+from collections import OrderedDict
+from hashlib import sha256
+from os import replace as os_replace
+from pathlib import Path
+from tempfile import NamedTemporaryFile
+from typing import Hashable, Optional
+
+from numpy import load as np_load, ndarray, savez as np_savez
+
+from omnisound.src.utils.validation_utils import validate_optional_type, validate_type
+
+# Part of the key of each pattern stored on disk, so changing how patterns are compiled or stored can't load
+#  patterns stored by an earlier version
+PATTERN_CACHE_FORMAT_VERSION = 1
+PATTERN_FILE_SUFFIX = '.npz'
+
+
+class CompiledPattern:
+    """The notes of all the Measures of a pattern, as one array, and the offset of each Measure's first note in it,
+       followed by the total number of notes. Arrays are read-only, because they are shared by every use of the
+       pattern."""
+    def __init__(self, note_attr_vals: ndarray = None, measure_offsets: ndarray = None):
+        note_attr_vals.setflags(write=False)
+        measure_offsets.setflags(write=False)
+        self.note_attr_vals = note_attr_vals
+        self.measure_offsets = measure_offsets
+
+
+class PatternCache:
+    """Caches the notes compiled from Sequencer patterns, keyed by everything that determines the notes. Holds up to
+       `max_size` patterns in memory and evicts the least recently used one when full. If `cache_dir` is set, each
+       compiled pattern that has a `disk_key` is also stored in a file there named by a hash of the `disk_key`, so
+       other processes using the same directory start with every pattern already compiled. The in-memory key can hold
+       objects that are only equal within a process, e.g. functions, and the `disk_key` can't. A `max_size` of 0
+       disables the in-memory cache.
+
+       `hits` counts patterns found in memory, `disk_hits` those found in `cache_dir`, and `misses` those that had
+       to be compiled.
+    """
+    DEFAULT_MAX_SIZE = 1024
+
+    def __init__(self, max_size: int = DEFAULT_MAX_SIZE, cache_dir: Optional[Path] = None):
+        validate_type('max_size', max_size, int)
+        validate_optional_type('cache_dir', cache_dir, Path)
+        if max_size < 0:
+            raise ValueError(f'`max_size` must be >= 0, max_size: {max_size}')
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        if cache_dir:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+        self._patterns = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    @staticmethod
+    def key_hash(disk_key: Hashable) -> str:
+        """A hash of the content of `disk_key` that is the same in every process. Disk keys are tuples of strings,
+           numbers and booleans, whose `repr()` doesn't depend on the process, unlike `hash()` of strings."""
+        return sha256(repr((PATTERN_CACHE_FORMAT_VERSION, disk_key)).encode('utf-8')).hexdigest()
+
+    def _pattern_path(self, disk_key: Hashable) -> Path:
+        return self.cache_dir / f'{PatternCache.key_hash(disk_key)}{PATTERN_FILE_SUFFIX}'
+
+    def _put_in_memory(self, key: Hashable, compiled_pattern: CompiledPattern):
+        if not self.max_size:
+            return
+        self._patterns[key] = compiled_pattern
+        self._patterns.move_to_end(key)
+        if len(self._patterns) > self.max_size:
+            self._patterns.popitem(last=False)
+
+    def get(self, key: Hashable, disk_key: Optional[Hashable] = None) -> Optional[CompiledPattern]:
+        """Returns the pattern stored for `key` in memory, or else for `disk_key` in `cache_dir`, or None, and counts
+           the lookup as a hit, disk hit or miss"""
+        compiled_pattern = self._patterns.get(key)
+        if compiled_pattern is not None:
+            self._patterns.move_to_end(key)
+            self.hits += 1
+            return compiled_pattern
+
+        if self.cache_dir and disk_key is not None:
+            pattern_path = self._pattern_path(disk_key)
+            if pattern_path.exists():
+                with np_load(str(pattern_path)) as pattern_file:
+                    compiled_pattern = CompiledPattern(note_attr_vals=pattern_file['note_attr_vals'],
+                                                       measure_offsets=pattern_file['measure_offsets'])
+                self._put_in_memory(key, compiled_pattern)
+                self.disk_hits += 1
+                return compiled_pattern
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, compiled_pattern: CompiledPattern, disk_key: Optional[Hashable] = None):
+        """Stores `compiled_pattern` for `key` in memory, and for `disk_key` in `cache_dir` if both are set"""
+        validate_type('compiled_pattern', compiled_pattern, CompiledPattern)
+        self._put_in_memory(key, compiled_pattern)
+        if self.cache_dir and disk_key is not None:
+            # Write to a temporary file and rename it, so other processes never load a partly written pattern
+            with NamedTemporaryFile(dir=str(self.cache_dir), suffix=PATTERN_FILE_SUFFIX, delete=False) as pattern_file:
+                np_savez(pattern_file,
+                         note_attr_vals=compiled_pattern.note_attr_vals,
+                         measure_offsets=compiled_pattern.measure_offsets)
+            os_replace(pattern_file.name, str(self._pattern_path(disk_key)))
+
+    def clear(self):
+        """Removes all patterns from memory, but not from `cache_dir`, and resets the counters"""
+        self._patterns.clear()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
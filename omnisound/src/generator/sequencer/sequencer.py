@@ -1,21 +1,24 @@
 # Copyright 2020 Mark S. Weiss
 
-from typing import Any, Optional, Union
+from typing import Any, Hashable, Optional, Tuple, Union
 
-import pytest
+from numpy import concatenate as np_concatenate, cumsum as np_cumsum
 
 from omnisound.src.generator.chord_globals import harmonic_chord_to_str
 from omnisound.src.note.adapter.note import MakeNoteConfig, NoteValues, set_attr_vals_from_note_values
 from omnisound.src.container.measure import Measure
 from omnisound.src.container.section import Section
 from omnisound.src.container.song import Song
+from omnisound.src.container.song_archive import _callable_ref, SongArchiveException
 from omnisound.src.container.track import Track
 from omnisound.src.generator.chord import Chord
 from omnisound.src.generator.chord_globals import HarmonicChord, HARMONIC_CHORD_DICT
 from omnisound.src.generator.scale_globals import MAJOR_KEY_DICT, MINOR_KEY_DICT
+from omnisound.src.generator.sequencer.pattern_cache import CompiledPattern, PatternCache
 from omnisound.src.modifier.meter import Meter, NoteDur
 from omnisound.src.modifier.swing import Swing
 from omnisound.src.player.player import Player, Writer
+from omnisound.src.utils.math_utils import approx_equal
 from omnisound.src.utils.validation_utils import (validate_optional_type_choice, validate_optional_types, validate_type,
                                                   validate_type_choice, validate_type_reference, validate_types)
 
@@ -65,6 +68,9 @@ class Sequencer(Song):
     DEFAULT_ARPEGGIATOR_CHORD = HarmonicChord.MajorTriad
     DEFAULT_ARPEGGIATOR_CHORD_KEY = harmonic_chord_to_str(DEFAULT_ARPEGGIATOR_CHORD)
 
+    # Shared by all Sequencers not constructed with their own `pattern_cache`
+    DEFAULT_PATTERN_CACHE = PatternCache()
+
     def __init__(self,
                  name: Optional[str] = None,
                  num_measures: int = None,
@@ -72,11 +78,13 @@ class Sequencer(Song):
                  swing: Optional[Swing] = None,
                  player: Optional[Union[Player, Writer]] = None,
                  arpeggiator_chord: Optional[Chord] = None,
-                 mn: MakeNoteConfig = None):
+                 mn: MakeNoteConfig = None,
+                 pattern_cache: Optional[PatternCache] = None):
         validate_types(('num_measures', num_measures, int), ('mn', mn, MakeNoteConfig))
         validate_optional_types(('name', name, str),
                                 ('swing', swing, Swing),
-                                ('arpeggiator_chord', arpeggiator_chord, Chord))
+                                ('arpeggiator_chord', arpeggiator_chord, Chord),
+                                ('pattern_cache', pattern_cache, PatternCache))
         validate_optional_type_choice('player', player, (Player, Writer))
 
         # Sequencer wraps song but starts with no Tracks. It provides an alternate API for generating and adding Tracks.
@@ -89,6 +97,8 @@ class Sequencer(Song):
             self.player.song = self
         self.arpeggiator_chord = arpeggiator_chord or Sequencer.DEFAULT_ARPEGGIATOR_CHORD
         self.mn = mn
+        # Not `or`, because an empty PatternCache is falsy
+        self.pattern_cache = pattern_cache if pattern_cache is not None else Sequencer.DEFAULT_PATTERN_CACHE
 
         self.num_measures = num_measures or Sequencer.DEFAULT_NUM_MEASURES
         self.default_note_duration: float = self.meter.beat_note_dur.value
@@ -107,14 +117,11 @@ class Sequencer(Song):
     @tempo.setter
     def tempo(self, tempo: int) -> None:
         """
-        Sets the meter.tempo_qpm to the tempo value provided. Also recursively traverses down to every measure
-        in every section in every track, rebuilding the measures notes to adjust their start times to use the
-        new meter with the new tempo.
+        Sets the meter.tempo_qpm to the tempo value provided. Also retimes every measure in every track, scaling
+        the notes' start times and durations from the tempo of their measure to the new tempo, in one pass.
         """
         validate_type('tempo', tempo, int)
-        self.meter.tempo = tempo
-        for track in self.track_list:
-            track.tempo = tempo
+        Song.tempo.fset(self, tempo)
 
     def set_tempo_for_track(self, track_name: str = None, tempo: int = None):
         validate_types(('track_name', track_name, str), ('tempo', tempo, int))
@@ -251,15 +258,79 @@ class Sequencer(Song):
             section.extend(Section.copy(section_cpy).measure_list)
         section.extend(Section.copy(section_cpy).measure_list[:remainder])
 
-    # TODO MORE SOPHISTICATED PARSING IF WE EXTEND THE PATTERN LANGUAGE
+    def _pattern_keys(self,
+                      pattern: str = None,
+                      instrument: Union[float, int] = None,
+                      arpeggiate: bool = False,
+                      arpeggiator_chord: Optional[HarmonicChord] = None) -> Tuple[Hashable, Optional[Hashable]]:
+        """Keys of everything that determines the notes compiled from `pattern`, for the in-memory and the on-disk
+           caches of `self.pattern_cache`. The in-memory key holds the note config functions themselves, so notes
+           compiled with different functions, e.g. two lambdas, never share a key. The on-disk key holds the
+           references the functions are imported from instead, so it can be compared across processes and hashed to
+           name the pattern's file in a `PatternCache.cache_dir`. It is None if a function can't be imported from its
+           reference, e.g. a lambda, and then the pattern isn't stored on disk.
+           Tempo and swing aren't part of the keys, because they aren't applied to the compiled notes.
+        """
+        mn = self.mn
+        funcs = (mn.make_note, mn.pitch_for_key) + tuple(mn.attr_val_cast_map.values())
+        try:
+            func_refs = tuple(_callable_ref(func) for func in funcs)
+        except SongArchiveException:
+            func_refs = None
+        # The arpeggiator chord only changes the notes if the pattern is arpeggiated
+        arpeggiator_chord_key = harmonic_chord_to_str(arpeggiator_chord or self.arpeggiator_chord) \
+            if arpeggiate else None
+
+        def _key(func_keys: Tuple[Hashable, ...]) -> Hashable:
+            adapter_key = (mn.cls_name, mn.num_attributes, tuple(mn.attr_name_idx_map.items()),
+                           tuple((attr_name, float(attr_val))
+                                 for attr_name, attr_val in mn.attr_val_default_map.items()),
+                           tuple(mn.attr_val_cast_map.keys()), func_keys)
+            return (pattern, self.meter.beats_per_measure, self.meter.beat_note_dur.value, self.default_note_duration,
+                    adapter_key, instrument, arpeggiate, arpeggiator_chord_key)
+
+        return _key(funcs), _key(func_refs) if func_refs is not None else None
+
     def _parse_pattern_to_section(self,
                                   pattern: str = None,
                                   instrument: Union[float, int] = None,
                                   swing: Swing = None,
                                   arpeggiate: bool = False,
                                   arpeggiator_chord: Optional[HarmonicChord] = None) -> Section:
-        section = Section([])
+        """Returns a Section of new Measures with the notes of `pattern`. Patterns are only compiled the first time
+           they are seen by `self.pattern_cache`, after that the Measures are copied from the notes it stores."""
         swing = swing or self.swing
+        key, disk_key = self._pattern_keys(pattern=pattern, instrument=instrument,
+                                           arpeggiate=arpeggiate, arpeggiator_chord=arpeggiator_chord)
+        compiled_pattern = self.pattern_cache.get(key, disk_key=disk_key)
+        if compiled_pattern is None:
+            section = self._compile_pattern_to_section(pattern=pattern, instrument=instrument, swing=swing,
+                                                       arpeggiate=arpeggiate, arpeggiator_chord=arpeggiator_chord)
+            measure_offsets = np_cumsum([0] + [len(measure) for measure in section])
+            self.pattern_cache.put(key, CompiledPattern(
+                    note_attr_vals=np_concatenate([measure._notes_view() for measure in section]),
+                    measure_offsets=measure_offsets), disk_key=disk_key)
+            return section
+
+        section = Section([])
+        offsets = compiled_pattern.measure_offsets.tolist()
+        for start, end in zip(offsets, offsets[1:]):
+            measure = Measure(num_notes=end - start,
+                              meter=self.meter,
+                              swing=swing,
+                              mn=MakeNoteConfig.copy(self.mn))
+            measure._writable_notes_view()[:] = compiled_pattern.note_attr_vals[start:end]
+            section.append(measure)
+        return section
+
+    # TODO MORE SOPHISTICATED PARSING IF WE EXTEND THE PATTERN LANGUAGE
+    def _compile_pattern_to_section(self,
+                                    pattern: str = None,
+                                    instrument: Union[float, int] = None,
+                                    swing: Swing = None,
+                                    arpeggiate: bool = False,
+                                    arpeggiator_chord: Optional[HarmonicChord] = None) -> Section:
+        section = Section([])
 
         def _make_note_vals(_instrument, _start, _duration, _amplitude, _pitch):
             _note_vals = NoteValues(self.mn.attr_name_idx_map.keys())
@@ -345,8 +416,8 @@ class Sequencer(Song):
             # TODO WE SHOULD NOT NEED THIS ANYMORE BUT WE STILL DO OR TESTS FAIL ON MEASURE DURATION
             # Don't validate measure duration if we are arpeggiating, because arpeggiating on the last note will
             #  push offset start times beyond the end of the measure
-            if not arpeggiate and measure_duration != \
-                    pytest.approx(self.meter.beats_per_measure * self.meter.beat_note_dur.value):
+            if not arpeggiate and not \
+                    approx_equal(measure_duration, self.meter.beats_per_measure * self.meter.beat_note_dur.value):
                 raise InvalidPatternException((f'Measure duration {measure_duration} != '
                                                f'self.meter.beats_per_measure {self.meter.beats_per_measure} * '
                                                f'self.meter_beat_note_dur {self.meter.beat_note_dur.value}'))
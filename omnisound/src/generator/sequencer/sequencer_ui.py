@@ -21,11 +21,6 @@ from optparse import OptionParser
 from time import sleep
 import threading
 
-# noinspection PyProtectedMember
-from mido import open_output
-# noinspection PyPep8Naming
-import PySimpleGUI as sg
-
 from omnisound.src.container.measure import Measure
 from omnisound.src.container.track import MidiTrack
 from omnisound.src.generator.chord import Chord
@@ -35,7 +30,7 @@ from omnisound.src.generator.scale_globals import MAJOR_KEY_DICT
 from omnisound.src.note.adapter.note import as_dict, set_attr_vals_from_dict, NoteValues
 from omnisound.src.note.adapter.midi_note import pitch_for_key
 from omnisound.src.modifier.meter import Meter
-from omnisound.src.player.midi.midi_player import get_midi_messages_and_notes_for_track
+from omnisound.src.player.midi.midi_player import get_midi_messages_and_notes_for_track, open_virtual_output
 from omnisound.src.utils.mingus_utils import get_chord_pitches
 import omnisound.src.note.adapter.midi_note as midi_note
 
@@ -88,6 +83,9 @@ def _get_note_config_and_scale(meter):
 
 # TODO Swing support in UI
 def _generate_tracks_and_layout(num_tracks, measures_per_track, meter):
+    # noinspection PyPep8Naming
+    import PySimpleGUI as sg
+
     note_config, scale = _get_note_config_and_scale(meter)
 
     for track_idx in range(num_tracks):
@@ -179,9 +177,12 @@ def _loop_track(track, track_idx, num_notes, port):
 
 # noinspection PyBroadException
 def start(notes_per_measure, measures_per_track):
+    # noinspection PyPep8Naming
+    import PySimpleGUI as sg
+
     # This launches the parent thread / event loop
     window = sg.Window('Omnisound Sequencer', LAYOUT)
-    port = open_output(PORT_NAME, True)  # flag is virtual=True to create a MIDI virtual port
+    port = open_virtual_output(PORT_NAME)
 
     # Init state for updating display in the track event handler loops
     notes_per_track = notes_per_measure * measures_per_track
@@ -1,13 +1,14 @@
 # Copyright 2018 Mark S. Weiss
 
-from bisect import bisect_left
 from enum import Enum
-from typing import Union
+from typing import List, Sequence, Tuple, Union
 
-import pytest
+from numpy import abs as np_abs, array as np_array, concatenate as np_concatenate, cumsum as np_cumsum, \
+    maximum as np_maximum, ndarray, repeat as np_repeat, searchsorted as np_searchsorted, where as np_where
 
 from omnisound.src.container.note_sequence import NoteSequence
-from omnisound.src.utils.validation_utils import validate_optional_types, validate_type, validate_type_choice
+from omnisound.src.utils.validation_utils import validate_optional_types, validate_sequence_of_type, validate_type, \
+    validate_type_choice
 
 
 class InvalidMeterStringException(Exception):
@@ -49,10 +50,67 @@ METER_BEATS_NOTE_DUR_MAP = {
 }
 
 
+# Quantizing compares note start times rounded to one decimal place. Rounding a float to one decimal place never
+#  ties, so each comparison is the same as comparing the unrounded start to one of these bounds, which lets quantizing
+#  compare whole columns of start times at once. E.g. `round(start, 1) > 0.0` iff `start >= 0.05`.
+QUANTIZE_ROUNDS_TO_ZERO_BOUND = 0.05
+QUANTIZE_ROUNDS_TO_ONE_LOWER_BOUND = 0.95
+QUANTIZE_ROUNDS_TO_ONE_UPPER_BOUND = 1.05
+
+
 class InvalidQuantizationDurationException(Exception):
     pass
 
 
+def _quantize_columns(starts: ndarray, durations: ndarray, note_counts: List[int],
+                      measure_durs: ndarray) -> Tuple[ndarray, ndarray]:
+    """The `Meter.quantize()` algorithm applied to the start and duration columns of a batch of note sequences at
+       once. `starts` and `durations` are the columns of all the sequences concatenated, `note_counts` is the number
+       of notes in each sequence, none of them 0, and `measure_durs` is the measure duration of each sequence's
+       meter. Returns the quantized starts and durations.
+    """
+    offsets = np_cumsum(note_counts) - note_counts
+    notes_durs = np_maximum.reduceat(starts + durations, offsets)
+    # Sequences that already fill the measure exactly are left as they are
+    adjusting = notes_durs != measure_durs
+    total_adjustments = np_repeat(measure_durs - notes_durs, note_counts)
+    note_adjusting = np_repeat(adjusting, note_counts)
+
+    # Each note's duration adjusts by its share of the total adjustment, and each note that doesn't start at 0
+    #  moves forward/back by the rest of the total adjustment
+    dur_adjustments = durations * total_adjustments
+    durations = np_where(note_adjusting, durations + dur_adjustments, durations)
+    # round(start, 1) > 0.0
+    moving = note_adjusting & (starts >= QUANTIZE_ROUNDS_TO_ZERO_BOUND)
+    starts = np_where(moving, starts + (total_adjustments - dur_adjustments), starts)
+    # Note can't adjust to < 0.0 or > 1.0
+    # round(start, 1) == 0.0
+    to_zero = moving & (np_abs(starts) < QUANTIZE_ROUNDS_TO_ZERO_BOUND)
+    # round(start, 1) == 1.0
+    to_end = moving & ~to_zero & (starts > QUANTIZE_ROUNDS_TO_ONE_LOWER_BOUND) & \
+        (starts < QUANTIZE_ROUNDS_TO_ONE_UPPER_BOUND)
+    starts[to_zero] = 0.0
+    starts[to_end] = 1.0 - durations[to_end]
+    return starts, durations
+
+
+def _quantize_starts_to_beat(starts: ndarray, beat_start_times: ndarray) -> ndarray:
+    """Returns the closest beat start time to each start time in `starts`. `beat_start_times` is the start time of
+       each beat in the measure followed by the end time of the measure, as a sentinel."""
+    # Insertion point of each start in the beat start times, the same as bisect_left() per start
+    idxs = np_searchsorted(beat_start_times, starts, side='left')
+    num_beat_start_times = len(beat_start_times)
+    prev_starts = beat_start_times[(idxs - 1).clip(0, num_beat_start_times - 1)]
+    next_starts = beat_start_times[idxs.clip(0, num_beat_start_times - 1)]
+    # The note is either closest to the beat before it or the beat after it, and ties go to the beat before it
+    quantized = np_where(starts - prev_starts <= next_starts - starts, prev_starts, next_starts)
+    # Note maps to 0th beat
+    quantized[idxs == 0] = 0.0
+    # Note starts after last beat, so maps to last beat
+    quantized[idxs == num_beat_start_times] = beat_start_times[-2]
+    return quantized
+
+
 # TODO THIS NEEDS A NOTION OF TEMPO TO MAKE beat_start_times and quantizing valid
 class Meter:
     """Class to represent and manage Meter in a musical Measure/Bar. Offers facilities for representing and
@@ -113,6 +171,8 @@ class Meter:
         self.beat_note_dur_secs = self.quarter_notes_per_beat_note * self.quarter_note_dur_secs
         self.measure_dur_secs = self.beat_note_dur_secs * self.beats_per_measure
         self.beat_start_times_secs = [self.beat_note_dur_secs * i for i in range(self.beats_per_measure)]
+        # With the measure end time appended as a sentinel value for searching for the closest beat to a note
+        self._beat_start_times_and_end_secs = np_array(self.beat_start_times_secs + [self.measure_dur_secs])
 
     def _get_tempo(self):
         return self.tempo_qpm
@@ -200,72 +260,65 @@ class Meter:
         n0                   n1
         """
         validate_type('note_sequence', note_sequence, NoteSequence)
-
-        # noinspection SpellCheckingInspection
-        if self.quantizing:
-            notes_dur = max(note.start + note.duration for note in note_sequence)
-            if notes_dur == self.measure_dur_secs:
-                return
-
-            total_adjustment = self.measure_dur_secs - notes_dur
-            # if abs(total_adjustment) > 1.0:
-            #     raise InvalidQuantizationDurationException((f'quantization adjustment value of {total_adjustment} '
-            #                                                 '> than maximum allowed adjustment of 1.0'))
-            for note in note_sequence:
-                dur_adjustment = note.duration * total_adjustment
-                # Normalize duration adjustment by duration of note, because whole note == 1 and that is the entire
-                # duration of a measure and the max adjustment, so every note adjusts as a ratio of its duration
-                # to the total adjustment needed
-                note.duration += dur_adjustment
-                # Each note that doesn't start at 0 exactly adjusts forward/back by the amount its duration adjusted
-                start_adjustment = total_adjustment - dur_adjustment
-                if round(note.start, 1) > 0.0:
-                    note.start += start_adjustment
-                    # Note can't adjust to < 0.0 or > 1.0
-                    if round(note.start, 1) == pytest.approx(0.0):
-                        note.start = 0.0
-                    elif round(note.start, 1) == pytest.approx(1.0):
-                        note.start = 1.0 - note.duration
+        Meter.quantize_note_sequences([self], [note_sequence])
 
     def quantize_to_beat(self, note_sequence: NoteSequence):
-        # sourcery skip: assign-if-exp
         """Adjusts each note start_time to the closest beat time, so that each note will start on a beat.
         """
         validate_type('note_sequence', note_sequence, NoteSequence)
+        Meter.quantize_note_sequences_to_beat([self], [note_sequence])
 
-        if self.quantizing:
-            # First quantize() to make sure notes in NoteSequence are scaled to duration of Measure
-            self.quantize(note_sequence)
-            # Then adjust note start times to closest beat
-            # Algorithm:
-            #  - self.beat_start_times is sorted, so use binary search strategy to find closest note in O(logN) time
-            #  - call bisect to find insertion point for note in the sequence of start times, the cases are:
-            #  -   insertion point i == 0, we are done, the note quantizes to the first beat
-            #  -   insertion point i > 0, then note.start >= beat_start_times[i - 1] <= note.start < beat_start_times[i]
-            #  -     in this case test distance of each beat_start_time to note.start and pick the closest one
-
-            # Append measure end time to beat_start_times as a sentinel value for bisect()
-            beat_start_times = self.beat_start_times_secs + [self.measure_dur_secs]
-            for note in note_sequence:
-                i = bisect_left(beat_start_times, note.start)
-                # Note maps to 0th beat
-                if i == 0:
-                    note.start = 0.0
-                    continue
-                # Note starts after last beat, so maps to last beat
-                elif i == len(beat_start_times):
-                    note.start = self.beat_start_times_secs[-1]
-                    continue
-                # Else note.start is between two beats in the range 1..len(beat_start_times) - 1
-                # The note is either closest to beat_start_times[i - 1] or beat_start_times[i]
-                prev_start = beat_start_times[i - 1]
-                next_start = beat_start_times[i]
-                prev_gap = note.start - prev_start
-                next_gap = next_start - note.start
-                if prev_gap <= next_gap:
-                    note.start = prev_start
-                else:
-                    note.start = next_start
+    @staticmethod
+    def _quantize(meters: Sequence['Meter'], note_sequences: Sequence[NoteSequence], to_beat: bool):
+        # Sequences with no notes have nothing to quantize
+        meters_and_note_sequences = [(meter, note_sequence) for meter, note_sequence in zip(meters, note_sequences)
+                                     if meter.quantizing and len(note_sequence)]
+        if not meters_and_note_sequences:
+            return
+        meters = [meter for meter, _ in meters_and_note_sequences]
+        note_sequences = [note_sequence for _, note_sequence in meters_and_note_sequences]
+        start_views, note_counts = NoteSequence.column_views_for_sequences(note_sequences, 'start', retained=False)
+        duration_views, _ = NoteSequence.column_views_for_sequences(note_sequences, 'duration', retained=False)
+        starts, durations = _quantize_columns(np_concatenate(start_views),
+                                              np_concatenate(duration_views),
+                                              note_counts,
+                                              np_array([meter.measure_dur_secs for meter in meters]))
+
+        if to_beat:
+            # Meters with the same beat duration and number of beats have the same beat start times, so the notes of
+            #  all the sequences with those meters are quantized to beats in one search
+            beats_keys = [(meter.beat_note_dur_secs, meter.beats_per_measure) for meter in meters]
+            for beats_key in set(beats_keys):
+                notes_mask = np_repeat([key == beats_key for key in beats_keys], note_counts)
+                meter = meters[beats_keys.index(beats_key)]
+                starts[notes_mask] = _quantize_starts_to_beat(starts[notes_mask], meter._beat_start_times_and_end_secs)
+
+        NoteSequence.write_column_views(start_views, starts)
+        NoteSequence.write_column_views(duration_views, durations)
+
+    @staticmethod
+    def quantize_note_sequences(meters: Sequence['Meter'], note_sequences: Sequence[NoteSequence]):
+        """Applies `quantize()` to each sequence in `note_sequences` using the meter at the same index in `meters`,
+           for all the sequences in one batch of array operations. Sequences with a meter that isn't quantizing
+           are left unchanged. Used to quantize all the Measures in a Section or Track at once.
+        """
+        validate_sequence_of_type('meters', meters, Meter)
+        validate_sequence_of_type('note_sequences', note_sequences, NoteSequence)
+        if len(meters) != len(note_sequences):
+            raise ValueError('`meters` and `note_sequences` must be the same length')
+        Meter._quantize(meters, note_sequences, to_beat=False)
+
+    @staticmethod
+    def quantize_note_sequences_to_beat(meters: Sequence['Meter'], note_sequences: Sequence[NoteSequence]):
+        """Applies `quantize_to_beat()` to each sequence in `note_sequences` using the meter at the same index in
+           `meters`, for all the sequences in one batch of array operations. Sequences with a meter that isn't
+           quantizing are left unchanged.
+        """
+        validate_sequence_of_type('meters', meters, Meter)
+        validate_sequence_of_type('note_sequences', note_sequences, NoteSequence)
+        if len(meters) != len(note_sequences):
+            raise ValueError('`meters` and `note_sequences` must be the same length')
+        Meter._quantize(meters, note_sequences, to_beat=True)
 
     def __str__(self):
         return (f'beats_per_measure: {self.beats_per_measure} beat_dur: {self.beat_note_dur} '
@@ -1,13 +1,30 @@
 # Copyright 2018 Mark S. Weiss
 
 from enum import Enum
-from random import random
+from typing import Optional, Sequence
 
-import pytest
+from numpy import array as np_array, concatenate as np_concatenate, floor as np_floor, full as np_full, \
+    maximum as np_maximum, ndarray, repeat as np_repeat, where as np_where
+from numpy.random import default_rng as np_default_rng
 
 from omnisound.src.container.note_sequence import NoteSequence
-from omnisound.src.utils.math_utils import (sign)
-from omnisound.src.utils.validation_utils import validate_optional_types, validate_type
+from omnisound.src.utils.math_utils import approx_equal
+from omnisound.src.utils.validation_utils import trusted, validate_optional_sequence_of_type, \
+    validate_optional_types, validate_sequence_of_type, validate_type
+
+
+def _swing_times(times: ndarray, beat_durs: ndarray, swing_ratio: float) -> ndarray:
+    """Moves each time within its beat so that the first half of each beat lasts `swing_ratio` of the beat and the
+       second half lasts the rest of it. Times on the beat don't move, a time halfway through a beat moves to
+       `swing_ratio` of the way through it, and times in between move proportionally. E.g. with a ratio of 2/3,
+       straight eighth notes become triplet swing eighth notes."""
+    beat_starts = np_floor(times / beat_durs) * beat_durs
+    beat_positions = (times - beat_starts) / beat_durs
+    swung_positions = np_where(beat_positions <= 0.5,
+                               beat_positions * (2 * swing_ratio),
+                               swing_ratio + (beat_positions - 0.5) * (2 * (1.0 - swing_ratio)))
+    # Leave times on the beat exactly as they were
+    return np_where(beat_positions == 0.0, times, beat_starts + swung_positions * beat_durs)
 
 
 # TODO THIS LOGIC IS ALL WRONG. SHOULD NOT USE A FACTOR PROPORTIONAL TO START!! SHOULD USE JITTER RANGE
@@ -16,6 +33,8 @@ class Swing(object):
 
     DEFAULT_SWING_ON = False
     DEFAULT_SWING_RANGE = 0.01
+    # The first and second half of each beat are the same length, i.e. no swing
+    STRAIGHT_SWING_RATIO = 0.5
 
     class SwingDirection(Enum):
         Forward = 'Forward'
@@ -33,10 +52,20 @@ class Swing(object):
     def __init__(self, swing_on: bool = None,
                  swing_range: float = None,
                  swing_direction: SwingDirection = None,
-                 swing_jitter_type: SwingJitterType = None):
+                 swing_jitter_type: SwingJitterType = None,
+                 swing_ratio: float = None,
+                 seed: int = None):
+        """`swing_ratio`, if set, is the fraction of each beat taken by the first half of the beat, so notes
+           off the beat are moved later, e.g. 2/3 for triplet swing. Applied before the jitter of `swing_range`.
+           Random jitter is drawn from a numpy Generator seeded with `seed`, so Swings with the same seed, e.g. one
+           per Track in different worker processes, produce the same offsets.
+        """
         validate_optional_types(('swing_on', swing_on, bool), ('swing_range', swing_range, float),
                                 ('swing_direction', swing_direction, Swing.SwingDirection),
-                                ('swing_jitter_type', swing_jitter_type, Swing.SwingJitterType))
+                                ('swing_jitter_type', swing_jitter_type, Swing.SwingJitterType),
+                                ('swing_ratio', swing_ratio, float), ('seed', seed, int))
+        if swing_ratio is not None and not 0.0 < swing_ratio < 1.0:
+            raise ValueError(f'`swing_ratio` must be > 0.0 and < 1.0, swing_ratio: {swing_ratio}')
 
         if swing_on is None:
             swing_on = Swing.DEFAULT_SWING_ON
@@ -47,6 +76,9 @@ class Swing(object):
             self.swing_range = swing_range
         self.swing_direction = swing_direction or Swing.DEFAULT_SWING_DIRECTION
         self.swing_jitter_type = swing_jitter_type or Swing.DEFAULT_SWING_JITTER_TYPE
+        self.swing_ratio = swing_ratio
+        self.seed = seed
+        self.rng = np_default_rng(seed)
 
     def is_swing_on(self):
         return self.swing_on
@@ -61,39 +93,105 @@ class Swing(object):
 
     def apply_swing(self, note_sequence: NoteSequence,
                     swing_direction: SwingDirection = None,
-                    swing_jitter_type: SwingJitterType = None):
+                    swing_jitter_type: SwingJitterType = None,
+                    beat_dur_secs: Optional[float] = None):
         """Applies swing to all notes in note_sequence, using current object settings, unless swing_direction
            is provided. In that case the swing_direction arg overrides self.swing_direction and is applied.
+           `beat_dur_secs` is the duration of a beat, which is required if `swing_ratio` is set.
         """
         validate_type('note_sequence', note_sequence, NoteSequence)
-        if self.swing_on:
-            for note in note_sequence:
-                note.start += self.calculate_swing_adjust(swing_direction, swing_jitter_type)
-                if note.start < 0.0:
-                    note.start = 0.0
-
-    # This is also called from Measure directly, so it validates the swing_direction and swing_jitter_type args
-    def calculate_swing_adjust(self,
-                               swing_direction: SwingDirection = None,
-                               swing_jitter_type: SwingJitterType = None):
+        validate_optional_types(('beat_dur_secs', beat_dur_secs, float))
+        Swing.apply_swing_to_note_sequences([self], [note_sequence],
+                                            swing_direction=swing_direction,
+                                            swing_jitter_type=swing_jitter_type,
+                                            beat_durs_secs=None if beat_dur_secs is None else [beat_dur_secs])
+
+    @staticmethod
+    def apply_swing_to_note_sequences(swings: Sequence['Swing'],
+                                      note_sequences: Sequence[NoteSequence],
+                                      swing_direction: SwingDirection = None,
+                                      swing_jitter_type: SwingJitterType = None,
+                                      beat_durs_secs: Optional[Sequence[float]] = None):
+        """Applies each Swing in `swings` to the sequence at the same index in `note_sequences`. All the sequences
+           that share a Swing, e.g. all the Measures in a Track, are swung in one batch of array operations, and
+           all of their offsets are drawn at once from that Swing's generator, in the order of the sequences.
+           `beat_durs_secs` is the duration of a beat for each sequence, required for Swings with a `swing_ratio`.
+        """
+        validate_sequence_of_type('swings', swings, Swing)
+        validate_sequence_of_type('note_sequences', note_sequences, NoteSequence)
+        validate_optional_sequence_of_type('beat_durs_secs', beat_durs_secs, float)
+        validate_optional_types(('swing_direction', swing_direction, Swing.SwingDirection),
+                                ('swing_jitter_type', swing_jitter_type, Swing.SwingJitterType))
+        if len(swings) != len(note_sequences) or (beat_durs_secs and len(beat_durs_secs) != len(note_sequences)):
+            raise ValueError('`swings`, `note_sequences` and `beat_durs_secs` must be the same length')
+
+        # Group the sequences by Swing, in the order each Swing is first seen
+        seq_idxs_for_swing = {}
+        for i, swing in enumerate(swings):
+            seq_idxs_for_swing.setdefault(id(swing), (swing, []))[1].append(i)
+        for swing, seq_idxs in seq_idxs_for_swing.values():
+            if swing.swing_on:
+                swing._apply_swing_to_columns([note_sequences[i] for i in seq_idxs],
+                                              swing_direction, swing_jitter_type,
+                                              [beat_durs_secs[i] for i in seq_idxs] if beat_durs_secs else None)
+
+    def _apply_swing_to_columns(self, note_sequences: Sequence[NoteSequence],
+                                swing_direction: Optional[SwingDirection],
+                                swing_jitter_type: Optional[SwingJitterType],
+                                beat_durs_secs: Optional[Sequence[float]]):
+        start_views, note_counts = NoteSequence.column_views_for_sequences(note_sequences, 'start', retained=False)
+        duration_views, _ = NoteSequence.column_views_for_sequences(note_sequences, 'duration', retained=False)
+        if not sum(note_counts):
+            return
+        starts = np_concatenate(start_views)
+
+        if self.swing_ratio is not None and self.swing_ratio != Swing.STRAIGHT_SWING_RATIO:
+            if beat_durs_secs is None:
+                raise ValueError('`beat_dur_secs` is required to apply swing with a `swing_ratio`')
+            beat_durs = np_repeat(np_array(beat_durs_secs), note_counts)
+            # Move the end of each note as well as the start, so notes on the beat get longer and notes off the beat
+            #  get shorter, by the swing ratio
+            ends = _swing_times(starts + np_concatenate(duration_views), beat_durs, self.swing_ratio)
+            starts = _swing_times(starts, beat_durs, self.swing_ratio)
+            NoteSequence.write_column_views(duration_views, ends - starts)
+
+        with trusted():
+            swing_adjusts = self.calculate_swing_adjusts(len(starts), swing_direction, swing_jitter_type)
+        # Notes can't be moved to start before 0.0
+        NoteSequence.write_column_views(start_views, np_maximum(starts + swing_adjusts, 0.0))
+
+    def calculate_swing_adjusts(self,
+                                num_notes: int,
+                                swing_direction: SwingDirection = None,
+                                swing_jitter_type: SwingJitterType = None) -> ndarray:
+        """Returns the swing adjustment for each of `num_notes` notes, drawing any random values for all of them at
+           once from this Swing's generator"""
+        validate_type('num_notes', num_notes, int)
         validate_optional_types(('swing_direction', swing_direction, Swing.SwingDirection),
                                 ('swing_jitter_type', swing_jitter_type, Swing.SwingJitterType))
         swing_direction = swing_direction or self.swing_direction
         swing_jitter_type = swing_jitter_type or self.swing_jitter_type
 
-        swing_adjust = self.swing_range
+        swing_adjusts = np_full(num_notes, self.swing_range)
         if swing_jitter_type == Swing.SwingJitterType.Random:
-            swing_adjust *= random()
+            swing_adjusts *= self.rng.random(num_notes)
 
-        if swing_direction == Swing.SwingDirection.Forward:
-            return swing_adjust
-        elif swing_direction == Swing.SwingDirection.Reverse:
-            return -swing_adjust
+        if swing_direction == Swing.SwingDirection.Reverse:
+            swing_adjusts = -swing_adjusts
         elif swing_direction == Swing.SwingDirection.Both:
-            return sign() * swing_adjust
+            # Each adjustment is forward or reverse with equal probability
+            swing_adjusts = np_where(self.rng.random(num_notes) < 0.5, -swing_adjusts, swing_adjusts)
+        return swing_adjusts
+
+    # This is also called from Measure directly, so it validates the swing_direction and swing_jitter_type args
+    def calculate_swing_adjust(self,
+                               swing_direction: SwingDirection = None,
+                               swing_jitter_type: SwingJitterType = None) -> float:
+        return float(self.calculate_swing_adjusts(1, swing_direction, swing_jitter_type)[0])
 
     def __eq__(self, other: 'Swing') -> bool:
         return self.swing_on == other.swing_on and \
-               self.swing_range == pytest.approx(other.swing_range) and \
+               approx_equal(self.swing_range, other.swing_range) and \
                self.swing_direction == other.swing_direction and \
-               self.swing_jitter_type == other.swing_jitter_type
+               self.swing_jitter_type == other.swing_jitter_type and \
+               self.swing_ratio == other.swing_ratio
@@ -5,7 +5,8 @@ from typing import Any, Mapping, Union
 
 import numpy as np
 
-from omnisound.src.note.adapter.note import add_base_attr_name_indexes, getter, setter, MakeNoteConfig
+from omnisound.src.note.adapter.note import (add_base_attr_name_indexes, get_note_cls, getter, identity, setter,
+                                             MakeNoteConfig)
 from omnisound.src.generator.scale_globals import (NUM_NOTES_IN_OCTAVE, MajorKey, MinorKey)
 from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_optional_type, \
     validate_sequence_of_type, validate_type, \
@@ -221,6 +222,34 @@ def to_str(self) -> str:
     return ' '.join(attr_strs)
 
 
+# Default string formatters for note attributes, this is specific to CSound per the comments in `to_str()`.
+# Handle case that pitch is a float and will have rounding but that sometimes we want
+# to use it to represent fixed pitches in Western scale, e.g. 4.01 == Middle C, and other times
+# we want to use to represent arbitrary floats in Hz. The former case requires .2f precision,
+# and for the latter case we default to .5f precision but allow any precision.
+# This is DEFAULT_PITCH_PRECISION to start with. User can call setter to update the value.
+ATTR_TO_STR_FORMATTER_MAP = {
+    'instrument': lambda x: str(x),
+    'start': lambda x: f'{x:.5f}',
+    'duration': lambda x: f'{x:.5f}',
+    'amplitude': lambda x: str(x),
+    'pitch': pitch_to_str(DEFAULT_PITCH_PRECISION),
+}
+
+# Per-note state. Everything else a note needs is shared by all notes of the same schema and lives on the class.
+# `__dict__` is kept so that callers can still hang ad hoc attributes on a note, it is only allocated if they do.
+SLOTS = ('__dict__', 'note_attr_vals', 'performance_attrs', 'pitch_precision', 'attr_to_str_formatter_map')
+
+
+def init(self, note_attr_vals: np.array):
+    self.note_attr_vals = note_attr_vals
+    self.performance_attrs = None
+    # Custom CSound attributes
+    self.pitch_precision = DEFAULT_PITCH_PRECISION
+    # Copied because the formatters can be set per note, e.g. by `set_scale_pitch_precision()`
+    self.attr_to_str_formatter_map = dict(ATTR_TO_STR_FORMATTER_MAP)
+
+
 # Meta class for dynamically creating a CSoundNote class with property accessors for an arbitrary list
 # of note attributes. Accessors are dynamically created in `_make_cls()`. This is the mechanism for overloading
 # class creation and passing that dynamically created list of methods in to Python `type` class, which is the
@@ -228,33 +257,25 @@ def to_str(self) -> str:
 # NOTE: Through experimentation found that by creating attributes here in the `cls` object, we can refer to them
 #  in the `getter()` and `setter()` wrappers through `self`, if we create them in overloaded `__new__()`. This
 #  did not work with overloaded `__init__()`.
+# NOTE: Classes are cached in the note.NOTE_CLS_REGISTRY, one per schema, so only attributes that are the same for
+#  every note of the schema can be created here. Per-note attributes are `__slots__` and are assigned in `init()`.
 class CSoundNoteMeta(type):
     def __new__(mcs, name, bases, dct):
         cls = super().__new__(mcs, name, bases, dct)
 
-        # Attributes assigned by the caller
-        cls.note_attr_vals = None
+        # Attributes assigned by `_make_cls()`
         cls.attr_name_idx_map = None
         cls.attr_val_cast_map = None
-        cls.performance_attrs = None
-
-        # Custom CSound attributes
-        cls.pitch_precision = DEFAULT_PITCH_PRECISION
-        cls.attr_to_str_formatter_map = {}
 
         return cls
 
 
-def _make_cls(attr_name_idx_map):
+def _make_cls(attr_name_idx_map, attr_val_cast_map):
     cls_bases = ()
-    methods = {}
+    methods = {'__slots__': SLOTS, '__init__': init}
     # Create dynamically getters and setters for the note attributes for this instantiation of a CSoundNote class
     for attr_name in attr_name_idx_map.keys():
-        get_func = getter(attr_name)
-        methods[f'g_{attr_name}'] = get_func
-        set_func = setter(attr_name)
-        methods[f's_{attr_name}'] = set_func
-        methods[attr_name] = property(get_func, set_func)
+        methods[attr_name] = property(getter(attr_name), setter(attr_name))
     # Standard Note accessor methods
     methods['I'] = I
     methods['S'] = S
@@ -267,12 +288,13 @@ def _make_cls(attr_name_idx_map):
     methods['__eq__'] = eq
     methods['__str__'] = to_str
     # Custom CSound methods
-    # noinspection PyTypeChecker
-    methods['pitch_precision'] = property(g_pitch_precision, s_pitch_precision)
     methods['set_scale_pitch_precision'] = set_scale_pitch_precision
     methods['set_attr_str_formatter'] = set_attr_str_formatter
 
-    return CSoundNoteMeta(CLASS_NAME, cls_bases, methods)
+    cls = CSoundNoteMeta(CLASS_NAME, cls_bases, methods)
+    cls.attr_name_idx_map = attr_name_idx_map
+    cls.attr_val_cast_map = attr_val_cast_map
+    return cls
 
 
 def make_note(note_attr_vals: np.array,
@@ -286,34 +308,16 @@ def make_note(note_attr_vals: np.array,
     if attr_val_cast_map:
         validate_optional_sequence_of_type('attr_val_cast_map', attr_val_cast_map.keys(), str)
 
-    cls = _make_cls(attr_name_idx_map)
-    note = cls()
-
-    # Assign core attributes
-    note.note_attr_vals = note_attr_vals
-    note.attr_name_idx_map = attr_name_idx_map
-
-    # Set string formatters for note attributes, this is specific to CSound per the comments
-    note.set_attr_str_formatter('instrument', lambda x: str(x))
-    note.set_attr_str_formatter('start', lambda x:  f'{x:.5f}')
-    note.set_attr_str_formatter('duration', lambda x:  f'{x:.5f}')
-    note.set_attr_str_formatter('amplitude', lambda x: str(x))
-    # Handle case that pitch is a float and will have rounding but that sometimes we want
-    # to use it to represent fixed pitches in Western scale, e.g. 4.01 == Middle C, and other times
-    # we want to use to represent arbitrary floats in Hz. The former case requires .2f precision,
-    # and for the latter case we default to .5f precision but allow any precision.
-    # This is DEFAULT_PITCH_PRECISION to start with. User can call setter to update the value.
-    note.set_attr_str_formatter('pitch', pitch_to_str(note.pitch_precision))
-
     # Set mapping of attribute names to functions that cast return type of get() calls, e.g. cast instrument to int
-    note.attr_val_cast_map = attr_val_cast_map or {}
-    for attr_name in note.attr_name_idx_map:
-        if attr_name not in note.attr_val_cast_map:
-            note.attr_val_cast_map[attr_name] = lambda x: x
+    attr_val_cast_map = attr_val_cast_map or {}
+    for attr_name in attr_name_idx_map:
+        if attr_name not in attr_val_cast_map:
+            attr_val_cast_map[attr_name] = identity
     # Instrument is always returned as an int
-    note.attr_val_cast_map['instrument'] = int
+    attr_val_cast_map['instrument'] = int
 
-    return note
+    cls = get_note_cls(CLASS_NAME, attr_name_idx_map, attr_val_cast_map, _make_cls)
+    return cls(note_attr_vals)
 
 
 DEFAULT_NOTE_CONFIG = partial(MakeNoteConfig,
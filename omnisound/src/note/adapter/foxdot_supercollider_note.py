@@ -4,7 +4,7 @@ from typing import Any, Mapping, Union
 
 from numpy import ndarray
 
-from omnisound.src.note.adapter.note import add_base_attr_name_indexes, getter, setter
+from omnisound.src.note.adapter.note import add_base_attr_name_indexes, get_note_cls, getter, identity, setter
 from omnisound.src.generator.scale_globals import (NUM_INTERVALS_IN_OCTAVE,
                                                    MajorKey, MinorKey)
 from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_optional_type, \
@@ -176,33 +176,38 @@ def to_str(self):
     return ' '.join(attr_strs)
 
 
+# Per-note state. Everything else a note needs is shared by all notes of the same schema and lives on the class.
+# `__dict__` is kept so that callers can still hang ad hoc attributes on a note, it is only allocated if they do.
+SLOTS = ('__dict__', 'note_attr_vals', 'performance_attrs', 'synth_def', 'scale')
+
+
+def init(self, note_attr_vals: ndarray):
+    self.note_attr_vals = note_attr_vals
+    self.performance_attrs = None
+    # Custom Foxdot attributes
+    self.synth_def = None
+    self.scale = None
+
+
+# NOTE: Classes are cached in the note.NOTE_CLS_REGISTRY, one per schema, so only attributes that are the same for
+#  every note of the schema can be created here. Per-note attributes are `__slots__` and are assigned in `init()`.
 class FoxdotSupercolliderNoteMeta(type):
     def __new__(mcs, name, bases, dct):
         cls = super().__new__(mcs, name, bases, dct)
 
-        # Attributes assigned by the caller
-        cls.note_attr_vals = None
+        # Attributes assigned by `_make_cls()`
         cls.attr_name_idx_map = None
         cls.attr_val_cast_map = None
-        cls.performance_attrs = None
-
-        # Custom CSound attributes
-        cls.synth_def = None
-        cls.scale = None
 
         return cls
 
 
-def _make_cls(attr_name_idx_map):
+def _make_cls(attr_name_idx_map, attr_val_cast_map):
     cls_bases = ()
-    methods = {}
+    methods = {'__slots__': SLOTS, '__init__': init}
     # Create dynamically getters and setters for the note attributes for this instantiation of FoxdotSupercollider class
     for attr_name in attr_name_idx_map.keys():
-        get_func = getter(attr_name)
-        methods[f'g_{attr_name}'] = get_func
-        set_func = setter(attr_name)
-        methods[f's_{attr_name}'] = set_func
-        methods[attr_name] = property(get_func, set_func)
+        methods[attr_name] = property(getter(attr_name), setter(attr_name))
     # Standard Note fluent accessor methods
     methods['S'] = S
     methods['DE'] = DE
@@ -217,13 +222,11 @@ def _make_cls(attr_name_idx_map):
     methods['__str__'] = to_str
     # Custom CSound methods
     # noinspection PyTypeChecker
-    methods['synth_def'] = property(g_synth_def, s_synth_def)
-    # noinspection PyTypeChecker
     methods['instrument'] = property(g_instrument, s_instrument)
-    # noinspection PyTypeChecker
-    methods['scale'] = property(g_scale, s_scale)
 
     cls = FoxdotSupercolliderNoteMeta(CLASS_NAME, cls_bases, methods)
+    cls.attr_name_idx_map = attr_name_idx_map
+    cls.attr_val_cast_map = attr_val_cast_map
     return cls
 
 
@@ -237,20 +240,14 @@ def make_note(note_attr_vals: ndarray,
     if attr_val_cast_map:
         validate_optional_sequence_of_type('attr_val_cast_map', attr_val_cast_map.keys(), str)
 
-    cls = _make_cls(attr_name_idx_map)
-    note = cls()
-
-    # Assign core attributes
-    note.note_attr_vals = note_attr_vals
-    note.attr_name_idx_map = attr_name_idx_map
-
     # Set mapping of attribute names to functions that cast return type of get() calls, e.g. cast instrument to int
-    note.attr_val_cast_map = attr_val_cast_map or {}
-    for attr_name in note.attr_name_idx_map:
-        if attr_name not in note.attr_val_cast_map:
-            note.attr_val_cast_map[attr_name] = lambda x: x
+    attr_val_cast_map = attr_val_cast_map or {}
+    for attr_name in attr_name_idx_map:
+        if attr_name not in attr_val_cast_map:
+            attr_val_cast_map[attr_name] = identity
 
     # Octave is always returned as an int
-    note.attr_val_cast_map['octave'] = int
+    attr_val_cast_map['octave'] = int
 
-    return note
+    cls = get_note_cls(CLASS_NAME, attr_name_idx_map, attr_val_cast_map, _make_cls)
+    return cls(note_attr_vals)
@@ -7,7 +7,8 @@ from typing import Any, Mapping, Union
 # TODO SHOULD THIS BE numpy.array? THAT IS USED IN note.py
 from numpy import ndarray
 
-from omnisound.src.note.adapter.note import add_base_attr_name_indexes, getter, setter, MakeNoteConfig
+from omnisound.src.note.adapter.note import (add_base_attr_name_indexes, get_note_cls, getter, identity, setter,
+                                             MakeNoteConfig)
 from omnisound.src.generator.scale_globals import (NUM_INTERVALS_IN_OCTAVE,
                                                    MajorKey, MinorKey)
 from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_optional_type, \
@@ -369,39 +370,40 @@ def to_str(self):
             f'duration: {self.duration} velocity: {self.velocity} pitch: {self.pitch} channel: {self.channel}')
 
 
+# Per-note state. Everything else a note needs is shared by all notes of the same schema and lives on the class.
+# `__dict__` is kept so that callers can still hang ad hoc attributes on a note, it is only allocated if they do.
+SLOTS = ('__dict__', 'note_attr_vals', 'performance_attrs', 'channel')
+
+
+def init(self, note_attr_vals: ndarray):
+    self.note_attr_vals = note_attr_vals
+    self.performance_attrs = None
+    # Custom Midi attributes
+    self.channel = DEFAULT_CHANNEL
+
+
+# NOTE: Classes are cached in the note.NOTE_CLS_REGISTRY, one per schema, so only attributes that are the same for
+#  every note of the schema can be created here. Per-note attributes are `__slots__` and are assigned in `init()`.
 class MidiNoteMeta(type):
     def __new__(mcs, name, bases, dct):
         cls = super().__new__(mcs, name, bases, dct)
 
-        # Attributes assigned by the caller
-        cls.note_attr_vals = None
+        # Attributes assigned by `_make_cls()`
         cls.attr_name_idx_map = None
         cls.attr_name_aliases = None
         cls.attr_val_cast_map = None
-        cls.performance_attrs = None
-
-        # Custom Midi attributes
-        cls.channel = DEFAULT_CHANNEL
 
         return cls
 
 
-def _make_cls(attr_name_idx_map):
+def _make_cls(attr_name_idx_map, attr_val_cast_map):
     cls_bases = ()
-    methods = {}
+    methods = {'__slots__': SLOTS, '__init__': init}
 
     # Create dynamically getters and setters for the note attributes for this instantiation of a CSoundNote class
     for attr_name in attr_name_idx_map.keys():
         get_func = getter(attr_name)
-        methods[f'g_{attr_name}'] = get_func
-        if attr_name in ATTR_NAME_ALIASES:
-            methods[f'g_{ATTR_NAME_ALIASES[attr_name]}'] = get_func
-
         set_func = setter(attr_name)
-        methods[f's_{attr_name}'] = set_func
-        if attr_name in ATTR_NAME_ALIASES:
-            methods[f's_{ATTR_NAME_ALIASES[attr_name]}'] = set_func
-
         methods[attr_name] = property(get_func, set_func)
         if attr_name in ATTR_NAME_ALIASES:
             methods[ATTR_NAME_ALIASES[attr_name]] = property(get_func, set_func)
@@ -422,10 +424,11 @@ def _make_cls(attr_name_idx_map):
 
     # Custom MidiNote methods
     methods['program_change'] = program_change
-    # noinspection PyTypeChecker
-    methods['channel'] = property(g_channel, s_channel)
 
-    return MidiNoteMeta(CLASS_NAME, cls_bases, methods)
+    cls = MidiNoteMeta(CLASS_NAME, cls_bases, methods)
+    cls.attr_name_idx_map = attr_name_idx_map
+    cls.attr_val_cast_map = attr_val_cast_map
+    return cls
 
 
 def make_note(note_attr_vals: ndarray,
@@ -438,26 +441,20 @@ def make_note(note_attr_vals: ndarray,
     if attr_val_cast_map:
         validate_optional_sequence_of_type('attr_val_cast_map', attr_val_cast_map.keys(), str)
 
-    cls = _make_cls(attr_name_idx_map)
-    note = cls()
-
-    # Assign core attributes
-    note.note_attr_vals = note_attr_vals
-    note.attr_name_idx_map = attr_name_idx_map
-
     # Set mapping of attribute names to functions that cast return type of get() calls, e.g. cast instrument to int
-    note.attr_val_cast_map = attr_val_cast_map or {}
-    for attr_name in note.attr_name_idx_map:
-        if attr_name not in note.attr_val_cast_map:
-            note.attr_val_cast_map[attr_name] = lambda x: x
+    attr_val_cast_map = attr_val_cast_map or {}
+    for attr_name in attr_name_idx_map:
+        if attr_name not in attr_val_cast_map:
+            attr_val_cast_map[attr_name] = identity
     # These are always returned as an int
-    note.attr_val_cast_map['instrument'] = int
-    note.attr_val_cast_map['velocity'] = int
-    note.attr_val_cast_map['amplitude'] = int
-    note.attr_val_cast_map['pitch'] = int
-    note.attr_val_cast_map['channel'] = int
-
-    return note
+    attr_val_cast_map['instrument'] = int
+    attr_val_cast_map['velocity'] = int
+    attr_val_cast_map['amplitude'] = int
+    attr_val_cast_map['pitch'] = int
+    attr_val_cast_map['channel'] = int
+
+    cls = get_note_cls(CLASS_NAME, attr_name_idx_map, attr_val_cast_map, _make_cls)
+    return cls(note_attr_vals)
 
 
 DEFAULT_NOTE_CONFIG = partial(MakeNoteConfig,
@@ -1,6 +1,10 @@
 # Copyright 2018 Mark S. Weiss
 
-from typing import Any, Callable, Dict, List, Optional, Mapping, Union
+from collections import OrderedDict
+from importlib import import_module
+from sys import modules as sys_modules
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Optional, Mapping, Tuple, Union
 
 from numpy import array as np_array
 
@@ -25,6 +29,57 @@ BASE_ATTR_NAMES = tuple(BASE_ATTR_NAME_IDX_MAP.keys())
 
 DEFAULT_VAL = 0.0
 
+# Registry of the Note classes built dynamically by each adapter's `_make_cls()`, keyed on the schema of the class,
+# that is the adapter class name, the attribute name to index mapping and the attribute cast mapping. Building a class
+# through a metaclass, with a property per attribute, costs far more than reading one row of a NoteSequence, so each
+# schema builds its class once and every Note after that is a `__slots__` instance of it bound to a row.
+# Cast functions are part of the key, so cast maps should use module level functions. A cast map built with new
+# lambdas each time is a new schema each time, so the registry holds at most NOTE_CLS_REGISTRY_MAX_SIZE classes and
+# evicts the least recently used one when full. Notes keep their class, so eviction only costs building it again.
+NOTE_CLS_REGISTRY_MAX_SIZE = 256
+NOTE_CLS_REGISTRY: 'OrderedDict[Tuple, Any]' = OrderedDict()
+
+# Module of each note adapter, by the class name of its notes. A MakeNoteConfig built from an adapter's functions and
+# maps is pickled as the adapter's class name, and the adapter is imported again to unpickle it, so the functions and
+# maps aren't stored in every pickle. See `MakeNoteConfig.__reduce__()`.
+NOTE_ADAPTER_MODULES = {
+    'CSoundNote': 'omnisound.src.note.adapter.csound_note',
+    'FoxdotSupercolliderNote': 'omnisound.src.note.adapter.foxdot_supercollider_note',
+    'MidiNote': 'omnisound.src.note.adapter.midi_note',
+}
+
+
+def _note_adapter_module(cls_name: str) -> Optional[ModuleType]:
+    module_name = NOTE_ADAPTER_MODULES.get(cls_name)
+    if not module_name:
+        return None
+    # Every config of a Song is pickled and unpickled through this, so skip the import machinery once it's loaded
+    return sys_modules.get(module_name) or import_module(module_name)
+
+
+def _adapter_attr_val_cast_map(adapter: ModuleType) -> Mapping[str, Callable]:
+    # Not every adapter declares a cast map, e.g. FoxDot notes build theirs when they are made
+    return getattr(adapter, 'ATTR_VAL_CAST_MAP', {})
+
+
+def _make_note_config_for_adapter(cls_name: str,
+                                  num_attributes: int,
+                                  attr_name_idx_map: Optional[Mapping[str, int]],
+                                  attr_val_default_map: Optional[Mapping[str, Union[float, int]]],
+                                  attr_val_cast_map: Optional[Mapping[str, Callable]]) -> 'MakeNoteConfig':
+    """Unpickles a MakeNoteConfig pickled by `MakeNoteConfig.__reduce__()` as the name of its adapter. Maps that
+       are None are the adapter's."""
+    adapter = _note_adapter_module(cls_name)
+    return MakeNoteConfig(cls_name=cls_name,
+                          num_attributes=num_attributes,
+                          make_note=adapter.make_note,
+                          pitch_for_key=adapter.pitch_for_key,
+                          attr_name_idx_map=adapter.ATTR_NAME_IDX_MAP if attr_name_idx_map is None
+                          else attr_name_idx_map,
+                          attr_val_default_map=attr_val_default_map,
+                          attr_val_cast_map=_adapter_attr_val_cast_map(adapter) if attr_val_cast_map is None
+                          else attr_val_cast_map)
+
 
 class MakeNoteConfig:
     def __init__(self,
@@ -61,6 +116,26 @@ class MakeNoteConfig:
             self._attr_val_default_map = {attr_name: av[self.attr_name_idx_map[attr_name]]
                                           for attr_name in self.attr_name_idx_map.keys()}
 
+    def __reduce__(self) -> Tuple:
+        """If the config uses the functions of a note adapter in `NOTE_ADAPTER_MODULES`, it is pickled as the name
+           of the adapter, and only the maps that aren't the adapter's. Otherwise its functions are pickled by
+           reference, so they must be module level functions.
+        """
+        adapter = _note_adapter_module(self.cls_name)
+        if adapter is None or self.make_note is not adapter.make_note or \
+                self.pitch_for_key is not adapter.pitch_for_key:
+            return (MakeNoteConfig, (self.cls_name, self.num_attributes, self.make_note, self.pitch_for_key,
+                                     self.attr_name_idx_map, self._attr_val_default_map, self.attr_val_cast_map))
+        adapter_attr_val_cast_map = _adapter_attr_val_cast_map(adapter)
+        return (_make_note_config_for_adapter,
+                (self.cls_name,
+                 self.num_attributes,
+                 None if self.attr_name_idx_map is adapter.ATTR_NAME_IDX_MAP or
+                 self.attr_name_idx_map == adapter.ATTR_NAME_IDX_MAP else self.attr_name_idx_map,
+                 self._attr_val_default_map or None,
+                 None if self.attr_val_cast_map is adapter_attr_val_cast_map or
+                 self.attr_val_cast_map == adapter_attr_val_cast_map else self.attr_val_cast_map))
+
     @staticmethod
     def copy(source: 'MakeNoteConfig') -> 'MakeNoteConfig':
         return MakeNoteConfig(cls_name=source.cls_name,
@@ -95,6 +170,41 @@ def add_base_attr_name_indexes(attr_name_idx_map: Dict[str, int]):
     return attr_name_idx_map
 
 
+def identity(attr_val: Any) -> Any:
+    """Default cast for note attributes that don't have an entry in `attr_val_cast_map`. A module-level function
+       rather than a lambda so that equal cast maps compare (and hash) equal in the Note class registry."""
+    return attr_val
+
+
+def note_cls_key(cls_name: str,
+                 attr_name_idx_map: Mapping[str, int],
+                 attr_val_cast_map: Mapping[str, Callable]) -> Tuple:
+    return cls_name, tuple(attr_name_idx_map.items()), tuple(attr_val_cast_map.items())
+
+
+def get_note_cls(cls_name: str,
+                 attr_name_idx_map: Mapping[str, int],
+                 attr_val_cast_map: Mapping[str, Callable],
+                 make_cls: Callable[[Dict[str, int], Dict[str, Callable]], Any]) -> Any:
+    """Returns the Note class for this schema from the registry, calling the adapter's `make_cls` to build and
+       register it the first time the schema is seen. The class gets its own copies of the maps so that later
+       changes by the caller to the maps it passed in can't alter notes already made from the class."""
+    key = note_cls_key(cls_name, attr_name_idx_map, attr_val_cast_map)
+    cls = NOTE_CLS_REGISTRY.get(key)
+    if cls is None:
+        cls = make_cls(dict(attr_name_idx_map), dict(attr_val_cast_map))
+        NOTE_CLS_REGISTRY[key] = cls
+        if len(NOTE_CLS_REGISTRY) > NOTE_CLS_REGISTRY_MAX_SIZE:
+            NOTE_CLS_REGISTRY.popitem(last=False)
+    else:
+        NOTE_CLS_REGISTRY.move_to_end(key)
+    return cls
+
+
+def clear_note_cls_registry():
+    NOTE_CLS_REGISTRY.clear()
+
+
 def getter(attr_name: str):
     """Prototype of generic Note-attribute accessor. This is parameterized by attr_name and dynamically
     created when the class is constructed for the specific Note type."""
@@ -2,18 +2,22 @@
 
 from copy import deepcopy
 from enum import Enum
-from typing import Any, Optional, Sequence, Union
-
-import ctcsound
+from typing import Any, Iterable, Optional, Sequence, TextIO, Tuple, Union
 
 from omnisound.src.note.adapter.note import as_list
+from omnisound.src.container.measure import Measure
 from omnisound.src.container.song import Song
 from omnisound.src.container.track import Track
+from omnisound.src.player.csound.csound_score_formatter import CSoundScoreFormatter
+from omnisound.src.player.csound.csound_writer import CSoundScoreStreamWriter
 from omnisound.src.player.player import Player
 from omnisound.src.utils.validation_utils import (validate_optional_sequence_of_type, validate_optional_type,
                                                   validate_optional_types, validate_sequence_of_type,
                                                   validate_sequence_of_type_choice, validate_type,)
 
+# ctcsound is imported by the methods that use it, rather than here, because importing it loads the CSound library.
+#  So the score and CSD classes in this module can be used without CSound installed.
+
 
 class InvalidScoreError(Exception):
     pass
@@ -141,6 +145,30 @@ class CSD:
             SCORE_LINES='\n'.join(str(score_line) for score_line in self.csound_score.score_lines)
         )
 
+    def _render_around_score(self) -> Tuple[str, str]:
+        """Returns the text of the CSD before and after the score lines"""
+        before_score, after_score = CSD.TEMPLATE.split('{SCORE_LINES}')
+        return before_score.format(
+            DEFAULT_FLAGS=CSD.DEFAULT_FLAGS,
+            GLOBAL_VARS='\n'.join(f'{k} = {v}' for k, v in self.csound_orchestra.global_vars.items()),
+            INSTRUMENTS='\n'.join(str(instrument) for instrument in self.csound_orchestra.instruments)
+        ), after_score
+
+    def stream(self, out: TextIO, measures: Optional[Iterable[Measure]] = None,
+               chunk_num_lines: int = CSoundScoreStreamWriter.DEFAULT_CHUNK_NUM_LINES) -> int:
+        """Writes the CSD to `out` without rendering it to one string. The score is the lines of `csound_score`
+           followed by the note lines for `measures`, streamed in chunks by `CSoundScoreStreamWriter`, so
+           `measures` can be a generator and the CSD never has to fit in memory. Returns the number of score lines.
+        """
+        before_score, after_score = self._render_around_score()
+        out.write(before_score)
+        with CSoundScoreStreamWriter(out=out,
+                                     header_lines=[str(score_line) for score_line in self.csound_score.score_lines],
+                                     chunk_num_lines=chunk_num_lines) as stream_writer:
+            stream_writer.write_measures(measures or [])
+        out.write(after_score)
+        return stream_writer.num_lines_written
+
 
 # TODO Support multiple orchestras and test it
 class CSoundCSDPlayer(Player):
@@ -182,6 +210,8 @@ class CSoundCSDPlayer(Player):
 
     # Player API
     def play(self) -> int:
+        import ctcsound
+
         cs = ctcsound.Csound()
         rendered_script = self._csd.render()
         if cs.compileCsdText(rendered_script) == ctcsound.CSOUND_SUCCESS:
@@ -204,6 +234,8 @@ class CSoundCSDPlayer(Player):
         raise NotImplementedError(f'{self.__class__.__name__} does not support improvising')
 
     def loop(self) -> int:
+        import ctcsound
+
         result = 0
         rendered_script = self._csd.render()
         try:
@@ -240,8 +272,7 @@ class CSoundCSDPlayer(Player):
         validate_optional_sequence_of_type('score_header_lines', score_header_lines, str)
         note_lines = []
         for measure in track.measure_list:
-            for note in measure:
-                note_lines.append(f'{str (note)}')
+            note_lines.extend(CSoundScoreFormatter.for_note_config(measure.mn).format_lines(measure.note_attr_vals))
         score = CSoundScore(header_lines=score_header_lines or [''], note_lines=note_lines)
         self._csd = CSD(self.orchestra, score)
     # /Player API
@@ -252,6 +283,8 @@ class CSoundInteractivePlayer(Player):
     def __init__(self,
                  csound_orchestra: CSoundOrchestra = None,
                  song: Optional[Song] = None):
+        import ctcsound
+
         validate_type('csound_orchestra', csound_orchestra, CSoundOrchestra)
         validate_optional_type('song', song, Song)
 
@@ -274,6 +307,8 @@ class CSoundInteractivePlayer(Player):
 
     @orchestra.setter
     def orchestra(self, csound_orchestra: CSoundOrchestra):
+        import ctcsound
+
         self._orchestra = csound_orchestra
         if self._cs.compileOrc(str(self._orchestra)) != ctcsound.CSOUND_SUCCESS:
             raise InvalidOrchestraError('ctcsound.compileOrc() failed for {}'.format(self._orchestra))
@@ -299,6 +334,8 @@ class CSoundInteractivePlayer(Player):
 
     # Player API
     def play(self) -> int:
+        import ctcsound
+
         cs = deepcopy(self._cs)
         cs.start()
         while cs.performKsmps() == ctcsound.CSOUND_SUCCESS:
@@ -0,0 +1,102 @@
+# Copyright 2020 Mark S. Weiss
+
+from io import StringIO
+from typing import Any, Callable, List, Mapping, Optional, TextIO
+
+from numpy import ndarray, round as np_round
+
+from omnisound.src.note.adapter.csound_note import ATTR_NAMES, DEFAULT_PITCH_PRECISION
+from omnisound.src.note.adapter.note import MakeNoteConfig, identity
+from omnisound.src.utils.validation_utils import validate_optional_type, validate_type
+
+
+class CSoundScoreFormatter:
+    """Renders blocks of CSound notes, i.e. the `note_attr_vals` of a NoteSequence or Measure, to score `i` lines.
+       The output is the same as `str(note)` for each CSoundNote in the block, but the line is formatted with one
+       format string compiled once per note schema, applied to whole columns of values, rather than building a Note
+       and calling a formatter per attribute per note.
+
+       As in `csound_note.to_str()`: instrument is an int, start and duration have five decimal places, pitch is
+       cast with `attr_val_cast_map` and rounded to `pitch_precision` places as in `csound_note.pitch_to_str()`,
+       and amplitude and any additional attributes are formatted as `str()` of the value, cast with
+       `attr_val_cast_map`.
+    """
+    def __init__(self,
+                 attr_name_idx_map: Mapping[str, int] = None,
+                 attr_val_cast_map: Optional[Mapping[str, Callable]] = None,
+                 pitch_precision: int = DEFAULT_PITCH_PRECISION):
+        validate_type('attr_name_idx_map', attr_name_idx_map, dict)
+        validate_optional_type('attr_val_cast_map', attr_val_cast_map, dict)
+        validate_type('pitch_precision', pitch_precision, int)
+        attr_val_cast_map = attr_val_cast_map or {}
+        self.pitch_precision = pitch_precision
+        self._pitch_cast = attr_val_cast_map.get('pitch', identity)
+
+        # Build the format string for a line and the list of columns it formats, in order
+        # Instrument is always an int, see `csound_note.make_note()`, and start and duration are always fixed point
+        formats = ['i %d', '%.5f', '%.5f']
+        self._column_idxs = [attr_name_idx_map['instrument'], attr_name_idx_map['start'],
+                             attr_name_idx_map['duration']]
+        self._pitch_column = None
+        attr_names = ['amplitude', 'pitch'] + [attr_name for attr_name in attr_name_idx_map.keys()
+                                               if attr_name not in ATTR_NAMES]
+        for attr_name in attr_names:
+            if attr_val_cast_map.get(attr_name) is int:
+                formats.append('%d')
+            elif attr_name == 'pitch':
+                # Pitch is `str()` of the rounded pitch, whatever type the cast returns
+                formats.append('%s')
+                self._pitch_column = len(self._column_idxs)
+            else:
+                # `%r` of a float is the same as `str()` of it
+                formats.append('%r')
+            self._column_idxs.append(attr_name_idx_map[attr_name])
+        self.line_format = ' '.join(formats)
+
+    @staticmethod
+    def for_note_config(mn: MakeNoteConfig, pitch_precision: int = DEFAULT_PITCH_PRECISION) -> 'CSoundScoreFormatter':
+        validate_type('mn', mn, MakeNoteConfig)
+        return CSoundScoreFormatter(attr_name_idx_map=mn.attr_name_idx_map,
+                                    attr_val_cast_map=mn.attr_val_cast_map,
+                                    pitch_precision=pitch_precision)
+
+    def _columns(self, note_attr_vals: ndarray) -> List[List[Any]]:
+        # Convert each column to a list of Python floats once, so formatting doesn't convert each numpy scalar
+        columns = [note_attr_vals[:, idx].tolist() for idx in self._column_idxs]
+        if self._pitch_column is not None:
+            columns[self._pitch_column] = \
+                self._round_pitches(note_attr_vals[:, self._column_idxs[self._pitch_column]])
+        return columns
+
+    def _round_pitches(self, pitches: ndarray) -> List[Any]:
+        """Rounds pitches as `csound_note.pitch_to_str()` rounds `note.pitch`, which is the stored value cast with the
+           pitch cast. numpy and Python round some values to a different last digit, so round with the same one.
+        """
+        pitch_precision = self.pitch_precision
+        # Without a cast `note.pitch` is a numpy float64, which `round()` rounds with numpy
+        if self._pitch_cast is identity:
+            return np_round(pitches, pitch_precision).tolist()
+        if self._pitch_cast is float:
+            return [round(pitch, pitch_precision) for pitch in pitches.tolist()]
+        pitch_cast = self._pitch_cast
+        return [round(pitch_cast(pitch), pitch_precision) for pitch in pitches]
+
+    def format_lines(self, note_attr_vals: ndarray) -> List[str]:
+        """Returns the score line for each note in `note_attr_vals`, without line endings"""
+        line_format = self.line_format
+        return [line_format % row for row in zip(*self._columns(note_attr_vals))]
+
+    def write_lines(self, note_attr_vals: ndarray, out: TextIO, line_end: str = '\n') -> int:
+        """Writes the score line for each note in `note_attr_vals` to `out`, each followed by `line_end`, in one
+           write. Returns the number of lines written."""
+        lines = self.format_lines(note_attr_vals)
+        if lines:
+            out.write(line_end.join(lines))
+            out.write(line_end)
+        return len(lines)
+
+    def format(self, note_attr_vals: ndarray, line_end: str = '\n') -> str:
+        """Returns the score lines for all notes in `note_attr_vals` as one string, each line followed by `line_end`"""
+        out = StringIO()
+        self.write_lines(note_attr_vals, out, line_end=line_end)
+        return out.getvalue()
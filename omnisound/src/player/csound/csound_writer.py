@@ -1,11 +1,129 @@
 # Copyright 2019 Mark S. Weiss
 
+from concurrent.futures import ProcessPoolExecutor
+from io import StringIO
 from pathlib import Path
-from typing import Sequence
+from typing import Iterable, Iterator, List, Optional, Sequence, TextIO, Tuple
 
+from numpy import ndarray
+
+from omnisound.src.container.measure import Measure
 from omnisound.src.container.song import Song
+from omnisound.src.container.track import Track
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.player.csound.csound_score_formatter import CSoundScoreFormatter
 from omnisound.src.player.player import Writer
-from omnisound.src.utils.validation_utils import validate_optional_type, validate_types
+from omnisound.src.utils.validation_utils import validate_optional_sequence_of_type, validate_optional_types, \
+    validate_type, validate_types
+
+
+def _note_blocks(track: Track) -> Iterator[Tuple[MakeNoteConfig, ndarray]]:
+    """The notes of `track` in blocks that can each be formatted with one formatter, with the note config of each
+       block. The notes of a contiguous Track whose Measures all have the same note attributes are one block,
+       otherwise each Measure is a block.
+    """
+    measures = track.measure_list
+    if track.contiguous and measures:
+        mn = measures[0].mn
+        if all(measure.mn.attr_name_idx_map == mn.attr_name_idx_map and
+               measure.mn.attr_val_cast_map == mn.attr_val_cast_map for measure in measures):
+            yield mn, track.note_attr_vals
+            return
+    for measure in measures:
+        yield measure.mn, measure.note_attr_vals
+
+
+def _format_track_lines(formatter_blocks: Sequence[Tuple[CSoundScoreFormatter, ndarray]]) -> List[str]:
+    """The score lines, with line endings, of the note blocks of one Track, each with the formatter for its notes"""
+    return [f'{line}\n' for formatter, note_attr_vals in formatter_blocks
+            for line in formatter.format_lines(note_attr_vals)]
+
+
+class CSoundScoreStreamWriter:
+    """Writes CSound score lines to a text stream as they are generated, in chunks, rather than building the whole
+       score in memory. The stream can be a file, or a pipe such as the stdin of a `csound` process, which can
+       consume the score as it is written, e.g. reading it as real-time line events with `-L stdin`.
+
+       Writes `#include` lines for `include_file_names` and then `header_lines` first, once, and then the score lines
+       for each Measure passed to `write_measures()` or `write_song()`. Measures are formatted one at a time as they
+       are consumed, so `write_measures()` can take a generator, and lines are buffered and written to the stream
+       once there are at least `chunk_num_lines` of them. So memory use is bounded by the chunk size and the size of
+       one Measure, not by the length of the song. Call `flush()` (or use the writer as a context manager) to write
+       the last partial chunk.
+    """
+    DEFAULT_CHUNK_NUM_LINES = 10000
+
+    def __init__(self,
+                 out: TextIO = None,
+                 include_file_names: Optional[Sequence[str]] = None,
+                 header_lines: Optional[Sequence[str]] = None,
+                 chunk_num_lines: int = DEFAULT_CHUNK_NUM_LINES):
+        validate_optional_sequence_of_type('include_file_names', include_file_names, str)
+        validate_optional_sequence_of_type('header_lines', header_lines, str)
+        validate_type('chunk_num_lines', chunk_num_lines, int)
+        if chunk_num_lines < 1:
+            raise ValueError(f'`chunk_num_lines` must be at least 1, chunk_num_lines: {chunk_num_lines}')
+        self.out = out
+        self.include_file_names = include_file_names or []
+        self.header_lines = header_lines or []
+        self.chunk_num_lines = chunk_num_lines
+        self.num_lines_written = 0
+        self._header_written = False
+        self._chunk = StringIO()
+        self._chunk_num_lines = 0
+
+    def __enter__(self) -> 'CSoundScoreStreamWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.flush()
+
+    def _write_header(self):
+        if self._header_written:
+            return
+        self._header_written = True
+        for include_file_name in self.include_file_names:
+            self._write_line(f'#include "{include_file_name}"')
+        for header_line in self.header_lines:
+            self._write_line(header_line)
+
+    def _write_line(self, line: str):
+        self._chunk.write(line)
+        self._chunk.write('\n')
+        self._chunk_num_lines += 1
+
+    def _write_chunk_if_full(self):
+        if self._chunk_num_lines >= self.chunk_num_lines:
+            self.flush()
+
+    def write_measure(self, measure: Measure) -> 'CSoundScoreStreamWriter':
+        validate_type('measure', measure, Measure)
+        self._write_header()
+        formatter = CSoundScoreFormatter.for_note_config(measure.mn)
+        self._chunk_num_lines += formatter.write_lines(measure.note_attr_vals, self._chunk)
+        self._write_chunk_if_full()
+        return self
+
+    def write_measures(self, measures: Iterable[Measure]) -> 'CSoundScoreStreamWriter':
+        for measure in measures:
+            self.write_measure(measure)
+        return self
+
+    def write_song(self, song: Song) -> 'CSoundScoreStreamWriter':
+        validate_type('song', song, Song)
+        for track in song:
+            self.write_measures(track.measure_list)
+        return self
+
+    def flush(self):
+        """Writes buffered lines to the stream, and the header if nothing has been written yet"""
+        self._write_header()
+        if self._chunk_num_lines:
+            self.out.write(self._chunk.getvalue())
+            self.num_lines_written += self._chunk_num_lines
+            self._chunk = StringIO()
+            self._chunk_num_lines = 0
+        self.out.flush()
 
 
 class CSoundWriter(Writer):
@@ -17,13 +135,18 @@ class CSoundWriter(Writer):
                  score_file_path: Path = None,
                  orchestra_file_path: Path = None,
                  csound_path: Path = None,
-                 verbose: bool = False):
+                 verbose: bool = False,
+                 streaming: bool = False,
+                 parallel: bool = False,
+                 max_workers: Optional[int] = None):
         validate_types(('song', song, Song),
                        ('out_file_path', out_file_path, Path),
                        ('score_file_path', score_file_path, Path),
                        ('orchestra_file_path', orchestra_file_path, Path),
-                       ('verbose', verbose, bool))
-        validate_optional_type('csound_path', csound_path, Path)
+                       ('verbose', verbose, bool),
+                       ('streaming', streaming, bool),
+                       ('parallel', parallel, bool))
+        validate_optional_types(('csound_path', csound_path, Path), ('max_workers', max_workers, int))
         super(CSoundWriter, self).__init__()
 
         self._song = song
@@ -34,6 +157,12 @@ class CSoundWriter(Writer):
         self.csound_path = csound_path or CSoundWriter.CSOUND_OSX_PATH
         self.verbose = verbose
         self._include_file_names = []
+        # If True, `generate_and_write()` streams the score to the score file with `stream_write()`
+        self.streaming = streaming
+        # If True, `generate()` formats the score lines of each Track in a pool of `max_workers` processes, by
+        #  default one per CPU. Only the note arrays and their formatters are sent to the workers.
+        self.parallel = parallel
+        self.max_workers = max_workers
 
     # PlayerBase Properties
     @property
@@ -55,14 +184,43 @@ class CSoundWriter(Writer):
             for include_file_name in self._include_file_names:
                 self._score_file_lines.append(f'#include "{include_file_name}"\n')
 
-        for track in self.song:
-            for measure in track.measure_list:
-                for note in measure:
-                    self._score_file_lines.append(f'{str(note)}\n')
+        formatter_blocks_list = [[(CSoundScoreFormatter.for_note_config(mn), note_attr_vals)
+                                  for mn, note_attr_vals in _note_blocks(track)]
+                                 for track in self.song]
+        if self.parallel:
+            # `map()` returns results in the order of the Tracks
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                track_lines_list = list(executor.map(_format_track_lines, formatter_blocks_list))
+        else:
+            track_lines_list = [_format_track_lines(formatter_blocks) for formatter_blocks in formatter_blocks_list]
+        for track_lines in track_lines_list:
+            self._score_file_lines.extend(track_lines)
 
         return self._score_file_lines
+
+    def generate_and_write(self) -> None:
+        if self.streaming:
+            self.stream_write()
+        else:
+            self.generate()
+            self.write()
     # /Writer API
 
+    def stream_write(self, out: Optional[TextIO] = None,
+                     chunk_num_lines: int = CSoundScoreStreamWriter.DEFAULT_CHUNK_NUM_LINES) -> int:
+        """Writes the score for the song to `out`, or if it is None to `self.score_file_path`, streaming it in chunks
+           of `chunk_num_lines` lines with `CSoundScoreStreamWriter`, without building the score in memory.
+           Returns the number of lines written.
+        """
+        if out is None:
+            with open(str(self.score_file_path), 'w') as score_file:
+                return self.stream_write(out=score_file, chunk_num_lines=chunk_num_lines)
+        with CSoundScoreStreamWriter(out=out,
+                                     include_file_names=self._include_file_names,
+                                     chunk_num_lines=chunk_num_lines) as stream_writer:
+            stream_writer.write_song(self.song)
+        return stream_writer.num_lines_written
+
     def get_csound_cli_command(self) -> str:
         # -m7 - message level includes `note amps`, `out-of-range` and `warnings`
         # -d - suppress all messages to stdout
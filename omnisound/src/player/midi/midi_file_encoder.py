@@ -0,0 +1,125 @@
+# Copyright 2020 Mark S. Weiss
+
+"""Encodes Standard MIDI Files (SMF) directly from columns of note events, without creating a mido Message per
+   event. The bytes are the same as saving a mido MidiFile of type 1 with the same messages: a header chunk, then
+   one track chunk per track holding a program change, the note events, using running status, and an
+   end of track meta event.
+
+   Format reference: https://www.midi.org/specifications-old/item/standard-midi-files-smf
+"""
+
+from struct import pack
+from typing import Sequence
+
+from numpy import cumsum as np_cumsum, int64 as np_int64, ndarray, ones as np_ones, uint8 as np_uint8, \
+    zeros as np_zeros
+
+# Type 1 - multiple synchronous tracks, all starting at the same time
+MIDI_FILE_TYPE = 1
+# The same as the mido MidiFile default
+MIDI_FILE_TICKS_PER_BEAT = 480
+
+NOTE_OFF_STATUS = 0x80
+NOTE_ON_STATUS = 0x90
+PROGRAM_CHANGE_STATUS = 0xC0
+END_OF_TRACK = bytes((0x00, 0xFF, 0x2F, 0x00))
+
+MIDI_DATA_MIN_VAL = 0
+MIDI_DATA_MAX_VAL = 127
+MIDI_CHANNEL_MAX_VAL = 15
+VLQ_BITS_PER_BYTE = 7
+VLQ_DATA_MASK = 0x7F
+VLQ_CONTINUATION_BIT = 0x80
+
+
+class MidiFileEncoderException(Exception):
+    pass
+
+
+def _validate_data_bytes(name: str, vals: ndarray):
+    if len(vals) and (vals.min() < MIDI_DATA_MIN_VAL or vals.max() > MIDI_DATA_MAX_VAL):
+        raise MidiFileEncoderException(f'`{name}` must be in range {MIDI_DATA_MIN_VAL}..{MIDI_DATA_MAX_VAL}')
+
+
+def encode_note_events(tick_deltas: ndarray,
+                       is_note_on: ndarray,
+                       velocities: ndarray,
+                       pitches: ndarray,
+                       channel: int,
+                       running_status: int = None) -> ndarray:
+    """Encodes a sequence of note on and note off events as the bytes of the events in an SMF track chunk,
+       i.e. a delta time, as a variable length quantity, followed by the MIDI message, for each event. All arguments
+       but `channel` have one entry per event. `running_status` is the status byte of the message before the first
+       event, if any. As in the SMF standard, an event's status byte is omitted if it is the same as the status byte
+       of the event before it.
+
+       The whole sequence is encoded with array operations: the size of each event is computed first, then every
+       byte of every event is scattered into its offset in one output array.
+    """
+    if not MIDI_DATA_MIN_VAL <= channel <= MIDI_CHANNEL_MAX_VAL:
+        raise MidiFileEncoderException(f'`channel` must be in range {MIDI_DATA_MIN_VAL}..{MIDI_CHANNEL_MAX_VAL}')
+    _validate_data_bytes('velocities', velocities)
+    _validate_data_bytes('pitches', pitches)
+    num_events = len(tick_deltas)
+    if not num_events:
+        return np_zeros(0, dtype=np_uint8)
+    tick_deltas = tick_deltas.astype(np_int64)
+    if tick_deltas.min() < 0:
+        raise MidiFileEncoderException('`tick_deltas` must be non-negative')
+
+    # Number of bytes in each delta time, at least 1 even for a delta of 0. A variable length quantity has 7 bits
+    #  per byte, most significant first, with the high bit set on every byte but the last.
+    num_delta_bytes = np_ones(num_events, dtype=np_int64)
+    max_delta_bytes = 1
+    while (tick_deltas >> (VLQ_BITS_PER_BYTE * max_delta_bytes)).any():
+        num_delta_bytes += (tick_deltas >> (VLQ_BITS_PER_BYTE * max_delta_bytes)) > 0
+        max_delta_bytes += 1
+
+    status = (is_note_on * (NOTE_ON_STATUS - NOTE_OFF_STATUS) + NOTE_OFF_STATUS + channel).astype(np_int64)
+    has_status = np_ones(num_events, dtype=bool)
+    has_status[1:] = status[1:] != status[:-1]
+    if running_status is not None:
+        has_status[0] = status[0] != running_status
+
+    # Each event is the delta bytes, an optional status byte and two data bytes, the note number and the velocity
+    event_sizes = num_delta_bytes + has_status + 2
+    event_offsets = np_cumsum(event_sizes) - event_sizes
+    encoded = np_zeros(int(event_sizes.sum()), dtype=np_uint8)
+
+    for i in range(max_delta_bytes):
+        # Byte i of each delta, for deltas that have at least i + 1 bytes, most significant byte first
+        in_delta = num_delta_bytes > i
+        shift = VLQ_BITS_PER_BYTE * (num_delta_bytes[in_delta] - 1 - i)
+        delta_byte = (tick_deltas[in_delta] >> shift) & VLQ_DATA_MASK
+        delta_byte |= (num_delta_bytes[in_delta] - 1 > i) * VLQ_CONTINUATION_BIT
+        encoded[event_offsets[in_delta] + i] = delta_byte
+    message_offsets = event_offsets + num_delta_bytes
+    encoded[message_offsets[has_status]] = status[has_status]
+    data_offsets = message_offsets + has_status
+    encoded[data_offsets] = pitches
+    encoded[data_offsets + 1] = velocities
+    return encoded
+
+
+def encode_track_chunk(program: int, note_events: ndarray) -> bytearray:
+    """Encodes an SMF track chunk holding a program change on channel 0 at tick 0, the encoded note events
+       from `encode_note_events()` and an end of track event."""
+    if not MIDI_DATA_MIN_VAL <= program <= MIDI_DATA_MAX_VAL:
+        raise MidiFileEncoderException(f'`program` must be in range {MIDI_DATA_MIN_VAL}..{MIDI_DATA_MAX_VAL}')
+    track_data = bytearray((0x00, PROGRAM_CHANGE_STATUS, program))
+    track_data += note_events.tobytes()
+    track_data += END_OF_TRACK
+    chunk = bytearray(b'MTrk')
+    chunk += pack('>L', len(track_data))
+    chunk += track_data
+    return chunk
+
+
+def encode_midi_file(track_chunks: Sequence[bytearray], ticks_per_beat: int = MIDI_FILE_TICKS_PER_BEAT) -> bytearray:
+    """Encodes a type 1 SMF from its track chunks"""
+    midi_file = bytearray(b'MThd')
+    midi_file += pack('>L', 6)
+    midi_file += pack('>hhh', MIDI_FILE_TYPE, len(track_chunks), ticks_per_beat)
+    for track_chunk in track_chunks:
+        midi_file += track_chunk
+    return midi_file
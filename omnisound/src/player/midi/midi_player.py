@@ -1,20 +1,28 @@
 # Copyright 2020 Mark S. Weiss
 
 from enum import Enum
+from heapq import heapify, heappop
 from inspect import currentframe
-from typing import Any, List, Optional, Sequence, Tuple, Union
+from math import sqrt
+from time import monotonic
+from typing import Any, Callable, List, Optional, Sequence, Tuple, TYPE_CHECKING, Union
 import asyncio
 
-# noinspection PyProtectedMember
-from mido import Message, open_output
-from mido.backends.rtmidi import Output
+from numpy import concatenate as np_concatenate, cumsum as np_cumsum, repeat as np_repeat
 
 from omnisound.src.note.adapter.midi_note import ATTR_VAL_CAST_MAP
 from omnisound.src.container.measure import Measure
+from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.container.track import MidiTrack
 from omnisound.src.modifier.meter import NoteDur
 from omnisound.src.player.player import Player
-from omnisound.src.utils.validation_utils import validate_optional_type, validate_type, validate_types
+from omnisound.src.utils.validation_utils import trusted, validate_optional_type, validate_type, validate_types
+
+# mido and its rtmidi backend are only imported when they are used, because importing them takes longer than
+#  importing the rest of omnisound, and the backend needs system MIDI libraries
+if TYPE_CHECKING:
+    from mido import Message
+    from mido.backends.rtmidi import Output
 
 MIDI_TICKS_PER_QUARTER_NOTE = 960
 MIDI_QUARTER_NOTES_PER_BEAT = 4
@@ -26,6 +34,11 @@ MIDI_TICKS_PER_SECOND = int((MIDI_TICKS_PER_QUARTER_NOTE *
 
 DEFAULT_BEAT_DURATION = NoteDur.QUARTER
 
+# The scheduler sleeps until this long before an event is due and then waits out the rest on the clock, because
+#  asyncio.sleep() can return late by up to the resolution of the event loop's timer. While it waits it yields to the
+#  event loop on each check, so other tasks still run.
+SCHEDULER_SPIN_SECS = 0.002
+
 
 class MidiPlayerAppendMode(Enum):
     AppendAfterPreviousNote = 1
@@ -66,7 +79,9 @@ class MidiPlayerEvent:
             return self.note.time + self.note.duration
 
     def _tick(self) -> int:
-        return MidiPlayerEvent.get_tick(self.measure, self.event_time)
+        # event_time is computed from the note, so it's already a valid note time
+        with trusted():
+            return MidiPlayerEvent.get_tick(self.measure, self.event_time)
 
     @staticmethod
     def get_tick(measure: Measure, event_time: Union[float, int]):
@@ -85,27 +100,174 @@ class MidiPlayerEvent:
             event.tick_delta = event.tick - event_list[j - 1].tick
 
 
-def get_midi_messages_and_notes_for_track(track: MidiTrack) -> Tuple[Sequence[Message], Sequence[int]]:
+def get_midi_messages_and_notes_for_track(track: MidiTrack) -> Tuple[Sequence['Message'], Sequence[int]]:
+    from mido import Message
+
     messages = []
     tick = 0
     durations = []
-    for measure in track.measure_list:
-        for note in measure:
-            amplitude = ATTR_VAL_CAST_MAP['velocity'](note.amplitude)
-            pitch = ATTR_VAL_CAST_MAP['pitch'](note.pitch)
-            durations.append(note.duration)
-            messages.append(Message('note_on', time=tick,
-                                    velocity=amplitude, note=pitch,
-                                    channel=track.channel))
-            # noinspection PyTypeChecker
-            tick += MidiPlayerEvent.get_tick(measure, note.duration)
-            messages.append(Message('note_off', time=tick,
-                                    velocity=amplitude, note=pitch,
-                                    channel=track.channel))
+    with trusted():
+        for measure in track.measure_list:
+            for note in measure:
+                amplitude = ATTR_VAL_CAST_MAP['velocity'](note.amplitude)
+                pitch = ATTR_VAL_CAST_MAP['pitch'](note.pitch)
+                durations.append(note.duration)
+                messages.append(Message('note_on', time=tick,
+                                        velocity=amplitude, note=pitch,
+                                        channel=track.channel))
+                # noinspection PyTypeChecker
+                tick += MidiPlayerEvent.get_tick(measure, note.duration)
+                messages.append(Message('note_off', time=tick,
+                                        velocity=amplitude, note=pitch,
+                                        channel=track.channel))
 
     return messages, durations
 
 
+def open_virtual_output(port_name: str) -> 'Output':
+    from mido import open_output
+
+    return open_output(port_name, True)  # flag is virtual=True
+
+
+class MidiJitterStats:
+    """Running statistics of how late the scheduler sent each event relative to the time it was due, in seconds.
+       Updated per event, so stats are available while a loop is still playing."""
+    def __init__(self):
+        self.num_events = 0
+        self.mean_secs = 0.0
+        self.max_secs = 0.0
+        # Sum of squared differences from the mean, for the running variance (Welford's algorithm)
+        self._sum_sq_diffs = 0.0
+
+    def add(self, lateness_secs: float):
+        self.num_events += 1
+        diff = lateness_secs - self.mean_secs
+        self.mean_secs += diff / self.num_events
+        self._sum_sq_diffs += diff * (lateness_secs - self.mean_secs)
+        self.max_secs = max(self.max_secs, lateness_secs)
+
+    @property
+    def std_secs(self) -> float:
+        return sqrt(self._sum_sq_diffs / self.num_events) if self.num_events else 0.0
+
+    def __str__(self):
+        return (f'num_events: {self.num_events} mean_secs: {self.mean_secs:.6f} '
+                f'std_secs: {self.std_secs:.6f} max_secs: {self.max_secs:.6f}')
+
+
+class MidiScheduledEvent:
+    """A MIDI message and the time it is due in seconds from the start of playback. Events order by time, and at the
+       same time note offs order before note ons, so a note ending when the same pitch starts again is retriggered.
+       Ties after that keep the order events were created in."""
+    def __init__(self, event_secs: float, message: 'Message', seq: int):
+        self.event_secs = event_secs
+        self.message = message
+        self.sort_key = (event_secs, message.type == MidiEventType.NOTE_ON.value, seq)
+
+    def __lt__(self, other: 'MidiScheduledEvent') -> bool:
+        return self.sort_key < other.sort_key
+
+
+def get_scheduled_events_for_track(track: MidiTrack,
+                                   append_mode: MidiPlayerAppendMode,
+                                   seq_start: int = 0) -> List[MidiScheduledEvent]:
+    """Computes the absolute time in seconds of the note on and note off events of every note in `track`, from the
+       start of the track, from its time and duration columns, scaled by the beat duration of the meter of each
+       note's measure. For `AppendAfterPreviousNote` each note starts when the note before it ends. For
+       `AppendAtAbsoluteTime` each note starts at its time, offset by the total duration of the measures before the
+       one it is in. `seq_start` numbers events so events from different tracks never tie.
+    """
+    from mido import Message
+
+    validate_types(('track', track, MidiTrack), ('append_mode', append_mode, MidiPlayerAppendMode))
+    if not track.measure_list:
+        return []
+    # Columns are only read, so notes shared by copied Measures aren't copied
+    durations, num_notes_per_measure = NoteSequence.column_views_for_sequences(track.measure_list, 'duration',
+                                                                               writable=False)
+    # Each measure has its own meter, so scale each note's times by its measure's beat duration
+    secs_per_note_time = np_repeat([measure.meter.beat_note_dur_secs for measure in track.measure_list],
+                                   num_notes_per_measure)
+    duration_secs = np_concatenate(durations) * secs_per_note_time
+    if append_mode == MidiPlayerAppendMode.AppendAfterPreviousNote:
+        note_on_secs = np_cumsum(duration_secs) - duration_secs
+    else:
+        times, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'time', writable=False)
+        measure_durations = [measure.meter.measure_dur_secs for measure in track.measure_list]
+        measure_offsets = np_cumsum(measure_durations) - measure_durations
+        note_on_secs = np_concatenate(times) * secs_per_note_time + np_repeat(measure_offsets, num_notes_per_measure)
+    note_off_secs = note_on_secs + duration_secs
+    velocities, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'velocity', writable=False)
+    pitches, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'pitch', writable=False)
+    velocities = np_concatenate(velocities)
+    pitches = np_concatenate(pitches)
+
+    # mido channels numbered 0..15 instead of MIDI standard 1..16
+    channel = track.channel - 1
+    events = []
+    seq = seq_start
+    for note_on, note_off, velocity, pitch in zip(note_on_secs.tolist(), note_off_secs.tolist(),
+                                                  velocities.tolist(), pitches.tolist()):
+        velocity = ATTR_VAL_CAST_MAP['velocity'](velocity)
+        pitch = ATTR_VAL_CAST_MAP['pitch'](pitch)
+        events.append(MidiScheduledEvent(note_on, Message(MidiEventType.NOTE_ON.value, velocity=velocity,
+                                                          note=pitch, channel=channel), seq))
+        events.append(MidiScheduledEvent(note_off, Message(MidiEventType.NOTE_OFF.value, velocity=velocity,
+                                                           note=pitch, channel=channel), seq + 1))
+        seq += 2
+    return events
+
+
+class MidiEventScheduler:
+    """Sends the events of any number of tracks to one output port, each at its absolute time from the start of
+       playback. All events are merged into one priority queue ordered by time, and one writer pops events and sends
+       them. Each event is due at a deadline computed from the time playback started, not from when the previous
+       event was sent, so timing errors don't accumulate over a track or over repeated loops. Waits for each deadline
+       by sleeping most of the way and then checking a monotonic clock, yielding to other tasks between checks.
+    """
+    def __init__(self,
+                 events: Sequence[MidiScheduledEvent] = None,
+                 port: Any = None,
+                 clock: Callable[[], float] = monotonic):
+        self.events = list(events)
+        self.port = port
+        self.clock = clock
+        # Loops repeat when the last event of the loop is due
+        self.loop_duration_secs = max((event.event_secs for event in self.events), default=0.0)
+        self.jitter_stats = MidiJitterStats()
+
+    async def _wait_until(self, deadline_secs: float):
+        sleep_secs = deadline_secs - self.clock() - SCHEDULER_SPIN_SECS
+        if sleep_secs > 0:
+            await asyncio.sleep(sleep_secs)
+        while self.clock() < deadline_secs:
+            await asyncio.sleep(0)
+
+    async def _play_events(self, start_secs: float):
+        # Each pass plays a copy of the queue so the events can be played again on the next loop
+        event_queue = list(self.events)
+        heapify(event_queue)
+        while event_queue:
+            event = heappop(event_queue)
+            deadline_secs = start_secs + event.event_secs
+            await self._wait_until(deadline_secs)
+            self.jitter_stats.add(self.clock() - deadline_secs)
+            self.port.send(event.message)
+
+    async def play(self):
+        await self._play_events(self.clock())
+
+    async def loop(self):
+        # With no events the loop has no duration, so it would repeat forever without waiting
+        if not self.events:
+            return
+        start_secs = self.clock()
+        while True:
+            await self._play_events(start_secs)
+            start_secs += self.loop_duration_secs
+
+
 class MidiInteractiveSingleTrackPlayer(Player):
     """
     Broadcasts the first track of a  Song of MIDI Tracks to the Track's MIDI channel, on one named virtual port.
@@ -121,6 +283,7 @@ class MidiInteractiveSingleTrackPlayer(Player):
         self.append_mode = append_mode
         self.midi_track_tick_relative = self.append_mode == MidiPlayerAppendMode.AppendAfterPreviousNote
         self.port_name = port_name or f'{self.__class__.__name__}_port'
+        self.scheduler: Optional[MidiEventScheduler] = None
 
     # Player API
     def play(self):
@@ -140,45 +303,33 @@ class MidiInteractiveSingleTrackPlayer(Player):
     # /Player API
 
     # Async Helpers
-    async def _play(self):
+    def _make_scheduler(self, port: 'Output') -> MidiEventScheduler:
         # Single-track player so only process the first track in the song
         track: MidiTrack = self._song.track_list[0]
-        # For each track we get back a tuple of two lists, one of mido MIDI Messages to sent to the output port
-        #  and the other of durations for each Message.
-        messages_durations: Tuple[Sequence[Message], Sequence[int]] = get_midi_messages_and_notes_for_track(track)
-        messages, durations = messages_durations
+        events = get_scheduled_events_for_track(track, self.append_mode)
+        self.scheduler = MidiEventScheduler(events=events, port=port)
+        return self.scheduler
 
-        port: Output = open_output(self.port_name, True)  # flag is virtual=True
+    async def _play(self):
+        port: 'Output' = open_virtual_output(self.port_name)
         # TODO NEED SOME INTERACTIVE WAY TO PAUSE AND CONNECT TO VIRTUAL PORT IN LISTENING APP OR DO IT DYNAMICALLY
         # breakpoint()
-
-        loop_duration = messages[-1].time
         with port:
-            for i in range(0, len(messages), 2):
-                messages[i].time += loop_duration
-                port.send(messages[i])
-                await asyncio.sleep(durations[int(i / 2)])
-                port.send(messages[i + 1])
+            await self._make_scheduler(port).play()
 
     async def _loop(self):
-        track: MidiTrack = self._song.track_list[0]
-        messages_durations: Tuple[Sequence[Message], Sequence[int]] = get_midi_messages_and_notes_for_track(track)
-        messages, durations = messages_durations
-        port: Output = open_output(self.port_name, True)  # flag is virtual=True
+        port: 'Output' = open_virtual_output(self.port_name)
         try:
-            loop_duration = messages[-1].time
             with port:
-                j = 0
-                while True:
-                    for i in range(0, len(messages), 2):
-                        messages[i].time += (j * loop_duration)
-                        port.send(messages[i])
-                        await asyncio.sleep(durations[int(i / 2)])
-                        port.send(messages[i + 1])
-                    j += 1
+                await self._make_scheduler(port).loop()
         except KeyboardInterrupt:
             pass
 
+    @property
+    def jitter_stats(self) -> Optional[MidiJitterStats]:
+        """How late events were sent by the most recent `play()` or `loop()`, or None if neither has been called"""
+        return self.scheduler.jitter_stats if self.scheduler else None
+
 
 class MidiInteractiveMultitrackPlayer(Player):
     """
@@ -197,6 +348,7 @@ class MidiInteractiveMultitrackPlayer(Player):
         self.append_mode = append_mode
         self.midi_track_tick_relative = self.append_mode == MidiPlayerAppendMode.AppendAfterPreviousNote
         self.port_name = port_name or f'{self.__class__.__name__}_port'
+        self.scheduler: Optional[MidiEventScheduler] = None
 
     # Player API
     def play(self):
@@ -216,56 +368,30 @@ class MidiInteractiveMultitrackPlayer(Player):
     # /Player API
 
     # Async Helpers
-    async def _play(self):  # sourcery skip: for-index-replacement, for-index-underscore, hoist-statement-from-loop
-        messages_durations_list: Sequence[Tuple[Sequence[Message], Sequence[int]]] = \
-            [get_midi_messages_and_notes_for_track(track) for track in self._song]
+    def _make_scheduler(self, port: 'Output') -> MidiEventScheduler:
+        # Merge the events of all tracks into one scheduler, so one writer sends them all to the port in time order
+        events = []
+        for track in self._song:
+            events.extend(get_scheduled_events_for_track(track, self.append_mode, seq_start=len(events)))
+        self.scheduler = MidiEventScheduler(events=events, port=port)
+        return self.scheduler
 
-        port: Output = open_output(self.port_name, True)  # flag is virtual=True
+    async def _play(self):
+        port: 'Output' = open_virtual_output(self.port_name)
         # TODO NEED SOME INTERACTIVE WAY TO PAUSE AND CONNECT TO VIRTUAL PORT IN LISTENING APP OR DO IT DYNAMICALLY
         # breakpoint()
-
-        play_track_tasks: List[asyncio.Task] = [asyncio.create_task(MidiInteractiveMultitrackPlayer._play_track(
-                messages, durations, port))
-            for messages, durations in messages_durations_list]
-        for task in play_track_tasks:
-            await task
-
-    @staticmethod
-    async def _play_track(messages: Sequence[Message], durations: Sequence[int], port: Output):
         with port:
-            loop_duration = messages[-1].time
-            for i in range(0, len(messages), 2):
-                messages[i].time += loop_duration
-                port.send(messages[i])
-                await asyncio.sleep(durations[int(i / 2)])
-                port.send(messages[i + 1])
+            await self._make_scheduler(port).play()
 
     async def _loop(self):
-        messages_durations_list: Sequence[Tuple[Sequence[Message], Sequence[int]]] = \
-            [get_midi_messages_and_notes_for_track(track) for track in self._song]
-
-        port: Output = open_output(self.port_name, True)  # flag is virtual=True
-        # TODO NEED SOME INTERACTIVE WAY TO PAUSE AND CONNECT TO VIRTUAL PORT IN LISTENING APP OR DO IT DYNAMICALLY
-        # breakpoint()
-
-        play_track_tasks: List[asyncio.Task] = [asyncio.create_task(MidiInteractiveMultitrackPlayer._loop_track(
-                                                    messages, durations, port))
-                                                for messages, durations in messages_durations_list]
-        for task in play_track_tasks:
-            await task
-
-    @staticmethod
-    async def _loop_track(messages: Sequence[Message], durations: Sequence[int], port: Output):
+        port: 'Output' = open_virtual_output(self.port_name)
         try:
             with port:
-                loop_duration = messages[-1].time
-                j = 0
-                while True:
-                    for i in range(0, len(messages), 2):
-                        messages[i].time += (j * loop_duration)
-                        port.send(messages[i])
-                        await asyncio.sleep(durations[int(i / 2)])
-                        port.send(messages[i + 1])
-                    j += 1
+                await self._make_scheduler(port).loop()
         except KeyboardInterrupt:
             pass
+
+    @property
+    def jitter_stats(self) -> Optional[MidiJitterStats]:
+        """How late events were sent by the most recent `play()` or `loop()`, or None if neither has been called"""
+        return self.scheduler.jitter_stats if self.scheduler else None
@@ -1,29 +1,168 @@
 # Copyright 2020 Mark S. Weiss
 
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Optional, Sequence
+from typing import Iterator, List, Optional, Sequence, Tuple, TYPE_CHECKING
 
-from mido.midifiles.midifiles import Message, MidiFile, MidiTrack
-from omnisound.src.utils.validation_utils import validate_optional_types, validate_type
+from numpy import argsort as np_argsort, concatenate as np_concatenate, diff as np_diff, empty as np_empty, \
+    int64 as np_int64, ndarray, repeat as np_repeat, zeros as np_zeros
+from omnisound.src.utils.validation_utils import validate_optional_types, validate_type, validate_types
 
-from omnisound.src.note.adapter.midi_note import ATTR_VAL_CAST_MAP
+from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.container.song import Song
-from omnisound.src.player.midi.midi_player import MidiEventType, MidiPlayerEvent, MidiPlayerAppendMode
+from omnisound.src.container.track import Track
+from omnisound.src.player.midi.midi_file_encoder import encode_midi_file, encode_note_events, encode_track_chunk, \
+    PROGRAM_CHANGE_STATUS
+from omnisound.src.player.midi.midi_player import MIDI_TICKS_PER_SECOND, MidiEventType, MidiPlayerAppendMode
 from omnisound.src.player.player import Writer
 
+# mido is only imported when Messages or a MidiFile are built, see `midi_player`
+if TYPE_CHECKING:
+    from mido import Message
+
+
+class MidiTrackEvents:
+    """Note on and note off events for all the notes in a Track, stored as columns, one entry per event, ordered by
+       tick. Builds the events for the whole Track at once from the note attribute columns of its Measures, with the
+       same tick math as `MidiPlayerEvent.get_tick()`, rather than creating an event object per note on and note off.
+       mido Messages are only created by `messages()`, when the events are serialized.
+
+       Each note contributes a note on and then a note off event, and events are sorted by tick with a stable sort.
+       So events with the same tick stay in the order the notes are in the Track, and a note off sorts before a
+       note on at the same tick that belongs to a later note.
+    """
+    def __init__(self,
+                 ticks: ndarray = None,
+                 is_note_on: ndarray = None,
+                 velocities: ndarray = None,
+                 pitches: ndarray = None,
+                 channel: int = None):
+        self.ticks = ticks
+        self.is_note_on = is_note_on
+        self.velocities = velocities
+        self.pitches = pitches
+        self.channel = channel
+
+    @staticmethod
+    def from_track(track: Track) -> 'MidiTrackEvents':
+        validate_type('track', track, Track)
+        return MidiTrackEvents.from_columns(*MidiTrackEvents.track_columns(track))
+
+    @staticmethod
+    def track_columns(track: Track) -> Tuple[ndarray, ndarray, ndarray, ndarray, ndarray, int]:
+        """The note attribute columns of all the notes in `track` needed to build its events, each as one array:
+           times, durations, velocities and pitches, the seconds per note time unit of each note, from the meter
+           of its measure, and the mido channel of the track. See `from_columns()`.
+        """
+        # mido channels numbered 0..15 instead of MIDI standard 1..16
+        channel = track.channel - 1
+        if not track.measure_list:
+            return (np_empty(0), np_empty(0), np_empty(0), np_empty(0), np_empty(0), channel)
+        # If the track is contiguous each column of all its measures is one view
+        if track.contiguous:
+            track.pack()
+        # Columns are only read, so notes shared by copied Measures aren't copied
+        times, num_notes_per_measure = NoteSequence.column_views_for_sequences(track.measure_list, 'time',
+                                                                               writable=False)
+        durations, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'duration', writable=False)
+        velocities, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'velocity', writable=False)
+        pitches, _ = NoteSequence.column_views_for_sequences(track.measure_list, 'pitch', writable=False)
+
+        # Each measure has its own meter, so scale each note's times by its measure's beat duration
+        secs_per_note_time = np_repeat([measure.meter.beat_note_dur_secs for measure in track.measure_list],
+                                       num_notes_per_measure)
+        return (np_concatenate(times), np_concatenate(durations), np_concatenate(velocities),
+                np_concatenate(pitches), secs_per_note_time, channel)
+
+    @staticmethod
+    def from_columns(times: ndarray = None,
+                     durations: ndarray = None,
+                     velocities: ndarray = None,
+                     pitches: ndarray = None,
+                     secs_per_note_time: ndarray = None,
+                     channel: int = None) -> 'MidiTrackEvents':
+        """Builds the events from the columns returned by `track_columns()`. Only depends on the arrays, not on the
+           Track, so it can run in another process."""
+        num_notes = len(times)
+
+        # Interleave the events so note i has its note on at 2 * i and its note off at 2 * i + 1.
+        # Same as `MidiPlayerEvent`, event times are absolute and tick is truncated to an int.
+        event_times = np_empty(2 * num_notes)
+        event_times[0::2] = abs(times)
+        event_times[1::2] = abs(times + durations)
+        ticks = (np_repeat(secs_per_note_time, 2) * event_times * MIDI_TICKS_PER_SECOND).astype(np_int64)
+        is_note_on = np_zeros(2 * num_notes, dtype=bool)
+        is_note_on[0::2] = True
+
+        order = np_argsort(ticks, kind='stable')
+        # Casts are the same as `midi_note.ATTR_VAL_CAST_MAP` for velocity and pitch
+        return MidiTrackEvents(ticks=ticks[order],
+                               is_note_on=is_note_on[order],
+                               velocities=np_repeat(velocities.astype(np_int64), 2)[order],
+                               pitches=np_repeat(pitches.astype(np_int64), 2)[order],
+                               channel=channel)
+
+    @property
+    def tick_deltas(self) -> ndarray:
+        """The offset of each event's tick from the tick of the event before it, and of the first event from 0"""
+        return np_diff(self.ticks, prepend=0)
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    def messages(self) -> Iterator['Message']:
+        from mido import Message
+
+        # Convert columns to lists of Python ints once, rather than converting each numpy scalar
+        for tick_delta, is_note_on, velocity, pitch in zip(self.tick_deltas.tolist(), self.is_note_on.tolist(),
+                                                           self.velocities.tolist(), self.pitches.tolist()):
+            event_type = MidiEventType.NOTE_ON if is_note_on else MidiEventType.NOTE_OFF
+            yield Message(event_type.value, time=tick_delta, velocity=velocity, note=pitch, channel=self.channel)
+
+    def encode(self, program: int) -> bytearray:
+        """Encodes the events directly as an SMF track chunk, preceded by a program change to `program`. The bytes
+           are the same as saving a mido MidiTrack holding the program change followed by `messages()`.
+        """
+        note_events = encode_note_events(self.tick_deltas, self.is_note_on, self.velocities, self.pitches,
+                                         self.channel, running_status=PROGRAM_CHANGE_STATUS)
+        return encode_track_chunk(program, note_events)
+
+
+def _track_events_from_columns(track_columns: Tuple) -> MidiTrackEvents:
+    return MidiTrackEvents.from_columns(*track_columns)
+
+
+def _encode_track_events(track_events_program: Tuple[MidiTrackEvents, int]) -> bytearray:
+    track_events, program = track_events_program
+    return track_events.encode(program)
+
 
 class MidiWriter(Writer):
     def __init__(self,
                  song: Optional[Song] = None,
                  append_mode: MidiPlayerAppendMode = None,
-                 midi_file_path: Path = None):
+                 midi_file_path: Path = None,
+                 direct_encode: bool = False,
+                 parallel: bool = False,
+                 max_workers: Optional[int] = None):
         validate_type('append_mode', append_mode, MidiPlayerAppendMode)
-        validate_optional_types(('song', song, Song), ('midi_file_path', midi_file_path, Path))
+        validate_optional_types(('song', song, Song), ('midi_file_path', midi_file_path, Path),
+                                ('max_workers', max_workers, int))
+        validate_types(('direct_encode', direct_encode, bool), ('parallel', parallel, bool))
+        from mido import MidiFile
+
         self._song = song
         self.midi_file_path = midi_file_path
+        # If True, `write()` encodes the MIDI file directly from the note events instead of building mido Messages
+        self.direct_encode = direct_encode
+        # If True, `generate()` builds, and `encode()` encodes, the events of each Track in a pool of
+        #  `max_workers` processes, by default one per CPU. Only the note columns and events are sent to the workers.
+        self.parallel = parallel
+        self.max_workers = max_workers
         # Type 1 - multiple synchronous tracks, all starting at the same time
         # https://mido.readthedocs.io/en/latest/midi_files.html
         self.midi_file = MidiFile(type=1)
+        self.track_events_list: List[MidiTrackEvents] = []
         super(MidiWriter, self).__init__(song=song)
 
     # BasePlayer Properties
@@ -39,33 +178,47 @@ class MidiWriter(Writer):
 
     # Writer API
     def write(self):
-        self.midi_file.save(str(self.midi_file_path))
+        """Serializes the events built by `generate()` into `self.midi_file`, one MIDI track per Track in the Song,
+           and saves it to `self.midi_file_path`. If `self.direct_encode` is set, encodes the file bytes directly
+           instead. The file is the same, but `self.midi_file` isn't updated.
+        """
+        if self.direct_encode:
+            self.midi_file_path.write_bytes(self.encode())
+            return
 
-    def generate(self) -> Sequence[Any]:
-        assert self._song
-        event_list = []
-        for track in self._song:
+        from mido import Message, MidiFile, MidiTrack
+
+        self.midi_file = MidiFile(type=1)
+        for track, track_events in zip(self._song, self.track_events_list):
             midi_track = MidiTrack()
             midi_track.append(Message('program_change', program=track.instrument, time=0))
+            midi_track.extend(track_events.messages())
             self.midi_file.tracks.append(midi_track)
+        self.midi_file.save(str(self.midi_file_path))
+
+    def encode(self) -> bytearray:
+        """Returns the bytes of the MIDI file for the events built by `generate()`, without building mido Messages"""
+        track_events_programs = [(track_events, track.instrument)
+                                 for track, track_events in zip(self._song, self.track_events_list)]
+        if self.parallel:
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                track_chunks = list(executor.map(_encode_track_events, track_events_programs))
+        else:
+            track_chunks = [_encode_track_events(track_events_program)
+                            for track_events_program in track_events_programs]
+        return encode_midi_file(track_chunks, ticks_per_beat=self.midi_file.ticks_per_beat)
 
-            # mido channels numbered 0..15 instead of MIDI standard 1..16
-            channel = track.channel - 1
-            for measure in track.measure_list:
-                for note in measure:
-                    # noinspection PyTypeChecker
-                    event_list.append(MidiPlayerEvent(note, measure, MidiEventType.NOTE_ON))
-                    # noinspection PyTypeChecker
-                    event_list.append(MidiPlayerEvent(note, measure, MidiEventType.NOTE_OFF))
-
-                MidiPlayerEvent.set_tick_deltas(event_list)
-                for event in event_list:
-                    message = Message(event.event_type.value, time=event.tick_delta,
-                                      velocity=ATTR_VAL_CAST_MAP['velocity'](event.note.amplitude),
-                                      note=ATTR_VAL_CAST_MAP['pitch'](event.note.pitch),
-                                      channel=channel)
-                    midi_track.append(message)
-        return event_list
+    def generate(self) -> Sequence[MidiTrackEvents]:
+        """Builds the note events for each Track in the Song, independently of the other Tracks."""
+        assert self._song
+        if self.parallel:
+            track_columns_list = [MidiTrackEvents.track_columns(track) for track in self._song]
+            # `map()` returns results in the order of the Tracks
+            with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+                self.track_events_list = list(executor.map(_track_events_from_columns, track_columns_list))
+        else:
+            self.track_events_list = [MidiTrackEvents.from_track(track) for track in self._song]
+        return self.track_events_list
 
     def generate_and_write(self) -> None:
         self.generate()
@@ -2,8 +2,6 @@
 
 from time import sleep
 
-from FoxDot import Player as FD_SC_Player
-
 # noinspection PyProtectedMember
 from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.player.player import Player, PlayerNoNotesException
@@ -11,6 +9,10 @@ from omnisound.src.player.player import Player, PlayerNoNotesException
 
 class FoxDotSupercolliderPlayer(Player):
     def __init__(self, note_sequence: NoteSequence):
+        # FoxDot is only imported when a player is created, because importing it starts its clock and SuperCollider
+        #  connection
+        from FoxDot import Player as FD_SC_Player
+
         super(FoxDotSupercolliderPlayer, self).__init__(note_sequence)
         self.sc_player = FD_SC_Player()
 
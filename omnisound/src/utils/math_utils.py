@@ -1,8 +1,27 @@
 # Copyright 2018 Mark S. Weiss
 
-from math import copysign
+from math import copysign, inf
 from random import random
+from typing import Union
+
+# Same defaults as pytest.approx()
+DEFAULT_REL_TOL = 1e-6
+DEFAULT_ABS_TOL = 1e-12
 
 
 def sign() -> float:
     return copysign(1.0, random() - 0.5)
+
+
+def approx_equal(actual: Union[float, int],
+                 expected: Union[float, int],
+                 rel_tol: float = DEFAULT_REL_TOL,
+                 abs_tol: float = DEFAULT_ABS_TOL) -> bool:
+    """Returns True if `actual` is within tolerance of `expected`, with the same semantics as
+       `actual == pytest.approx(expected)`: the tolerance is the larger of `rel_tol` relative to `expected` and
+       `abs_tol`, and infinities are only equal to themselves."""
+    if actual == expected:
+        return True
+    if abs(expected) == inf:
+        return False
+    return abs(actual - expected) <= max(rel_tol * abs(expected), abs_tol)
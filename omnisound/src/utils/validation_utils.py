@@ -1,13 +1,107 @@
-from typing import Any, KeysView, Optional, Tuple, ValuesView
+from contextlib import contextmanager
+from enum import Enum
+from os import environ
+from threading import local
+from typing import Any, Iterator, KeysView, Optional, Tuple, ValuesView
+
+
+class ValidationPolicy(Enum):
+    """How much argument validation the `validate_*()` functions do.
+
+       STRICT validates every call. BOUNDARY validates calls into the library from user code, but skips validation
+       in calls the library makes to itself inside a `trusted()` block, on values it has already validated or
+       created itself, such as making a Note for each row while iterating a NoteSequence. OFF skips all validation.
+       The `*_choice` validators still return the matched type when validation is skipped, because some callers use
+       it, but they don't raise if nothing matches.
+    """
+    STRICT = 'strict'
+    BOUNDARY = 'boundary'
+    OFF = 'off'
+
+
+# The initial policy can be set with this environment variable, to a ValidationPolicy value, e.g. 'boundary'
+VALIDATION_POLICY_ENV_VAR = 'OMNISOUND_VALIDATION_POLICY'
+DEFAULT_VALIDATION_POLICY = ValidationPolicy.STRICT
+
+
+class _TrustedCalls(local):
+    """Depth of nested `trusted()` blocks in the current thread"""
+    depth = 0
+
+    def __enter__(self) -> '_TrustedCalls':
+        self.depth += 1
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.depth -= 1
+
+
+_TRUSTED_CALLS = _TrustedCalls()
+_validation_policy = DEFAULT_VALIDATION_POLICY
+# Checked first by every validator, so the default policy pays only for one global lookup
+_validate_all = True
+
+
+def set_validation_policy(policy: ValidationPolicy) -> None:
+    global _validation_policy, _validate_all
+    if not isinstance(policy, ValidationPolicy):
+        raise ValueError(f'arg: `policy` has val: `{policy}` and type: {type(policy)} '
+                         f'but must be type: `{ValidationPolicy}`')
+    _validation_policy = policy
+    _validate_all = policy is ValidationPolicy.STRICT
+
+
+def get_validation_policy() -> ValidationPolicy:
+    return _validation_policy
+
+
+@contextmanager
+def validation_policy(policy: ValidationPolicy) -> Iterator[ValidationPolicy]:
+    """Sets the validation policy for the duration of the block and restores the previous policy on exit"""
+    prev_policy = _validation_policy
+    set_validation_policy(policy)
+    try:
+        yield policy
+    finally:
+        set_validation_policy(prev_policy)
+
+
+def trusted() -> _TrustedCalls:
+    """Context manager for calls the library makes to itself with arguments that are already valid. Validation is
+       skipped inside the block if the policy is BOUNDARY. Blocks can be nested, and are per thread."""
+    return _TRUSTED_CALLS
+
+
+def is_validating() -> bool:
+    """True if the `validate_*()` functions validate their arguments in the current context"""
+    return _validate_all or (_validation_policy is ValidationPolicy.BOUNDARY and not _TRUSTED_CALLS.depth)
+
+
+def _policy_from_env() -> ValidationPolicy:
+    policy_val = environ.get(VALIDATION_POLICY_ENV_VAR)
+    if policy_val is None:
+        return DEFAULT_VALIDATION_POLICY
+    try:
+        return ValidationPolicy(policy_val.strip().lower())
+    except ValueError:
+        raise ValueError((f'env var `{VALIDATION_POLICY_ENV_VAR}` has val: `{policy_val}` but must be one of: '
+                          f'`{[policy.value for policy in ValidationPolicy]}`'))
+
+
+set_validation_policy(_policy_from_env())
 
 
 def validate_not_none(arg_name, val) -> bool:
+    if not _validate_all and not is_validating():
+        return True
     if val is None:
         raise ValueError(f'`{arg_name}` must not be None')
     return True
 
 
 def validate_type(arg_name, val, val_type) -> bool:
+    if not _validate_all and not is_validating():
+        return True
     if not isinstance(val, val_type):
         raise ValueError(f'arg: `{arg_name}` has val: `{val}` and type: {type(val)} but must be type: `{val_type}`')
     return True
@@ -26,7 +120,7 @@ def validate_type_choice(arg_name, val, val_types) -> Tuple[bool, Optional[Any]]
             matched = True
             matched_type = val_type
             break
-    if not matched:
+    if not matched and (_validate_all or is_validating()):
         raise ValueError((f'arg: `{arg_name}` has val: `{val}` and type: {type(val)} but '
                           f'must be one of the following types: `{val_types}`'))
     return matched, matched_type
@@ -39,6 +133,8 @@ def validate_optional_type_choice(arg_name, val, val_types) -> Tuple[bool, Optio
 
 
 def validate_types(*val_type_tuples) -> bool:
+    if not _validate_all and not is_validating():
+        return True
     for arg_name, val, val_type in val_type_tuples:
         validate_type(arg_name, val, val_type)
     return True
@@ -51,6 +147,8 @@ def validate_optional_type(arg_name, val, val_type) -> bool:
 
 
 def validate_optional_types(*val_type_tuples) -> bool:
+    if not _validate_all and not is_validating():
+        return True
     matched = False
     for arg_name, val, val_type in val_type_tuples:
         ret = validate_optional_type(arg_name, val, val_type)
@@ -59,6 +157,8 @@ def validate_optional_types(*val_type_tuples) -> bool:
 
 
 def validate_not_falsey(arg_name, val) -> bool:
+    if not _validate_all and not is_validating():
+        return True
     if not val:
         raise ValueError(f'`{arg_name}` must not be falsey')
     return True
@@ -66,6 +166,8 @@ def validate_not_falsey(arg_name, val) -> bool:
 
 def validate_sequence_of_type(arg_name, seq_val, val_type) -> bool:
     """Must be a valid collection type. Can be empty. If there are values they must match val_type."""
+    if not _validate_all and not is_validating():
+        return True
     validate_type_choice(arg_name, seq_val, (KeysView, ValuesView, list, tuple, set))
     for val in seq_val:
         validate_type(arg_name, val, val_type)
@@ -74,6 +176,8 @@ def validate_sequence_of_type(arg_name, seq_val, val_type) -> bool:
 
 def validate_sequence_of_type_choice(arg_name, seq_val, val_types) -> bool:
     """Must be a valid collection type. Can be empty. If there ave values all must be in val_types."""
+    if not _validate_all and not is_validating():
+        return True
     validate_type_choice(arg_name, seq_val, (KeysView, ValuesView, list, tuple, set))
     for val in seq_val:
         validate_type_choice(arg_name, val, val_types)
@@ -82,6 +186,8 @@ def validate_sequence_of_type_choice(arg_name, seq_val, val_types) -> bool:
 
 def validate_optional_sequence_of_type(arg_name, seq_val, val_type) -> bool:
     """Can be None or an empty collection and return True. Else if not empty each value must match val_type."""
+    if not _validate_all and not is_validating():
+        return True
     if not seq_val:
         return True
     validate_type_choice(arg_name, seq_val, (KeysView, ValuesView, list, tuple, set))
@@ -95,6 +201,8 @@ def validate_type_reference(arg_name, type_ref_val, val_type):
        NOTE: the `is` operator does not match subtypes. isinstance() using the instantiated object of the type
        of the variable that is a reference to a type, compared to either the type or its base class type, succeeds.
     """
+    if not _validate_all and not is_validating():
+        return True
     if not isinstance(type_ref_val.__call__(), val_type):
         raise ValueError((f'arg: `{arg_name}` has val: `{type_ref_val}` and type: {type(type_ref_val.__call__())} '
                           f'but must be alias to type: `{val_type}`'))
@@ -109,7 +217,7 @@ def validate_type_reference_choice(arg_name, type_ref_val, val_types) -> Tuple[b
             matched = True
             matched_type = val_type
             break
-    if not matched:
+    if not matched and (_validate_all or is_validating()):
         raise ValueError((f'arg: `{arg_name}` has val: `{type_ref_val}` and type: {type(type_ref_val.__call__())}'
                           f'but must be one of the following types: `{val_types}`'))
     return matched, matched_type
@@ -375,6 +375,59 @@ def test_set_tempo(measure):
         assert note.duration == expected_dur
 
 
+def test_memmap_storage(tmp_path, make_note_config, meter):
+    storage = NoteSequence.new_memmap_storage(NUM_NOTES, NUM_ATTRIBUTES, path=tmp_path / 'measure.dat')
+    storage[:, ATTR_NAME_IDX_MAP['start']] = [0.75, 0.5, 0.25, 0.0]
+    measure = Measure(meter=meter, num_notes=NUM_NOTES, mn=make_note_config, storage=storage)
+    # Notes already in the storage are kept, and sorted by start in place
+    assert [note.start for note in measure] == [0.0, 0.25, 0.5, 0.75]
+    assert list(storage[:, ATTR_NAME_IDX_MAP['start']]) == [0.0, 0.25, 0.5, 0.75]
+
+
+def test_set_tempo_repeated_does_not_compound(measure):
+    measure.tempo = int(TEMPO_QPM / 2)
+    measure.tempo = int(TEMPO_QPM / 2)
+    assert [note.start for note in measure] == [0.0, 0.5, 1.0, 1.5]
+    for note in measure:
+        assert note.duration == DUR * 2
+
+    # Setting the tempo back restores the original start times and durations
+    measure.tempo = TEMPO_QPM
+    assert [note.start for note in measure] == [0.0, 0.25, 0.5, 0.75]
+    for note in measure:
+        assert note.duration == DUR
+    assert measure.meter.tempo_qpm == TEMPO_QPM
+
+
+def test_set_tempo_for_measures_shared_meter(make_note_config, meter, swing):
+    measures = [_measure(mn=make_note_config, meter=meter, swing=swing),
+                _measure(mn=make_note_config, meter=meter, swing=swing)]
+    # The same measure listed twice is only retimed once
+    Measure.set_tempo_for_measures(measures + measures[:1], int(TEMPO_QPM / 2))
+    assert meter.tempo_qpm == int(TEMPO_QPM / 2)
+    for measure in measures:
+        assert [note.start for note in measure] == [0.0, 0.5, 1.0, 1.5]
+        for note in measure:
+            assert note.duration == DUR * 2
+        assert measure.max_duration == meter.beats_per_measure * meter.beat_note_dur_secs
+
+    with pytest.raises(ValueError):
+        Measure.set_tempo_for_measures(measures, 0)
+
+
+def test_set_tempo_shared_meter_retimed_separately(measure):
+    measure_copy = Measure.copy(measure)
+    assert measure_copy.meter is measure.meter
+    # Retiming one measure updates the Meter they share, but the other measure is still retimed when its tempo is set
+    measure.tempo = int(TEMPO_QPM / 2)
+    measure_copy.tempo = int(TEMPO_QPM / 2)
+    for m in (measure, measure_copy):
+        assert m.tempo == int(TEMPO_QPM / 2)
+        assert [note.start for note in m] == [0.0, 0.5, 1.0, 1.5]
+        for note in m:
+            assert note.duration == DUR * 2
+
+
 def test_add_notes_on_start_set_tempo(make_note_config, meter):
     # Test adding a NoteSequence and having each added at the beat position
     measure = _measure(mn=make_note_config, meter=meter, num_notes=0)
@@ -504,6 +557,48 @@ def test_measure_insert_remove_getitem(make_note_config, meter, swing):
     assert measure[0].start == pytest.approx(start_1)
 
 
+
+def test_append_keeps_sorted_by_start(make_note_config, meter, swing):
+    measure = _measure(mn=make_note_config, meter=meter, swing=swing, num_notes=0)
+    starts = [0.5, 0.25, 0.75, 0.25, 0.0]
+    for i, start in enumerate(starts):
+        note = _note(mn=make_note_config)
+        note.start = start
+        note.amplitude = float(i)
+        measure.append(note)
+    assert [note.start for note in measure] == sorted(starts)
+    # Notes with the same start stay in the order they were appended
+    assert [note.amplitude for note in measure] == [4.0, 1.0, 3.0, 0.0, 2.0]
+
+    # If a note start is set directly the measure is resorted on the next append
+    measure[0].start = 1.0
+    note = _note(mn=make_note_config)
+    note.start = 0.1
+    measure.append(note)
+    assert [note.start for note in measure] == [0.1, 0.25, 0.25, 0.5, 0.75, 1.0]
+
+
+def test_bulk_edit(make_note_config, meter, swing):
+    measure = _measure(mn=make_note_config, meter=meter, swing=swing, num_notes=0)
+    starts = [0.75, 0.5, 0.25, 0.0]
+    with measure.bulk_edit():
+        for start in starts:
+            note = _note(mn=make_note_config)
+            note.start = start
+            measure.append(note)
+        with measure.bulk_edit():
+            measure.extend(_note_sequence(mn=make_note_config))
+        # Sorting is deferred until the outermost block exits
+        assert [note.start for note in measure] == starts + [START] * NUM_NOTES
+    assert [note.start for note in measure] == [START] * NUM_NOTES + sorted(starts)
+
+    # Notes are sorted even if the block raises
+    with pytest.raises(ValueError):
+        with measure.bulk_edit():
+            measure[0].start = 1.0
+            raise ValueError()
+    assert measure[-1].start == 1.0
+
 def test_transpose(measure):
     for note in measure:
         note.pitch = 9.01
@@ -554,5 +649,20 @@ def test_transpose(measure):
         assert note.pitch == pytest.approx(expected_pitch)
 
 
+def test_get_set_attr(measure):
+    assert measure.get_attr('instrument') == [INSTRUMENT] * NUM_NOTES
+    assert type(measure.get_attr('instrument')[0]) == int
+    assert measure.get_attr('start') == [0.0, DUR, DUR * 2, DUR * 3]
+
+    new_amp = AMP + 1.0
+    measure.set_attr('amplitude', new_amp)
+    assert measure.get_attr('amplitude') == [new_amp] * NUM_NOTES
+    for note in measure:
+        assert note.amplitude == new_amp
+
+    with pytest.raises(ValueError):
+        measure.set_attr('amplitude', 'not_a_number')
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
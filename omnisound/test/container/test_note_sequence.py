@@ -1,10 +1,14 @@
 # Copyright 2018 Mark S. Weiss
 
+from pickle import dumps, loads
+
 import pytest
+from numpy import float64, int64 as np_int64, memmap
 
 from omnisound.src.note.adapter.note import MakeNoteConfig
 import omnisound.src.note.adapter.csound_note as csound_note
 from omnisound.src.container.note_sequence import NoteSequence
+from omnisound.src.utils.validation_utils import validation_policy, ValidationPolicy
 
 INSTRUMENT = 1
 START = 0.0
@@ -72,6 +76,95 @@ def test_eq(note_sequence):
     assert note_sequence != new_note_sequence
 
 
+def test_copy_on_write(make_note_config, note_sequence):
+    # Written with set_column(), which doesn't keep the view it writes through, so the notes can still be shared
+    note_sequence.set_column('amplitude', [AMP] + [0.0] * (len(note_sequence) - 1))
+    capacity = note_sequence.capacity
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    # The copy shares the notes of the source, read-only, until one of them writes. The source keeps its buffer.
+    assert new_note_sequence._notes_view().base is note_sequence._note_attr_vals_buf
+    assert not new_note_sequence._notes_view().flags.writeable
+    assert note_sequence._notes_view().flags.writeable
+    assert note_sequence.capacity == capacity
+    assert new_note_sequence == note_sequence
+
+    # Writing through the copy copies its notes first, so the source is unchanged
+    new_note_sequence[0].amplitude = AMP + 1
+    assert new_note_sequence[0].amplitude == AMP + 1
+    assert note_sequence[0].amplitude == AMP
+    assert new_note_sequence._notes_view().base is not note_sequence._notes_view().base
+
+    # Every mutating API copies the shared notes before writing
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    note_sequence.set_column('amplitude', AMP + 2)
+    assert new_note_sequence.column('amplitude').tolist() == [AMP] + [0.0] * (len(note_sequence) - 1)
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    note_sequence.remove((0, 1))
+    assert len(new_note_sequence) == len(note_sequence) + 1
+    new_note_sequence.append(_note(mn=make_note_config))
+    assert len(new_note_sequence) == len(note_sequence) + 2
+    assert note_sequence.column('amplitude').tolist() == [AMP + 2] * len(note_sequence)
+
+
+def test_copy_isolated_from_notes_taken_before_copy(note_sequence):
+    note = note_sequence[0]
+    column = note_sequence.column('pitch')
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    note.amplitude = AMP + 1
+    column[:] = PITCH
+    assert new_note_sequence[0].amplitude == 0.0
+    assert new_note_sequence.column('pitch').tolist() == [0.0] * NUM_NOTES
+    assert note_sequence[0].amplitude == AMP + 1
+
+    # Views that left the sequence can write its notes for as long as they exist, so later copies don't share them
+    del note, column
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    assert new_note_sequence._notes_view().base is not note_sequence._note_attr_vals_buf
+    assert new_note_sequence._notes_view().flags.writeable
+
+
+def test_copy_on_write_released_by_copies(note_sequence):
+    storage = note_sequence._note_attr_vals_buf
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    # A copy of a copy shares the notes of the source too
+    new_new_note_sequence = NoteSequence.copy(new_note_sequence)
+    assert new_new_note_sequence._notes_view().base is storage
+
+    # Once every copy has copied its notes to write them the source writes its notes in place
+    new_note_sequence.set_column('pitch', PITCH)
+    new_new_note_sequence.set_column('pitch', PITCH + 1)
+    note_sequence.set_column('amplitude', AMP)
+    assert note_sequence._note_attr_vals_buf is storage
+    # As it does once the copies are freed
+    new_note_sequence = NoteSequence.copy(note_sequence)
+    del new_note_sequence
+    note_sequence.set_column('amplitude', AMP + 1)
+    assert note_sequence._note_attr_vals_buf is storage
+    assert note_sequence.column('amplitude').tolist() == [AMP + 1] * len(note_sequence)
+
+
+def test_pickle(note_sequence):
+    note_sequence[0].amplitude = AMP
+    # Spare capacity isn't pickled
+    note_sequence.append(note_sequence[0])
+    assert note_sequence.capacity > len(note_sequence)
+    loaded = loads(dumps(note_sequence))
+    assert loaded == note_sequence
+    assert loaded.capacity == len(note_sequence)
+    assert loaded.mn.make_note is note_sequence.mn.make_note
+
+    # With protocol 5 the notes are passed out-of-band, as raw buffers
+    buffers = []
+    data = dumps(note_sequence, protocol=5, buffer_callback=buffers.append)
+    assert len(buffers) == 1
+    # Buffers received from another process are read-only, so the notes are copied before the first write
+    loaded = loads(data, buffers=[bytes(buffer) for buffer in buffers])
+    assert loaded == note_sequence
+    loaded[0].amplitude = AMP + 1
+    assert loaded[0].amplitude == AMP + 1
+    assert note_sequence[0].amplitude == AMP
+
+
 def test_note_sequence_iter_note_attr_properties(note_sequence):
     # Iterate once and assert attributes of elements. This tests __iter__() and __next__()
     first_loop_count = 0
@@ -146,6 +239,66 @@ def test_note_sequence_insert_remove_getitem(make_note_config):
     assert expected_amp == note_front.amplitude
 
 
+
+def test_note_sequence_append_capacity(make_note_config):
+    note_sequence = NoteSequence(num_notes=0, mn=make_note_config)
+    assert note_sequence.note_attr_vals.shape == (0, NUM_ATTRIBUTES)
+    num_notes = 100
+    capacities = set()
+    for i in range(num_notes):
+        note = _note(mn=make_note_config)
+        note.amplitude = float(i)
+        note_sequence.append(note)
+        capacities.add(note_sequence.capacity)
+        assert len(note_sequence) == i + 1
+    # Capacity doubles as the sequence grows, so storage was only reallocated a few times
+    assert len(capacities) <= 5
+    assert note_sequence.capacity >= num_notes
+    # Only the rows holding notes are exposed, and every note has the value it was appended with
+    assert note_sequence.note_attr_vals.shape == (num_notes, NUM_ATTRIBUTES)
+    assert list(note_sequence.column('amplitude')) == [float(i) for i in range(num_notes)]
+
+
+def test_note_sequence_insert_remove_middle(make_note_config):
+    note_sequence = NoteSequence(num_notes=0, mn=make_note_config)
+    for i in range(4):
+        note = _note(mn=make_note_config)
+        note.amplitude = float(i)
+        note_sequence.append(note)
+
+    # Insert a sequence of two notes in the middle and a note from the end
+    to_insert = _note_sequence(mn=make_note_config)
+    to_insert.set_column('amplitude', AMP)
+    note_sequence.insert(2, to_insert)
+    note = _note(mn=make_note_config)
+    note.amplitude = AMP + 1
+    note_sequence.insert(-1, note)
+    assert list(note_sequence.column('amplitude')) == [0.0, 1.0, AMP, AMP, 2.0, AMP + 1, 3.0]
+
+    note_sequence.remove((1, 4))
+    assert list(note_sequence.column('amplitude')) == [0.0, 2.0, AMP + 1, 3.0]
+    # Appending after removing reuses capacity and keeps notes in order
+    note = _note(mn=make_note_config)
+    note.amplitude = AMP + 2
+    note_sequence.append(note)
+    assert list(note_sequence.column('amplitude')) == [0.0, 2.0, AMP + 1, 3.0, AMP + 2]
+
+    with pytest.raises(IndexError):
+        note_sequence.insert(len(note_sequence) + 1, _note(mn=make_note_config))
+
+
+def test_note_sequence_append_updates_child_sequence_range(make_note_config, note_sequence):
+    child_sequence = _note_sequence(mn=make_note_config)
+    child_sequence.set_column('amplitude', AMP)
+    note_sequence.append_child_sequence(child_sequence)
+    note_sequence.append(_note(mn=make_note_config))
+    note_sequence.extend(_note_sequence(mn=make_note_config))
+    assert len(note_sequence) == 5 + len(child_sequence)
+    assert list(note_sequence.range_map.keys()) == [0, 5]
+    assert list(note_sequence.column('amplitude')) == [0.0] * 5 + [AMP] * len(child_sequence)
+    note_sequence.remove((0, 1))
+    assert list(note_sequence.range_map.keys()) == [0, 4]
+
 def test_child_sequences(make_note_config, note_sequence):
     child_sequence = NoteSequence.copy(note_sequence)
     child_sequence[0].amplitude = AMP
@@ -179,6 +332,33 @@ def test_nested_child_sequences(make_note_config, note_sequence):
     assert len(note_sequence) == note_sequence_len + child_sequence_len + child_child_sequence_len
 
 
+def test_child_sequences_index(make_note_config, note_sequence):
+    # Each sequence's notes have its own amplitude, so each index can be checked against the sequence it is in
+    note_sequence.set_column('amplitude', 0.0)
+    child_sequences = [_note_sequence(mn=make_note_config) for _ in range(3)]
+    child_child_sequence = _note_sequence(mn=make_note_config)
+    child_sequences[1].append_child_sequence(child_child_sequence)
+    child_sequences[1].remove((0, 1))
+    for amplitude, child_sequence in enumerate(child_sequences + [child_child_sequence], start=1):
+        child_sequence.set_column('amplitude', float(amplitude))
+    for child_sequence in child_sequences:
+        note_sequence.append_child_sequence(child_sequence)
+
+    # Children are flattened depth first, so the child of the second child comes before the third child
+    expected_amplitudes = [0.0] * 2 + [1.0] * 2 + [2.0] + [4.0] * 2 + [3.0] * 2
+    assert len(note_sequence) == len(expected_amplitudes)
+    assert [note_sequence[i].amplitude for i in range(len(note_sequence))] == expected_amplitudes
+    assert [note.amplitude for note in note_sequence] == expected_amplitudes
+    assert list(note_sequence.range_map.keys()) == [0, 2, 4, 5, 7]
+
+    # Offsets of child sequences are unchanged by adding notes to the parent
+    note_sequence.append(_note(mn=make_note_config))
+    assert note_sequence[3].amplitude == 1.0
+    assert note_sequence[len(note_sequence) - 1].amplitude == 3.0
+    with pytest.raises(IndexError):
+        _ = note_sequence[len(note_sequence)]
+
+
 def test_make_notes(make_note_config, note_sequence):
     assert len(note_sequence) == 2
     notes = note_sequence.notes()
@@ -197,5 +377,151 @@ def test_make_notes(make_note_config, note_sequence):
         assert note.amplitude == 0.0
 
 
+def test_column(make_note_config, note_sequence):
+    note_sequence[0].amplitude = AMP
+    note_sequence[1].amplitude = AMP + 1
+    assert list(note_sequence.column('amplitude')) == [AMP, AMP + 1]
+    # Column of a sequence without child sequences is a writable view over the notes
+    note_sequence.column('amplitude')[:] *= 2
+    assert note_sequence[0].amplitude == AMP * 2
+    assert note_sequence[1].amplitude == (AMP + 1) * 2
+
+    with pytest.raises(ValueError):
+        note_sequence.column('not_an_attr')
+
+
+def test_iter_rows_itertuples(make_note_config, note_sequence):
+    child_sequence = _note_sequence(mn=make_note_config)
+    note_sequence.append_child_sequence(child_sequence)
+    note_sequence.set_column('amplitude', [AMP, AMP + 1, AMP + 2, AMP + 3])
+
+    # Each iterator has its own position, so nested iterations over the same sequence are independent
+    pairs = [(outer.amplitude, inner.amplitude) for outer in note_sequence for inner in note_sequence]
+    assert len(pairs) == len(note_sequence) ** 2
+    assert pairs[:4] == [(AMP, AMP), (AMP, AMP + 1), (AMP, AMP + 2), (AMP, AMP + 3)]
+    assert pairs[-1] == (AMP + 3, AMP + 3)
+
+    amplitude_idx = ATTR_NAME_IDX_MAP['amplitude']
+    rows = list(note_sequence.rows())
+    assert [row[amplitude_idx] for row in rows] == [AMP, AMP + 1, AMP + 2, AMP + 3]
+    # Rows are views, so writes modify the notes, including notes in child sequences
+    rows[-1][amplitude_idx] = AMP
+    assert child_sequence[1].amplitude == AMP
+
+    note_sequence.set_column('pitch', PITCH)
+    assert list(note_sequence.itertuples(['amplitude', 'pitch'])) == \
+        [(AMP, PITCH), (AMP + 1, PITCH), (AMP + 2, PITCH), (AMP, PITCH)]
+    assert next(note_sequence.itertuples()) == tuple(note_sequence.note_attr_vals[0].tolist())
+    with pytest.raises(ValueError):
+        next(note_sequence.itertuples(['not_an_attr']))
+
+
+def test_set_column(make_note_config, note_sequence):
+    child_sequence = NoteSequence.copy(_note_sequence(mn=make_note_config))
+    child_child_sequence = NoteSequence.copy(_note_sequence(mn=make_note_config))
+    child_sequence.append_child_sequence(child_child_sequence)
+    note_sequence.append_child_sequence(child_sequence)
+    assert len(note_sequence) == 6
+
+    # Scalar is applied to all notes, spanning child sequences
+    note_sequence.set_column('pitch', PITCH)
+    assert list(note_sequence.column('pitch')) == [PITCH] * 6
+    assert child_child_sequence[1].pitch == PITCH
+    # Including numpy scalars, e.g. reductions of a column
+    note_sequence.set_column('amplitude', np_int64(AMP))
+    assert list(note_sequence.column('amplitude')) == [AMP] * 6
+    note_sequence.set_column('pitch', note_sequence.column('pitch').max() + 1)
+    assert list(note_sequence.column('pitch')) == [PITCH + 1] * 6
+
+    # Sequence of values is applied one per note, in index order
+    pitches = [PITCH + i for i in range(6)]
+    note_sequence.set_column('pitch', pitches)
+    assert list(note_sequence.column('pitch')) == pitches
+    assert child_sequence[0].pitch == pitches[2]
+    assert child_child_sequence[1].pitch == pitches[5]
+    assert [len(view) for view in note_sequence.column_views('pitch')] == [2, 2, 2]
+
+    with pytest.raises(ValueError):
+        note_sequence.set_column('pitch', pitches[:-1])
+
+
+def test_pack(make_note_config):
+    note_sequences = [_note_sequence(mn=make_note_config) for _ in range(3)]
+    for i, note_sequence in enumerate(note_sequences):
+        note_sequence.set_column('pitch', [PITCH + i, PITCH + i])
+    packed, offsets = NoteSequence.pack(note_sequences)
+    assert packed.shape == (3 * NUM_NOTES, NUM_ATTRIBUTES)
+    assert list(offsets) == [0, 2, 4, 6]
+    assert [note_sequence.packed_offset(packed) for note_sequence in note_sequences] == [0, 2, 4]
+
+    # Sequences and the packed array share storage, in both directions
+    note_sequences[1][0].amplitude = AMP
+    assert packed[2, ATTR_NAME_IDX_MAP['amplitude']] == AMP
+    packed[:, ATTR_NAME_IDX_MAP['pitch']] += 1
+    assert list(note_sequences[2].column('pitch')) == [PITCH + 3, PITCH + 3]
+
+    # Adjacent packed sequences have one column view
+    views, note_counts = NoteSequence.column_views_for_sequences(note_sequences, 'pitch')
+    assert len(views) == 1
+    assert note_counts == [2, 2, 2]
+
+    # Adding a note reallocates the sequence's storage, so it is no longer packed
+    note_sequences[1].append(_note(mn=make_note_config))
+    assert note_sequences[1].packed_offset(packed) is None
+    views, note_counts = NoteSequence.column_views_for_sequences(note_sequences, 'pitch')
+    assert [len(view) for view in views] == [2, 3, 2]
+    assert note_counts == [2, 3, 2]
+
+    with pytest.raises(ValueError):
+        NoteSequence.pack([note_sequences[0], note_sequences[0]])
+
+
+def test_memmap_storage(tmp_path, make_note_config):
+    storage_path = tmp_path / 'notes.dat'
+    storage = NoteSequence.new_memmap_storage(NUM_NOTES, NUM_ATTRIBUTES, path=storage_path)
+    note_sequence = NoteSequence(num_notes=NUM_NOTES, mn=make_note_config, storage=storage)
+    note_sequence[1].pitch = PITCH
+    assert storage[1, ATTR_NAME_IDX_MAP['pitch']] == PITCH
+
+    # Growing extends the file, and the storage stays memory-mapped from it
+    note = _note(mn=make_note_config)
+    note.amplitude = AMP
+    for _ in range(NoteSequence.MIN_CAPACITY * 4):
+        note_sequence.append(note)
+    num_notes = NUM_NOTES + NoteSequence.MIN_CAPACITY * 4
+    assert len(note_sequence) == num_notes
+    assert isinstance(note_sequence.note_attr_vals, memmap)
+    assert storage_path.stat().st_size == note_sequence.capacity * NUM_ATTRIBUTES * float64().itemsize
+    assert note_sequence[1].pitch == PITCH
+    assert note_sequence[num_notes - 1].amplitude == AMP
+    # Notes written through the sequence are in the file
+    note_sequence.note_attr_vals.flush()
+    from_file = memmap(str(storage_path), dtype=float64, mode='r', shape=(num_notes, NUM_ATTRIBUTES))
+    assert from_file[1, ATTR_NAME_IDX_MAP['pitch']] == PITCH
+
+    # Anonymous storage grows into a new anonymous memmap
+    anonymous_sequence = NoteSequence(num_notes=0, mn=make_note_config,
+                                      storage=NoteSequence.new_memmap_storage(NUM_NOTES, NUM_ATTRIBUTES))
+    for _ in range(NoteSequence.MIN_CAPACITY + 1):
+        anonymous_sequence.append(note)
+    assert isinstance(anonymous_sequence.note_attr_vals, memmap)
+    assert list(anonymous_sequence.column('amplitude')) == [AMP] * (NoteSequence.MIN_CAPACITY + 1)
+
+    with pytest.raises(ValueError):
+        NoteSequence(num_notes=NUM_NOTES + 1, mn=make_note_config,
+                     storage=NoteSequence.new_memmap_storage(NUM_NOTES, NUM_ATTRIBUTES))
+
+
+def test_note_sequence_iter_boundary_validation(note_sequence):
+    with validation_policy(ValidationPolicy.BOUNDARY):
+        # Notes made internally while iterating are not validated again, but writes from the caller still are
+        notes = list(note_sequence)
+        assert [note.start for note in notes] == [START] * NUM_NOTES
+        with pytest.raises(ValueError):
+            notes[0].start = 'NOT_A_NUMBER'
+        with pytest.raises(ValueError):
+            note_sequence.note('NOT_AN_INDEX')
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
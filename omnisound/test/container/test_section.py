@@ -426,11 +426,52 @@ def test_getitem_insert_remove(make_note_config, section, measure, meter, swing)
     assert old_first_note.amplitude == old_first_note_amplitude
 
 
+def test_contiguous(make_note_config, measure, meter, swing):
+    section = Section(measure_list=_measure_list(make_note_config, meter, swing), contiguous=True)
+    assert section.note_attr_vals.shape == (2 * NUM_NOTES, NUM_ATTRIBUTES)
+    assert list(section.measure_offsets) == [0, NUM_NOTES, 2 * NUM_NOTES]
+    # Each Measure's notes are a view of the Section's array
+    section[1][0].amplitude = AMP + 1
+    assert section.note_attr_vals[NUM_NOTES, ATTR_NAME_IDX_MAP['amplitude']] == AMP + 1
+
+    section.set_attr('amplitude', AMP + 2)
+    assert section.get_attr('amplitude') == [AMP + 2] * (2 * NUM_NOTES)
+    section.tempo = int(TEMPO_QPM / 2)
+    assert section.get_attr('start') == [0.0, 2 * DUR, DUR * 4, DUR * 6] * 2
+
+    # Adding and removing Measures and notes still works, and the array is rebuilt when next needed
+    section.append(measure)
+    section.insert(0, Measure.copy(measure))
+    section.remove((1, 2))
+    section[0].append(NoteSequence.new_note(make_note_config))
+    assert list(section.measure_offsets) == [0, NUM_NOTES + 1, 2 * NUM_NOTES + 1, 3 * NUM_NOTES + 1]
+    assert len(section.note_attr_vals) == 3 * NUM_NOTES + 1
+    section.set_attr('pitch', PITCH + 1)
+    for measure in section:
+        for note in measure:
+            assert note.pitch == pytest.approx(PITCH + 1)
+
+    section_copy = Section.copy(section)
+    assert section_copy.contiguous
+    assert section_copy.get_attr('pitch') == section.get_attr('pitch')
+
+
 def test_iter_next_eq(make_note_config, section, meter, swing):
     comp_measure = _measure(mn=make_note_config, meter=meter, swing=swing)
     for measure in section:
         assert measure == comp_measure
 
 
+def test_iter_rows_itertuples(section):
+    # Nested iterations over the same Section are independent
+    assert [(i, j) for i, _ in enumerate(section) for j, _ in enumerate(section)] == \
+        [(i, j) for i in range(len(section)) for j in range(len(section))]
+
+    pitches = section.get_attr('pitch')
+    pitch_idx = section[0].mn.attr_name_idx_map['pitch']
+    assert [row[pitch_idx] for row in section.rows()] == pitches
+    assert [pitch for pitch, in section.itertuples(['pitch'])] == pitches
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
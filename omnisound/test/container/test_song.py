@@ -1,5 +1,7 @@
 # Copyright 2018 Mark S. Weiss
 
+from pickle import dumps, loads
+
 import pytest
 
 from omnisound.src.note.adapter.note import MakeNoteConfig
@@ -289,6 +291,18 @@ def test_song_insert_remove_getitem(track):
     assert not song.track_map
 
 
+def test_song_iter(track):
+    track_2 = Track.copy(track)
+    song = Song(to_add=[track, track_2])
+    # Nested iterations over the same Song are independent
+    assert [(outer is inner) for outer in song for inner in song] == [True, False, False, True]
+    iter_1 = iter(song)
+    iter_2 = iter(song)
+    assert next(iter_1) is track
+    assert next(iter_1) is track_2
+    assert next(iter_2) is track
+
+
 def test_set_tempo(track, meter):
     empty_track_list = []
     song = Song(to_add=empty_track_list, meter=meter)
@@ -303,5 +317,82 @@ def test_set_tempo(track, meter):
             assert [note.start for note in measure] == expected_starts
 
 
+def test_set_tempo_all_tracks(make_note_config, swing, performance_attrs):
+    # Each track has its own measures and meter, and a tempo change on the song retimes all of them once
+    song_meter = Meter(beats_per_measure=BEATS_PER_MEASURE, beat_note_dur=BEAT_DUR, tempo=TEMPO_QPM)
+    track_meters = [Meter(beats_per_measure=BEATS_PER_MEASURE, beat_note_dur=BEAT_DUR, tempo=TEMPO_QPM)
+                    for _ in range(2)]
+    tracks = [Track(to_add=_measure_list(make_note_config, track_meter, swing), meter=track_meter,
+                    performance_attrs=performance_attrs)
+              for track_meter in track_meters]
+    song = Song(to_add=tracks, meter=song_meter)
+    song.tempo = int(TEMPO_QPM / 2)
+    song.tempo = int(TEMPO_QPM / 2)
+
+    expected_starts = [0.0, 2 * DUR, DUR * 4, DUR * 6]
+    assert song.tempo == int(TEMPO_QPM / 2)
+    for track in song:
+        assert track.tempo == int(TEMPO_QPM / 2)
+        for measure in track:
+            assert measure.tempo == int(TEMPO_QPM / 2)
+            for note in measure:
+                assert note.duration == pytest.approx(DUR * 2)
+            assert [note.start for note in measure] == expected_starts
+
+
+
+def test_song_copy_on_write(make_note_config, meter, swing, performance_attrs):
+    # The notes of the fixture Measures were written through Notes, which could still write them, so they can't be
+    #  shared. Copies of them have notes of their own that haven't been written through any view kept outside them.
+    measure_list = [Measure.copy(measure) for measure in _measure_list(make_note_config, meter, swing)]
+    track = Track(to_add=measure_list, name=TRACK_NAME, instrument=INSTRUMENT + 1,
+                  performance_attrs=performance_attrs)
+    song = Song(to_add=[track], name=SONG_NAME, meter=meter)
+    song_copy = Song.copy(song)
+    assert song_copy.name == SONG_NAME
+    assert song_copy[0].instrument == INSTRUMENT + 1
+    # The copied Measures share the notes of the source Measures until they are written
+    for measure, measure_copy in zip(song[0], song_copy[0]):
+        assert measure_copy is not measure
+        assert measure_copy._notes_view().base is measure._notes_view().base
+        assert measure_copy == measure
+    assert song_copy[0].get_attr('instrument') == song[0].get_attr('instrument')
+
+    song_copy[0].set_attr('pitch', PITCH + 1)
+    assert song_copy[0].get_attr('pitch') == [PITCH + 1] * NUM_NOTES * 2
+    assert song[0].get_attr('pitch') == [PITCH] * NUM_NOTES * 2
+    song[0][0][0].amplitude = AMP + 1
+    assert song_copy[0][0][0].amplitude == AMP
+
+
+def test_song_pickle(make_note_config, meter, swing, performance_attrs):
+    tracks = [Track(to_add=_measure_list(make_note_config, meter, swing), name=f'{TRACK_NAME}_{contiguous}',
+                    instrument=INSTRUMENT + 1, performance_attrs=performance_attrs, contiguous=contiguous)
+              for contiguous in (False, True)]
+    song = Song(to_add=tracks, name=SONG_NAME, meter=meter)
+    buffers = []
+    loaded = loads(dumps(song, protocol=5, buffer_callback=buffers.append),
+                   buffers=[bytes(buffer) for buffer in buffers])
+    # The notes of each Measure are an out-of-band buffer, as are other arrays, e.g. those cached by the Meter
+    assert sum(buffer.raw().nbytes for buffer in buffers) >= sum(len(track.note_attr_vals) for track in song) * \
+        NUM_ATTRIBUTES * 8
+    assert loaded == song
+    assert loaded.name == SONG_NAME
+    assert list(loaded.track_map.keys()) == list(song.track_map.keys())
+    for loaded_track, track in zip(loaded, song):
+        assert loaded_track.instrument == INSTRUMENT + 1
+        assert loaded_track.contiguous == track.contiguous
+        assert loaded_track.performance_attrs.as_dict() == performance_attrs.as_dict()
+        # Objects shared before pickling are still shared
+        assert loaded_track[0].meter is loaded.meter
+        assert loaded_track[0].swing is loaded_track[1].swing
+    # A contiguous Track is packed again when unpickled
+    assert loaded[1]._is_packed()
+
+    loaded[0].set_attr('pitch', PITCH + 1)
+    assert loaded[0].get_attr('pitch') == [PITCH + 1] * NUM_NOTES * 2
+    assert song[0].get_attr('pitch') == [PITCH] * NUM_NOTES * 2
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
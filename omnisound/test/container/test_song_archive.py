@@ -0,0 +1,151 @@
+# Copyright 2020 Mark S. Weiss
+
+import json
+
+import pytest
+from numpy import memmap
+
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.song import Song
+from omnisound.src.container.song_archive import HEADER_FILE_NAME, SongArchiveException
+from omnisound.src.container.track import MidiTrack, Track
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.modifier.swing import Swing
+import omnisound.src.note.adapter.midi_note as midi_note
+
+SONG_NAME = 'song'
+TRACK_NAMES = ('drums', 'bass')
+CHANNELS = (10, 2)
+INSTRUMENTS = (1, 33)
+NUM_MEASURES = 3
+NUM_NOTES = 4
+BEATS_PER_MEASURE = 4
+BEAT_DUR = NoteDur.QUARTER
+TEMPO_QPM = 240
+DUR = float(NoteDur.QUARTER.value)
+PITCH = 60
+
+
+@pytest.fixture
+def make_note_config():
+    return MakeNoteConfig(cls_name=midi_note.CLASS_NAME,
+                          num_attributes=midi_note.NUM_ATTRIBUTES,
+                          make_note=midi_note.make_note,
+                          pitch_for_key=midi_note.pitch_for_key,
+                          attr_name_idx_map=midi_note.ATTR_NAME_IDX_MAP,
+                          attr_val_cast_map=midi_note.ATTR_VAL_CAST_MAP)
+
+
+def _track(mn, meter, swing, track_idx, contiguous):
+    measures = []
+    for i in range(NUM_MEASURES):
+        measure = Measure(meter=meter, swing=swing, num_notes=NUM_NOTES, mn=mn)
+        measure.set_column('time', [j * DUR for j in range(NUM_NOTES)])
+        measure.set_column('duration', DUR)
+        measure.set_column('pitch', [PITCH + track_idx + i + j for j in range(NUM_NOTES)])
+        measures.append(measure)
+    return MidiTrack(to_add=measures, meter=meter, swing=swing, name=TRACK_NAMES[track_idx],
+                     channel=CHANNELS[track_idx], instrument=INSTRUMENTS[track_idx], contiguous=contiguous)
+
+
+@pytest.fixture
+def song(make_note_config):
+    meter = Meter(beats_per_measure=BEATS_PER_MEASURE, beat_note_dur=BEAT_DUR, tempo=TEMPO_QPM)
+    swing = Swing(swing_on=True, swing_range=0.1, swing_ratio=0.6, seed=1)
+    song = Song(to_add=[_track(make_note_config, meter, swing, 0, contiguous=False),
+                        _track(make_note_config, meter, None, 1, contiguous=True)],
+                name=SONG_NAME, meter=meter)
+    song.tempo = TEMPO_QPM / 2
+    return song
+
+
+def _assert_same_song(loaded: Song, song: Song):
+    assert loaded == song
+    assert loaded.name == song.name
+    assert loaded.tempo == song.tempo
+    for loaded_track, track in zip(loaded, song):
+        assert type(loaded_track) is MidiTrack
+        assert loaded_track.name == track.name
+        assert loaded_track.channel == track.channel
+        assert loaded_track.instrument == track.instrument
+        assert loaded_track.contiguous == track.contiguous
+        assert loaded_track.get_attr('pitch') == track.get_attr('pitch')
+        assert loaded_track[0].mn.make_note is midi_note.make_note
+        assert loaded_track[0].tempo == TEMPO_QPM / 2
+
+
+def test_save_load(tmp_path, song):
+    song.save(tmp_path / SONG_NAME)
+    loaded = Song.load(tmp_path / SONG_NAME)
+    _assert_same_song(loaded, song)
+    # Measures that shared a Meter and Swing still do
+    assert loaded.meter is loaded[0].meter is loaded[1][0].meter
+    assert loaded[0][0].swing is loaded[0][1].swing
+    assert loaded[1][0].swing is None
+
+    # Notes are memory-mapped, and changes aren't written back to the archive
+    assert isinstance(loaded[0][0].note_attr_vals, memmap)
+    loaded[0][0][0].pitch = PITCH - 1
+    assert loaded[0][0][0].pitch == PITCH - 1
+    assert Song.load(tmp_path / SONG_NAME)[0][0][0].pitch == PITCH
+
+    assert not isinstance(Song.load(tmp_path / SONG_NAME, mmap=False)[0][0].note_attr_vals, memmap)
+
+
+def test_save_load_npz(tmp_path, song):
+    song.save(tmp_path / f'{SONG_NAME}.npz')
+    _assert_same_song(Song.load(tmp_path / f'{SONG_NAME}.npz'), song)
+
+
+def test_save_load_measure_tempos(tmp_path, song):
+    # Retime one Measure without the others that share its Meter, so the Measures' notes are timed at different tempos
+    song[0][0].tempo = TEMPO_QPM
+    song.save(tmp_path / SONG_NAME)
+    loaded = Song.load(tmp_path / SONG_NAME, mmap=False)
+    assert [measure.tempo for measure in loaded[0]] == [TEMPO_QPM] + [TEMPO_QPM / 2] * (NUM_MEASURES - 1)
+    loaded.tempo = TEMPO_QPM
+    assert loaded[0].get_attr('time') == [j * DUR for j in range(NUM_NOTES)] * NUM_MEASURES
+
+
+def test_load_track_names(tmp_path, song):
+    song.save(tmp_path / SONG_NAME)
+    loaded = Song.load(tmp_path / SONG_NAME, track_names=[TRACK_NAMES[1]])
+    assert len(loaded) == 1
+    assert loaded.track_map[TRACK_NAMES[1]].get_attr('pitch') == song[1].get_attr('pitch')
+
+    with pytest.raises(SongArchiveException):
+        Song.load(tmp_path / SONG_NAME, track_names=['not_a_track'])
+
+
+def test_load_unsupported_version(tmp_path, song):
+    song.save(tmp_path / SONG_NAME)
+    header_path = tmp_path / SONG_NAME / HEADER_FILE_NAME
+    header = json.loads(header_path.read_text())
+    header['version'] += 1
+    header_path.write_text(json.dumps(header))
+    with pytest.raises(SongArchiveException):
+        Song.load(tmp_path / SONG_NAME)
+
+
+def test_save_note_config_lambda_cast(tmp_path, make_note_config):
+    # A lambda can't be imported again on load, so saving fails rather than loading
+    make_note_config.attr_val_cast_map = dict(make_note_config.attr_val_cast_map)
+    make_note_config.attr_val_cast_map['pitch'] = lambda pitch: int(pitch)
+    song = Song(to_add=[Track(to_add=[Measure(num_notes=NUM_NOTES, mn=make_note_config)], name=TRACK_NAMES[0])],
+                name=SONG_NAME)
+    with pytest.raises(SongArchiveException):
+        song.save(tmp_path / SONG_NAME)
+
+
+def test_save_empty_track(tmp_path, make_note_config):
+    song = Song(to_add=[Track(name=TRACK_NAMES[0])], name=SONG_NAME)
+    song.save(tmp_path / SONG_NAME)
+    loaded = Song.load(tmp_path / SONG_NAME)
+    assert len(loaded) == 1
+    assert loaded[0].name == TRACK_NAMES[0]
+    assert not loaded[0].measure_list
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
@@ -0,0 +1,140 @@
+# Copyright 2020 Mark S. Weiss
+
+from concurrent.futures import ProcessPoolExecutor
+from json import dumps
+
+import pytest
+
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.song import Song
+from omnisound.src.container.song_shared_memory import SharedSongException
+from omnisound.src.container.track import MidiTrack, Track
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.modifier.swing import Swing
+import omnisound.src.note.adapter.midi_note as midi_note
+
+SONG_NAME = 'song'
+TRACK_NAMES = ('drums', 'bass')
+CHANNELS = (10, 2)
+INSTRUMENTS = (1, 33)
+NUM_MEASURES = 3
+NUM_NOTES = 4
+BEATS_PER_MEASURE = 4
+BEAT_DUR = NoteDur.QUARTER
+TEMPO_QPM = 240
+DUR = float(NoteDur.QUARTER.value)
+PITCH = 60
+INTERVAL = 12
+
+
+@pytest.fixture
+def make_note_config():
+    return MakeNoteConfig(cls_name=midi_note.CLASS_NAME,
+                          num_attributes=midi_note.NUM_ATTRIBUTES,
+                          make_note=midi_note.make_note,
+                          pitch_for_key=midi_note.pitch_for_key,
+                          attr_name_idx_map=midi_note.ATTR_NAME_IDX_MAP,
+                          attr_val_cast_map=midi_note.ATTR_VAL_CAST_MAP)
+
+
+def _track(mn, meter, swing, track_idx, contiguous):
+    measures = []
+    for i in range(NUM_MEASURES):
+        measure = Measure(meter=meter, swing=swing, num_notes=NUM_NOTES, mn=mn)
+        measure.set_column('time', [j * DUR for j in range(NUM_NOTES)])
+        measure.set_column('duration', DUR)
+        measure.set_column('pitch', [PITCH + track_idx + i + j for j in range(NUM_NOTES)])
+        measures.append(measure)
+    return MidiTrack(to_add=measures, meter=meter, swing=swing, name=TRACK_NAMES[track_idx],
+                     channel=CHANNELS[track_idx], instrument=INSTRUMENTS[track_idx], contiguous=contiguous)
+
+
+@pytest.fixture
+def song(make_note_config):
+    meter = Meter(beats_per_measure=BEATS_PER_MEASURE, beat_note_dur=BEAT_DUR, tempo=TEMPO_QPM)
+    swing = Swing(swing_on=True, swing_range=0.1, swing_ratio=0.6, seed=1)
+    return Song(to_add=[_track(make_note_config, meter, swing, 0, contiguous=False),
+                        _track(make_note_config, meter, None, 1, contiguous=True)],
+                name=SONG_NAME, meter=meter)
+
+
+def _transpose_track(descriptor, track_name):
+    shared_song = Song.attach_shared_memory(descriptor, track_names=[track_name])
+    assert len(shared_song.song) == 1
+    track = shared_song.song.track_map[track_name]
+    track.set_attr('pitch', PITCH + INTERVAL)
+    pitches = track.get_attr('pitch')
+    # Release views of the block before closing it
+    track = None
+    shared_song.close()
+    return pitches
+
+
+def test_export_attach(song):
+    shared_song = song.to_shared_memory()
+    try:
+        assert shared_song.song == song
+        # The descriptor is all other processes need to attach, and holds no arrays
+        assert dumps(shared_song.descriptor)
+
+        with Song.attach_shared_memory(shared_song.descriptor) as attached:
+            assert attached.song == song
+            assert attached.song.name == SONG_NAME
+            for attached_track, track in zip(attached.song, song):
+                assert type(attached_track) is MidiTrack
+                assert attached_track.name == track.name
+                assert attached_track.channel == track.channel
+                assert attached_track.instrument == track.instrument
+                assert attached_track.contiguous == track.contiguous
+                assert attached_track[0].mn.make_note is midi_note.make_note
+            # Notes are views of the block, so writes are seen by every Song attached to it
+            attached.song[0][0][0].pitch = PITCH - 1
+            assert shared_song.song[0][0][0].pitch == PITCH - 1
+            assert song[0][0][0].pitch == PITCH
+            # Release views of the block before closing it
+            attached_track = None
+    finally:
+        shared_song.close()
+        shared_song.unlink()
+
+
+def test_export_attach_worker(song):
+    with song.to_shared_memory() as shared_song:
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            worker_pitches = list(executor.map(_transpose_track, [shared_song.descriptor] * len(song),
+                                               TRACK_NAMES))
+        # Each worker wrote the notes of its Track in place, in the block
+        for track, pitches in zip(shared_song.song, worker_pitches):
+            assert pitches == [PITCH + INTERVAL] * NUM_MEASURES * NUM_NOTES
+            assert track.get_attr('pitch') == pitches
+        # Release views of the block before closing it
+        track = None
+        shared_song.unlink()
+
+
+def test_attach_unlinked(song):
+    shared_song = song.to_shared_memory()
+    descriptor = shared_song.descriptor
+    shared_song.close()
+    shared_song.unlink()
+    with pytest.raises(SharedSongException):
+        Song.attach_shared_memory(descriptor)
+
+
+def test_attach_track_names(song):
+    with song.to_shared_memory() as shared_song:
+        with pytest.raises(SharedSongException):
+            Song.attach_shared_memory(shared_song.descriptor, track_names=['not_a_track'])
+        shared_song.unlink()
+
+
+def test_export_empty_song():
+    with Song(to_add=[Track(name=TRACK_NAMES[0])], name=SONG_NAME).to_shared_memory() as shared_song:
+        assert len(shared_song.song) == 1
+        assert not shared_song.song[0].measure_list
+        shared_song.unlink()
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
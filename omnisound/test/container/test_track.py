@@ -223,5 +223,19 @@ def test_set_tempo(measure_list, meter):
         assert [note.start for note in measure] == expected_starts
 
 
+
+def test_set_tempo_after_retiming_one_measure(measure_list, meter):
+    track = Track(to_add=measure_list, instrument=INSTRUMENT, meter=meter)
+    # The first Measure shares the Meter with the others, which must still be retimed when the Track tempo is set
+    track.measure_list[0].tempo = int(TEMPO_QPM / 2)
+    track.tempo = int(TEMPO_QPM / 2)
+    expected_starts = [0.0, 2 * DUR, DUR * 4, DUR * 6]
+    for measure in track:
+        assert measure.tempo == int(TEMPO_QPM / 2)
+        for note in measure:
+            assert note.duration == pytest.approx(DUR * 2)
+        assert [note.start for note in measure] == expected_starts
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
@@ -6,6 +6,7 @@ from omnisound.src.generator.chord_globals import HarmonicChord
 from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.modifier.meter import Meter, NoteDur
 from omnisound.src.modifier.swing import Swing
+from omnisound.src.generator.sequencer.pattern_cache import PatternCache
 from omnisound.src.generator.sequencer.sequencer import Sequencer
 import omnisound.src.note.adapter.csound_note as csound_note
 
@@ -60,12 +61,13 @@ def swing():
     return Swing(swing_range=SWING_RANGE)
 
 
-def _sequencer(mn, meter, swing):
+def _sequencer(mn, meter, swing, pattern_cache=None):
     return Sequencer(name=SEQUENCER_NAME,
                      num_measures=NUM_MEASURES,
                      meter=meter,
                      swing=swing,
-                     mn=mn)
+                     mn=mn,
+                     pattern_cache=pattern_cache)
 
 
 @pytest.fixture
@@ -261,3 +263,82 @@ def test_transpose(sequencer):
     interval = 3
     sequencer.transpose(interval)
     assert first_note.pitch == 4.04
+
+
+def test_pattern_cache(make_note_config, meter, swing):
+    pattern_cache = PatternCache()
+    sequencer = _sequencer(make_note_config, meter, swing, pattern_cache=pattern_cache)
+    compiled_track = sequencer.add_pattern_as_new_track(track_name=TRACK_NAME, pattern=PATTERN, instrument=INSTRUMENT)
+    assert (pattern_cache.hits, pattern_cache.misses) == (0, 1)
+
+    cached_track = sequencer.add_pattern_as_new_track(track_name=TRACK_NAME + '_2', pattern=PATTERN,
+                                                      instrument=INSTRUMENT)
+    assert (pattern_cache.hits, pattern_cache.misses) == (1, 1)
+    assert len(cached_track) == len(compiled_track)
+    for cached_measure, compiled_measure in zip(cached_track, compiled_track):
+        assert cached_measure == compiled_measure
+        assert cached_measure.meter is compiled_measure.meter
+    # Measures built from the cache don't share notes with the cache or each other
+    cached_track[0][0].pitch = PITCH
+    assert compiled_track[0][0].pitch != PITCH
+    assert sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT)[0][0].pitch != PITCH
+
+    # Different instrument and arpeggiation settings are compiled separately
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT + 1)
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT, arpeggiate=True)
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT, arpeggiate=True,
+                                       arpeggiator_chord=ARPEGGIATOR_CHORD)
+    assert (pattern_cache.hits, pattern_cache.misses) == (2, 4)
+    assert len(pattern_cache) == 4
+
+
+def test_pattern_cache_lru(make_note_config, meter, swing):
+    pattern_cache = PatternCache(max_size=2)
+    sequencer = _sequencer(make_note_config, meter, swing, pattern_cache=pattern_cache)
+    for instrument in (INSTRUMENT, INSTRUMENT + 1, INSTRUMENT, INSTRUMENT + 2):
+        sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=instrument)
+    assert (pattern_cache.hits, pattern_cache.misses) == (1, 3)
+    assert len(pattern_cache) == 2
+    # INSTRUMENT + 1 was least recently used, so it was evicted
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT)
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT + 1)
+    assert (pattern_cache.hits, pattern_cache.misses) == (2, 4)
+
+    with pytest.raises(ValueError):
+        PatternCache(max_size=-1)
+
+
+def test_pattern_cache_dir(tmp_path, make_note_config, meter, swing):
+    sequencer = _sequencer(make_note_config, meter, swing, pattern_cache=PatternCache(cache_dir=tmp_path))
+    compiled_track = sequencer.add_pattern_as_new_track(track_name=TRACK_NAME, pattern=PATTERN, instrument=INSTRUMENT)
+    assert len(list(tmp_path.iterdir())) == 1
+
+    # A new cache with the same directory, e.g. in a new process, loads the pattern without compiling it
+    pattern_cache = PatternCache(cache_dir=tmp_path)
+    sequencer = _sequencer(make_note_config, meter, swing, pattern_cache=pattern_cache)
+    loaded_track = sequencer.add_pattern_as_new_track(track_name=TRACK_NAME, pattern=PATTERN, instrument=INSTRUMENT)
+    assert (pattern_cache.hits, pattern_cache.disk_hits, pattern_cache.misses) == (0, 1, 0)
+    for loaded_measure, compiled_measure in zip(loaded_track, compiled_track):
+        assert loaded_measure == compiled_measure
+    sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT)
+    assert (pattern_cache.hits, pattern_cache.disk_hits, pattern_cache.misses) == (1, 1, 0)
+
+
+def test_pattern_cache_lambda_casts(tmp_path, meter, swing):
+    # Lambdas all have the same module and name, but notes compiled with different ones must not share a key
+    pattern_cache = PatternCache(cache_dir=tmp_path)
+    amplitudes = []
+    for amplitude_cast in (lambda x: int(x), lambda x: int(x) // 2):
+        mn = MakeNoteConfig(cls_name=csound_note.CLASS_NAME,
+                            num_attributes=NUM_ATTRIBUTES,
+                            make_note=csound_note.make_note,
+                            pitch_for_key=csound_note.pitch_for_key,
+                            attr_name_idx_map=ATTR_NAME_IDX_MAP,
+                            attr_val_cast_map=dict(ATTR_VAL_CAST_MAP, amplitude=amplitude_cast))
+        sequencer = _sequencer(mn, meter, swing, pattern_cache=pattern_cache)
+        track = sequencer.add_pattern_as_new_track(pattern=PATTERN, instrument=INSTRUMENT)
+        amplitudes.append(list(track[0].column('amplitude')))
+    assert amplitudes == [[AMP] * NUM_NOTES, [AMP // 2] * NUM_NOTES]
+    assert (pattern_cache.hits, pattern_cache.disk_hits, pattern_cache.misses) == (0, 0, 2)
+    # Lambdas can't be imported again by another process, so their patterns aren't stored on disk
+    assert not list(tmp_path.iterdir())
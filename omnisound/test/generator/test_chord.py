@@ -8,6 +8,7 @@ from omnisound.src.note.adapter.note import MakeNoteConfig
 from omnisound.src.container.note_sequence import NoteSequence
 from omnisound.src.generator.chord import Chord
 from omnisound.src.generator.chord_globals import HarmonicChord
+from omnisound.src.generator.pitch_tables import chord_pitches, clear_pitch_tables
 from omnisound.src.generator.scale import Scale
 from omnisound.src.generator.scale_globals import HarmonicScale, MajorKey
 import omnisound.src.note.adapter.csound_note as csound_note
@@ -171,5 +172,20 @@ def test_copy_ostinato(chord):
         assert expected_start_times[i] == pytest.approx(note.start)
 
 
+def test_chord_pitch_table(make_note_config, chord):
+    # Chords built after the table entry exists copy its pitches, so changing one chord doesn't change another
+    chord.mod_transpose(1)
+    chord_from_table = Chord(harmonic_chord=HARMONIC_CHORD, octave=OCTAVE, key=KEY, mn=make_note_config)
+    _assert_expected_pitches(chord_from_table, [4.01, 4.05, 4.08])
+    mingus_chord, pitches = chord_pitches(HARMONIC_CHORD, KEY, OCTAVE, make_note_config.pitch_for_key)
+    assert list(mingus_chord) == chord_from_table.mingus_chord
+    assert list(pitches) == pytest.approx([4.01, 4.05, 4.08])
+    assert not pitches.flags.writeable
+
+    clear_pitch_tables()
+    _assert_expected_pitches(Chord(harmonic_chord=HARMONIC_CHORD, octave=OCTAVE, key=KEY, mn=make_note_config),
+                             [4.01, 4.05, 4.08])
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
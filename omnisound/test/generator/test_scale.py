@@ -132,5 +132,18 @@ def test_pitch_for_key_midi(make_note_config):
         assert expected_pitch == pitches[i]
 
 
+def test_scale_pitch_table(make_note_config, scale):
+    # Scales built from the same table entry don't share notes
+    scale[0].pitch = PITCH
+    scale_from_table = _scale(mn=make_note_config)
+    assert scale_from_table[0].pitch == pytest.approx(4.01)
+    assert scale_from_table.keys == scale.keys
+    assert scale_from_table.keys is not scale.keys
+
+    # The table has an entry per `pitch_for_key`
+    make_note_config.pitch_for_key = midi_note.pitch_for_key
+    assert [n.pitch for n in _scale(mn=make_note_config)] == [60, 62, 64, 65, 67, 69, 71]
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
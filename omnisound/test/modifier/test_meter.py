@@ -218,6 +218,61 @@ def test_quantize_to_beat(make_note_config, note_sequence, meter):
            [note.start for note in note_sequence]
 
 
+def test_quantize_rounding_bounds(make_note_config, meter):
+    # Only notes with a start that rounds to > 0.0 to one decimal place move. 0.05 rounds up to 0.1.
+    note_sequence = _note_sequence(mn=make_note_config)
+    note_sequence.set_column('start', [0.0, 0.04999, 0.05, 0.5])
+    note_sequence.set_column('duration', [DUR, DUR, DUR, DUR])
+    meter.quantize(note_sequence)
+    # The last note ends at 0.75 so every duration grows by 0.25 * 0.25, and moved notes move by the remainder
+    expected_starts = [0.0, 0.04999, 0.05 + 0.1875, 0.5 + 0.1875]
+    assert list(note_sequence.column('start')) == pytest.approx(expected_starts)
+    assert list(note_sequence.column('duration')) == pytest.approx([0.3125] * NUM_NOTES)
+
+
+def _quantize_note_sequences_fixture(mn):
+    note_sequences = []
+    for i in range(4):
+        note_sequence = _note_sequence(mn=mn)
+        note_sequence.set_column('start', [0.0, 0.3 + i * 0.01, 0.55, 0.8 + i * 0.1])
+        note_sequences.append(note_sequence)
+    # A sequence with a child sequence is quantized over all its notes
+    child_sequence = _note_sequence(mn=mn)
+    child_sequence.set_column('start', [0.1, 0.2, 0.6, 0.9])
+    note_sequences[3].append_child_sequence(child_sequence)
+    # An empty sequence is skipped
+    note_sequences.append(NoteSequence(num_notes=0, mn=mn))
+    return note_sequences
+
+
+def test_quantize_note_sequences(make_note_config, meter):
+    other_meter = Meter(beat_note_dur=NoteDur.EIGHTH, beats_per_measure=3, tempo=TEMPO_QPM)
+    not_quantizing_meter = Meter(beat_note_dur=BEAT_NOTE_DUR, beats_per_measure=BEATS_PER_MEASURE, tempo=TEMPO_QPM,
+                                 quantizing=False)
+    meters = [meter, other_meter, not_quantizing_meter, meter, meter]
+
+    for to_beat in (False, True):
+        # Quantizing in one batch is the same as quantizing one sequence at a time
+        expected = _quantize_note_sequences_fixture(make_note_config)
+        for m, note_sequence in zip(meters, expected):
+            if len(note_sequence):
+                m.quantize_to_beat(note_sequence) if to_beat else m.quantize(note_sequence)
+        actual = _quantize_note_sequences_fixture(make_note_config)
+        if to_beat:
+            Meter.quantize_note_sequences_to_beat(meters, actual)
+        else:
+            Meter.quantize_note_sequences(meters, actual)
+
+        for expected_seq, actual_seq in zip(expected, actual):
+            assert list(actual_seq.column('start')) == list(expected_seq.column('start'))
+            assert list(actual_seq.column('duration')) == list(expected_seq.column('duration'))
+        # Not quantizing, so unchanged
+        assert list(actual[2].column('start')) == [0.0, 0.32, 0.55, 1.0]
+
+    with pytest.raises(ValueError):
+        Meter.quantize_note_sequences([meter], actual)
+
+
 def test_tempo(meter):  # sourcery skip: use-assigned-variable
     assert meter.tempo == TEMPO_QPM
     quarter_note_dur_secs = meter.quarter_note_dur_secs
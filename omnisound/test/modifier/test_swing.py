@@ -159,5 +159,62 @@ def test_swing_both_random(note_sequence, swing):
         assert expected_swing_note_starts[i][0] <= actual_note_start <= expected_swing_note_starts[i][1]
 
 
+def _random_swing_note_starts(make_note_config, seed):
+    swing = Swing(swing_on=True, swing_range=SWING_RANGE, swing_direction=Swing.SwingDirection.Both,
+                  swing_jitter_type=Swing.SwingJitterType.Random, seed=seed)
+    note_sequence = NoteSequence(num_notes=NUM_NOTES, mn=make_note_config)
+    note_sequence.set_column('start', [1.0 + i * DUR for i in range(NUM_NOTES)])
+    swing.apply_swing(note_sequence)
+    return list(note_sequence.column('start'))
+
+
+def test_swing_seed(make_note_config):
+    # Swings with the same seed move notes by the same random offsets
+    assert _random_swing_note_starts(make_note_config, seed=1) == _random_swing_note_starts(make_note_config, seed=1)
+    assert _random_swing_note_starts(make_note_config, seed=1) != _random_swing_note_starts(make_note_config, seed=2)
+
+
+def test_swing_ratio(make_note_config):
+    # Eighth notes in beats that are a quarter note long. With a ratio of 2/3, notes on the beat take the first 2/3
+    #  of the beat and notes off the beat take the last 1/3 of it.
+    swing_ratio = 2 / 3
+    beat_dur = DUR
+    eighth_dur = DUR / 2
+    swing = Swing(swing_on=True, swing_range=0.0, swing_direction=Swing.SwingDirection.Forward,
+                  swing_ratio=swing_ratio)
+    note_sequence = NoteSequence(num_notes=NUM_NOTES, mn=make_note_config)
+    note_sequence.set_column('start', [i * eighth_dur for i in range(NUM_NOTES)])
+    note_sequence.set_column('duration', eighth_dur)
+
+    swing.apply_swing(note_sequence, beat_dur_secs=beat_dur)
+    assert list(note_sequence.column('start')) == pytest.approx([0.0, swing_ratio * beat_dur,
+                                                                 beat_dur, beat_dur + swing_ratio * beat_dur])
+    assert list(note_sequence.column('duration')) == pytest.approx([swing_ratio * beat_dur,
+                                                                    (1 - swing_ratio) * beat_dur] * 2)
+
+    # The beat duration is required to swing by a ratio
+    with pytest.raises(ValueError):
+        swing.apply_swing(note_sequence)
+    with pytest.raises(ValueError):
+        Swing(swing_ratio=1.0)
+
+
+def test_apply_swing_to_note_sequences(make_note_config):
+    swing = Swing(swing_on=True, swing_range=SWING_RANGE, swing_direction=Swing.SwingDirection.Reverse)
+    swing_off = Swing(swing_on=False, swing_range=SWING_RANGE)
+    note_sequences = [NoteSequence(num_notes=NUM_NOTES, mn=make_note_config) for _ in range(3)]
+    for note_sequence in note_sequences:
+        note_sequence.set_column('start', [i * DUR for i in range(NUM_NOTES)])
+
+    Swing.apply_swing_to_note_sequences([swing, swing_off, swing], note_sequences)
+    swung_starts = pytest.approx([0.0] + [i * DUR - SWING_RANGE for i in range(1, NUM_NOTES)])
+    assert list(note_sequences[0].column('start')) == swung_starts
+    assert list(note_sequences[1].column('start')) == [i * DUR for i in range(NUM_NOTES)]
+    assert list(note_sequences[2].column('start')) == swung_starts
+
+    with pytest.raises(ValueError):
+        Swing.apply_swing_to_note_sequences([swing], note_sequences)
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
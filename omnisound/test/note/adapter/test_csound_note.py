@@ -255,6 +255,16 @@ def test_csound_note_pitch_precision(note):
     assert note.pitch_precision == csound_note.SCALE_PITCH_PRECISION  # == 2
 
 
+def test_csound_note_str_formatter_per_note(note_sequence):
+    note_0 = note_sequence[0]
+    note_1 = note_sequence[1]
+    assert type(note_0) is type(note_1)
+    # Formatters are per-note state even though both notes share a class
+    note_0.set_attr_str_formatter('amplitude', lambda x: f'{x:.3f}')
+    assert str(note_0) != str(note_1)
+    assert str(note_1) == str(note_sequence[1])
+
+
 def test_note_values(make_note_config):
     note_values = _setup_note_values()
     make_note_config.attr_val_default_map = note_values.as_dict()
@@ -1,12 +1,15 @@
 # Copyright 2019 Mark S. Weiss
 
+from pickle import dumps, loads
 from typing import List
 
 import pytest
 
 from omnisound.src.note.adapter.note import MakeNoteConfig
 import omnisound.src.note.adapter.csound_note as csound_note
-from omnisound.src.note.adapter.note import as_dict, as_list, make_rest_note
+from omnisound.src.note.adapter.note import as_dict, as_list, clear_note_cls_registry, make_rest_note, \
+    NOTE_CLS_REGISTRY
+import omnisound.src.note.adapter.note as note_module
 from omnisound.src.container.note_sequence import NoteSequence
 
 
@@ -105,5 +108,69 @@ def test_add_base_attr_name_indexes(note):
     assert csound_note.ATTR_NAME_IDX_MAP == expected_attr_name_idx_map
 
 
+def test_note_cls_registry(make_note_config):
+    note_sequence = _note_sequence(mn=make_note_config)
+    note_0 = note_sequence[0]
+    note_1 = note_sequence[1]
+    # Notes with the same schema share one class built once and registered
+    assert type(note_0) is type(note_1)
+    assert type(note_0) in NOTE_CLS_REGISTRY.values()
+    num_registered = len(NOTE_CLS_REGISTRY)
+    _ = [note for note in note_sequence]
+    assert len(NOTE_CLS_REGISTRY) == num_registered
+    # Notes are still views over their own row in the sequence
+    note_0.amplitude = AMP + 1.0
+    assert note_sequence[0].amplitude == AMP + 1.0
+    assert note_sequence[1].amplitude == AMP
+
+    # A different schema gets its own class
+    attr_name_idx_map = dict(ATTR_NAME_IDX_MAP)
+    attr_name_idx_map['func_table'] = NUM_ATTRIBUTES
+    other_note = _note(mn=make_note_config,
+                       attr_name_idx_map=attr_name_idx_map,
+                       attr_val_default_map={'func_table': 1.0, **ATTR_VAL_DEFAULT_MAP},
+                       num_attributes=NUM_ATTRIBUTES + 1)
+    assert type(other_note) is not type(note_0)
+    assert other_note.func_table == 1.0
+
+
+def test_note_cls_registry_is_bounded(monkeypatch, make_note_config):
+    max_size = 2
+    monkeypatch.setattr(note_module, 'NOTE_CLS_REGISTRY_MAX_SIZE', max_size)
+    clear_note_cls_registry()
+    # Each new lambda is a new cast function, so each note is a new schema
+    notes = []
+    for i in range(max_size + 1):
+        make_note_config.attr_val_cast_map = {'amplitude': lambda attr_val: attr_val}
+        notes.append(_note(mn=make_note_config))
+    assert len(NOTE_CLS_REGISTRY) == max_size
+    # The least recently used class was evicted, but notes made from it still work
+    assert type(notes[0]) not in NOTE_CLS_REGISTRY.values()
+    assert [type(note) in NOTE_CLS_REGISTRY.values() for note in notes[1:]] == [True] * max_size
+    notes[0].amplitude = AMP + 1.0
+    assert notes[0].amplitude == AMP + 1.0
+
+
+
+def test_make_note_config_pickle(make_note_config):
+    loaded = loads(dumps(make_note_config))
+    assert loaded.cls_name == make_note_config.cls_name
+    assert loaded.num_attributes == make_note_config.num_attributes
+    # The adapter is pickled by name, and its functions and maps are the adapter's again when unpickled
+    assert loaded.make_note is csound_note.make_note
+    assert loaded.pitch_for_key is csound_note.pitch_for_key
+    assert loaded.attr_name_idx_map is csound_note.ATTR_NAME_IDX_MAP
+    assert loaded.attr_val_default_map == ATTR_VAL_DEFAULT_MAP
+    assert loaded.attr_val_cast_map == {}
+    assert b'pitch_for_key' not in dumps(make_note_config)
+
+    # A config that doesn't use an adapter's functions pickles them by reference
+    make_note_config.cls_name = 'NotAnAdapter'
+    loaded = loads(dumps(make_note_config))
+    assert loaded.cls_name == 'NotAnAdapter'
+    assert loaded.make_note is csound_note.make_note
+    assert loaded.attr_name_idx_map == ATTR_NAME_IDX_MAP
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
@@ -0,0 +1,91 @@
+# Copyright 2020 Mark S. Weiss
+
+import pytest
+from numpy.random import default_rng
+
+from omnisound.src.container.note_sequence import NoteSequence
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.player.csound.csound_score_formatter import CSoundScoreFormatter
+import omnisound.src.note.adapter.csound_note as csound_note
+
+NUM_NOTES = 8
+INSTRUMENT = 1
+AMP = 100.0
+# Include pitches that need rounding to two places and one that rounds across a tie
+PITCHES = [4.01, 4.015, 4.0149999, 5.125, 9.999, 1.0, 12.12, 4.005]
+EXTRA_ATTR_NAME = 'pan'
+NUM_RANDOM_NOTES = 5000
+SEED = 0
+
+
+def _make_note_config(attr_name_idx_map=None, attr_val_cast_map=None) -> MakeNoteConfig:
+    attr_name_idx_map = attr_name_idx_map or csound_note.ATTR_NAME_IDX_MAP
+    return MakeNoteConfig(cls_name=csound_note.CLASS_NAME,
+                          num_attributes=len(attr_name_idx_map),
+                          make_note=csound_note.make_note,
+                          pitch_for_key=csound_note.pitch_for_key,
+                          attr_name_idx_map=attr_name_idx_map,
+                          attr_val_default_map={'instrument': INSTRUMENT, 'amplitude': AMP},
+                          attr_val_cast_map=attr_val_cast_map or {})
+
+
+def _note_sequence(mn: MakeNoteConfig) -> NoteSequence:
+    note_sequence = NoteSequence(num_notes=NUM_NOTES, mn=mn)
+    note_sequence.set_column('start', [i * 0.123456789 for i in range(NUM_NOTES)])
+    note_sequence.set_column('duration', [0.25 + i / 3 for i in range(NUM_NOTES)])
+    note_sequence.set_column('amplitude', [AMP + i * 0.1 for i in range(NUM_NOTES)])
+    note_sequence.set_column('pitch', PITCHES)
+    return note_sequence
+
+
+def test_format_lines_matches_note_str():
+    mn = _make_note_config()
+    note_sequence = _note_sequence(mn)
+    formatter = CSoundScoreFormatter.for_note_config(mn)
+    assert formatter.format_lines(note_sequence.note_attr_vals) == [str(note) for note in note_sequence]
+    assert formatter.format(note_sequence.note_attr_vals) == ''.join(f'{note}\n' for note in note_sequence)
+    assert formatter.format_lines(NoteSequence(num_notes=0, mn=mn).note_attr_vals) == []
+
+
+@pytest.mark.parametrize('attr_val_cast_map', [{}, csound_note.ATTR_VAL_CAST_MAP])
+def test_format_lines_matches_note_str_random(attr_val_cast_map):
+    mn = _make_note_config(attr_val_cast_map=dict(attr_val_cast_map))
+    rng = default_rng(SEED)
+    note_sequence = NoteSequence(num_notes=NUM_RANDOM_NOTES, mn=mn)
+    note_sequence.set_column('instrument', rng.integers(1, 10, NUM_RANDOM_NOTES).astype(float))
+    note_sequence.set_column('start', rng.uniform(0.0, 100.0, NUM_RANDOM_NOTES))
+    note_sequence.set_column('duration', rng.uniform(0.0, 4.0, NUM_RANDOM_NOTES))
+    note_sequence.set_column('amplitude', rng.uniform(0.0, 1000.0, NUM_RANDOM_NOTES))
+    # Pitches on and next to the ties that numpy and Python round differently
+    note_sequence.set_column('pitch', rng.integers(1000, 12000, NUM_RANDOM_NOTES) / 1000 +
+                             rng.choice([0.0, 0.0005, -0.0005], NUM_RANDOM_NOTES))
+    formatter = CSoundScoreFormatter.for_note_config(mn)
+    assert formatter.format_lines(note_sequence.note_attr_vals) == [str(note) for note in note_sequence]
+
+
+def test_format_lines_pitch_precision():
+    mn = _make_note_config()
+    note_sequence = _note_sequence(mn)
+    formatter = CSoundScoreFormatter.for_note_config(mn, pitch_precision=4)
+    pitch_to_str = csound_note.pitch_to_str(4)
+    assert [line.split()[-1] for line in formatter.format_lines(note_sequence.note_attr_vals)] == \
+        [pitch_to_str(pitch) for pitch in PITCHES]
+
+
+def test_format_lines_cast_and_additional_attributes():
+    attr_name_idx_map = dict(csound_note.ATTR_NAME_IDX_MAP)
+    attr_name_idx_map[EXTRA_ATTR_NAME] = len(attr_name_idx_map)
+    mn = _make_note_config(attr_name_idx_map=attr_name_idx_map, attr_val_cast_map={'amplitude': int})
+    note_sequence = _note_sequence(mn)
+    note_sequence.set_column(EXTRA_ATTR_NAME, 0.5)
+    lines = CSoundScoreFormatter.for_note_config(mn).format_lines(note_sequence.note_attr_vals)
+    # Notes can only format additional attributes that have a formatter, so build the expected line here
+    pitch_to_str = csound_note.pitch_to_str(csound_note.DEFAULT_PITCH_PRECISION)
+    for line, note in zip(lines, note_sequence):
+        assert isinstance(note.amplitude, int)
+        assert line == (f'i {note.instrument} {note.start:.5f} {note.duration:.5f} {note.amplitude} '
+                        f'{pitch_to_str(note.pitch)} 0.5')
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
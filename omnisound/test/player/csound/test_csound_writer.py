@@ -0,0 +1,106 @@
+# Copyright 2020 Mark S. Weiss
+
+from io import StringIO
+from pathlib import Path
+
+import pytest
+
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.song import Song
+from omnisound.src.container.track import Track
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.player.csound.csound_writer import CSoundScoreStreamWriter, CSoundWriter
+import omnisound.src.note.adapter.csound_note as csound_note
+
+NUM_MEASURES = 5
+NUM_NOTES = 4
+CHUNK_NUM_LINES = 7
+INCLUDE_FILE_NAME = 'instruments.sco'
+HEADER_LINE = 'f 1 0 8192 10 1'
+
+
+class CountingStream(StringIO):
+    def __init__(self):
+        super(CountingStream, self).__init__()
+        self.num_writes = 0
+
+    def write(self, s: str) -> int:
+        self.num_writes += 1
+        return super(CountingStream, self).write(s)
+
+
+@pytest.fixture
+def make_note_config():
+    return MakeNoteConfig(cls_name=csound_note.CLASS_NAME,
+                          num_attributes=csound_note.NUM_ATTRIBUTES,
+                          make_note=csound_note.make_note,
+                          pitch_for_key=csound_note.pitch_for_key,
+                          attr_name_idx_map=csound_note.ATTR_NAME_IDX_MAP,
+                          attr_val_default_map={'instrument': 1, 'duration': 0.25, 'amplitude': 100.0,
+                                                'pitch': 4.01},
+                          attr_val_cast_map={})
+
+
+def _measures(mn):
+    for i in range(NUM_MEASURES):
+        measure = Measure(num_notes=NUM_NOTES, mn=mn)
+        measure.set_column('start', [i + j * 0.25 for j in range(NUM_NOTES)])
+        yield measure
+
+
+def test_stream_writer(make_note_config):
+    expected_lines = [f'#include "{INCLUDE_FILE_NAME}"', HEADER_LINE] + \
+        [str(note) for measure in _measures(make_note_config) for note in measure]
+
+    out = CountingStream()
+    with CSoundScoreStreamWriter(out=out,
+                                 include_file_names=[INCLUDE_FILE_NAME],
+                                 header_lines=[HEADER_LINE],
+                                 chunk_num_lines=CHUNK_NUM_LINES) as stream_writer:
+        # Measures are consumed from a generator and written in chunks, not all at once
+        stream_writer.write_measures(_measures(make_note_config))
+        assert 0 < stream_writer.num_lines_written < len(expected_lines)
+    assert out.getvalue() == ''.join(f'{line}\n' for line in expected_lines)
+    assert stream_writer.num_lines_written == len(expected_lines)
+    assert out.num_writes > 1
+
+
+def test_csound_writer_stream_write(make_note_config):
+    song = Song(to_add=[Track(to_add=list(_measures(make_note_config))),
+                        Track(to_add=list(_measures(make_note_config)))])
+    writer = CSoundWriter(song=song, out_file_path=Path('out.wav'), score_file_path=Path('score.sco'),
+                          orchestra_file_path=Path('orchestra.orc'), streaming=True)
+    writer.add_score_include_file(INCLUDE_FILE_NAME)
+    out = StringIO()
+    num_lines = writer.stream_write(out=out, chunk_num_lines=CHUNK_NUM_LINES)
+    assert num_lines == 1 + 2 * NUM_MEASURES * NUM_NOTES
+    # Same lines as the in-memory score, without the blank lines `write()` puts between them
+    assert out.getvalue() == ''.join(writer.generate())
+
+
+
+def test_csound_writer_generate_contiguous(make_note_config):
+    def _writer(contiguous: bool) -> CSoundWriter:
+        return CSoundWriter(song=Song(to_add=[Track(to_add=list(_measures(make_note_config)), contiguous=contiguous)]),
+                            out_file_path=Path('out.wav'), score_file_path=Path('score.sco'),
+                            orchestra_file_path=Path('orchestra.orc'))
+
+    # The notes of a contiguous track are formatted at once, with the same lines as formatting each measure
+    assert _writer(contiguous=True).generate() == _writer(contiguous=False).generate()
+
+
+def test_csound_writer_generate_parallel(make_note_config):
+    def _writer(parallel: bool) -> CSoundWriter:
+        song = Song(to_add=[Track(to_add=list(_measures(make_note_config)), contiguous=contiguous)
+                            for contiguous in (False, True, False)])
+        writer = CSoundWriter(song=song, out_file_path=Path('out.wav'), score_file_path=Path('score.sco'),
+                              orchestra_file_path=Path('orchestra.orc'), parallel=parallel, max_workers=2)
+        writer.add_score_include_file(INCLUDE_FILE_NAME)
+        return writer
+
+    # Tracks formatted in worker processes are merged in track order, so the score is the same
+    assert _writer(parallel=True).generate() == _writer(parallel=False).generate()
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
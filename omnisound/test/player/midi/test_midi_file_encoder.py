@@ -0,0 +1,61 @@
+# Copyright 2020 Mark S. Weiss
+
+from io import BytesIO
+
+from mido.midifiles.midifiles import Message, MidiFile, MidiTrack
+from numpy import array as np_array, diff as np_diff
+import pytest
+
+from omnisound.src.player.midi.midi_file_encoder import encode_midi_file, encode_note_events, encode_track_chunk, \
+    MidiFileEncoderException, PROGRAM_CHANGE_STATUS
+
+PROGRAM = 1
+CHANNEL = 2
+# Ticks of events in a track, including deltas that take one, two and three bytes as variable length ints
+TICKS = np_array([0, 0, 100, 100, 300, 20000, 20000, 3000000])
+IS_NOTE_ON = np_array([True, True, False, False, True, True, False, False])
+VELOCITIES = np_array([100, 90, 100, 90, 80, 70, 80, 70])
+PITCHES = np_array([60, 64, 60, 64, 67, 72, 67, 72])
+
+
+def _mido_midi_file_bytes(channel: int) -> bytes:
+    midi_file = MidiFile(type=1)
+    midi_track = MidiTrack()
+    midi_track.append(Message('program_change', program=PROGRAM, time=0))
+    for tick_delta, is_note_on, velocity, pitch in zip(np_diff(TICKS, prepend=0).tolist(), IS_NOTE_ON.tolist(),
+                                                       VELOCITIES.tolist(), PITCHES.tolist()):
+        midi_track.append(Message('note_on' if is_note_on else 'note_off', time=tick_delta,
+                                  velocity=velocity, note=pitch, channel=channel))
+    midi_file.tracks.append(midi_track)
+    midi_file.tracks.append(MidiTrack([Message('program_change', program=PROGRAM, time=0)]))
+    out = BytesIO()
+    midi_file.save(file=out)
+    return out.getvalue()
+
+
+def _encoded_midi_file_bytes(channel: int) -> bytes:
+    note_events = encode_note_events(np_diff(TICKS, prepend=0), IS_NOTE_ON, VELOCITIES, PITCHES, channel,
+                                     running_status=PROGRAM_CHANGE_STATUS)
+    empty_note_events = encode_note_events(np_array([]), np_array([]), np_array([]), np_array([]), channel)
+    return bytes(encode_midi_file([encode_track_chunk(PROGRAM, note_events),
+                                   encode_track_chunk(PROGRAM, empty_note_events)]))
+
+
+def test_encode_midi_file_matches_mido():
+    assert _encoded_midi_file_bytes(CHANNEL) == _mido_midi_file_bytes(CHANNEL)
+    # The channel is the low nibble of the status byte, so 0 leaves the status unchanged
+    assert _encoded_midi_file_bytes(0) == _mido_midi_file_bytes(0)
+
+
+def test_encode_note_events_validates():
+    tick_deltas = np_diff(TICKS, prepend=0)
+    with pytest.raises(MidiFileEncoderException):
+        encode_note_events(tick_deltas, IS_NOTE_ON, VELOCITIES + 100, PITCHES, CHANNEL)
+    with pytest.raises(MidiFileEncoderException):
+        encode_note_events(tick_deltas, IS_NOTE_ON, VELOCITIES, PITCHES, 16)
+    with pytest.raises(MidiFileEncoderException):
+        encode_note_events(-tick_deltas - 1, IS_NOTE_ON, VELOCITIES, PITCHES, CHANNEL)
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
@@ -0,0 +1,201 @@
+# Copyright 2020 Mark S. Weiss
+
+import asyncio
+
+from mido import Message
+from numpy import mean as np_mean, std as np_std
+from numpy.random import default_rng
+import pytest
+
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.track import MidiTrack
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.player.midi.midi_player import get_scheduled_events_for_track, MidiEventScheduler, \
+    MidiEventType, MidiJitterStats, MidiPlayerAppendMode, MidiScheduledEvent, SCHEDULER_SPIN_SECS
+import omnisound.src.note.adapter.midi_note as midi_note
+
+NUM_NOTES = 4
+DUR = float(NoteDur.QUARTER.value)
+PITCH = 60
+VELOCITY = 100
+CHANNEL = 2
+# Event times are shorter than SCHEDULER_SPIN_SECS, so the scheduler only waits on the fake clock and never sleeps
+EVENT_SECS = [0.0, 0.0005, 0.0005, 0.001]
+CLOCK_STEP_SECS = 0.00001
+NUM_JITTER_SAMPLES = 1000
+SEED = 0
+
+
+class _FakeClock:
+    """Advances by a fixed step each time it is read, so waiting on it always ends"""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        self.now += CLOCK_STEP_SECS
+        return self.now
+
+
+class _RecordingPort:
+    def __init__(self, clock: _FakeClock, max_messages: int = None):
+        self.clock = clock
+        self.max_messages = max_messages
+        self.sent = []
+
+    def send(self, message: Message):
+        self.sent.append((self.clock.now, message))
+        if self.max_messages is not None and len(self.sent) == self.max_messages:
+            raise _StopLoop()
+
+
+class _StopLoop(Exception):
+    pass
+
+
+class _RecordingScheduler(MidiEventScheduler):
+    def __init__(self, *args, **kwargs):
+        super(_RecordingScheduler, self).__init__(*args, **kwargs)
+        self.deadlines = []
+
+    async def _wait_until(self, deadline_secs: float):
+        self.deadlines.append(deadline_secs)
+        await super(_RecordingScheduler, self)._wait_until(deadline_secs)
+
+
+@pytest.fixture
+def make_note_config():
+    return MakeNoteConfig(cls_name=midi_note.CLASS_NAME,
+                          num_attributes=midi_note.NUM_ATTRIBUTES,
+                          make_note=midi_note.make_note,
+                          pitch_for_key=midi_note.pitch_for_key,
+                          attr_name_idx_map=midi_note.ATTR_NAME_IDX_MAP,
+                          attr_val_cast_map=midi_note.ATTR_VAL_CAST_MAP)
+
+
+def _track(make_note_config, tempo):
+    meter = Meter(beats_per_measure=4, beat_note_dur=NoteDur.QUARTER, tempo=tempo)
+    measures = []
+    for i in range(2):
+        measure = Measure(meter=meter, num_notes=NUM_NOTES, mn=make_note_config)
+        measure.set_column('time', [j * DUR for j in range(NUM_NOTES)])
+        measure.set_column('duration', DUR)
+        measure.set_column('velocity', VELOCITY)
+        measure.set_column('pitch', [PITCH + i + j for j in range(NUM_NOTES)])
+        measures.append(measure)
+    return MidiTrack(to_add=measures, meter=meter, channel=CHANNEL)
+
+
+def _events():
+    # A note off and a note on due at the same time, created in the opposite order to the order they are sent in
+    messages = [Message('note_on', note=PITCH, velocity=VELOCITY),
+                Message('note_on', note=PITCH + 1, velocity=VELOCITY),
+                Message('note_off', note=PITCH, velocity=VELOCITY),
+                Message('note_off', note=PITCH + 1, velocity=VELOCITY)]
+    return [MidiScheduledEvent(event_secs, message, seq)
+            for seq, (event_secs, message) in enumerate(zip(EVENT_SECS, messages))]
+
+
+@pytest.mark.parametrize('tempo', [240, 120])
+def test_get_scheduled_events_for_track(make_note_config, tempo):
+    track = _track(make_note_config, tempo)
+    meter = track.measure_list[0].meter
+    dur_secs = DUR * meter.beat_note_dur_secs
+    events = get_scheduled_events_for_track(track, MidiPlayerAppendMode.AppendAfterPreviousNote, seq_start=10)
+    assert len(events) == 2 * 2 * NUM_NOTES
+    # Each note starts when the one before it ends
+    assert [event.event_secs for event in events[::2]] == pytest.approx([i * dur_secs for i in range(2 * NUM_NOTES)])
+    assert [event.event_secs for event in events[1::2]] == \
+        pytest.approx([(i + 1) * dur_secs for i in range(2 * NUM_NOTES)])
+    assert [event.message.type for event in events[:2]] == [MidiEventType.NOTE_ON.value, MidiEventType.NOTE_OFF.value]
+    assert {event.message.channel for event in events} == {CHANNEL - 1}
+    assert events[0].sort_key[2] == 10
+
+    # Notes start at their time, offset by the duration of the measures before them
+    events = get_scheduled_events_for_track(track, MidiPlayerAppendMode.AppendAtAbsoluteTime)
+    assert [event.event_secs for event in events[::2]] == \
+        pytest.approx([i * meter.measure_dur_secs + j * dur_secs for i in range(2) for j in range(NUM_NOTES)])
+    # Note ons and note offs are at the same times in seconds as the events of notes written to MIDI files
+    assert [event.event_secs for event in events] == \
+        pytest.approx([i * meter.measure_dur_secs + meter.get_secs_for_note_time((j + k) * DUR)
+                       for i in range(2) for j in range(NUM_NOTES) for k in (0, 1)])
+
+
+def test_scheduler_play_order_and_deadlines():
+    clock = _FakeClock()
+    port = _RecordingPort(clock)
+    scheduler = _RecordingScheduler(events=_events(), port=port, clock=clock)
+    asyncio.run(scheduler.play())
+
+    # At the same time note offs are sent before note ons
+    assert [(message.type, message.note) for _, message in port.sent] == \
+        [('note_on', PITCH), ('note_off', PITCH), ('note_on', PITCH + 1), ('note_off', PITCH + 1)]
+    # Each deadline is from the start of playback, and no event is sent before it is due
+    start_secs = scheduler.deadlines[0]
+    assert scheduler.deadlines == pytest.approx([start_secs + event_secs for event_secs in sorted(EVENT_SECS)])
+    for (sent_secs, _), deadline_secs in zip(port.sent, scheduler.deadlines):
+        assert sent_secs >= deadline_secs
+    assert scheduler.jitter_stats.num_events == len(EVENT_SECS)
+    # Each read of the clock advances it, so events are only ever a few clock steps late
+    assert 0.0 <= scheduler.jitter_stats.max_secs < 10 * CLOCK_STEP_SECS
+
+
+def test_scheduler_loop_advances_start_by_loop_duration():
+    num_loops = 3
+    clock = _FakeClock()
+    port = _RecordingPort(clock, max_messages=num_loops * len(EVENT_SECS))
+    scheduler = _RecordingScheduler(events=_events(), port=port, clock=clock)
+    assert scheduler.loop_duration_secs == max(EVENT_SECS)
+    with pytest.raises(_StopLoop):
+        asyncio.run(scheduler.loop())
+
+    # Each loop starts one loop duration after the one before, however late its last event was sent
+    start_secs = scheduler.deadlines[0]
+    assert scheduler.deadlines == pytest.approx([start_secs + i * scheduler.loop_duration_secs + event_secs
+                                                 for i in range(num_loops) for event_secs in sorted(EVENT_SECS)])
+    assert scheduler.jitter_stats.num_events == num_loops * len(EVENT_SECS)
+
+
+def test_scheduler_loop_without_events_returns():
+    clock = _FakeClock()
+    port = _RecordingPort(clock)
+    scheduler = MidiEventScheduler(events=[], port=port, clock=clock)
+    assert scheduler.loop_duration_secs == 0.0
+    asyncio.run(scheduler.loop())
+    assert not port.sent
+
+
+def test_scheduler_wait_yields_to_other_tasks():
+    clock = _FakeClock()
+    port = _RecordingPort(clock)
+    num_other_task_steps = 0
+
+    async def _other_task():
+        nonlocal num_other_task_steps
+        while not port.sent:
+            num_other_task_steps += 1
+            await asyncio.sleep(0)
+
+    async def _play_with_other_task():
+        events = [MidiScheduledEvent(SCHEDULER_SPIN_SECS / 2, Message('note_on', note=PITCH), 0)]
+        await asyncio.gather(MidiEventScheduler(events=events, port=port, clock=clock).play(), _other_task())
+
+    asyncio.run(_play_with_other_task())
+    # The other task ran while the scheduler waited for the event to be due
+    assert num_other_task_steps > 1
+
+
+def test_jitter_stats():
+    lateness_secs = default_rng(SEED).exponential(0.001, NUM_JITTER_SAMPLES)
+    jitter_stats = MidiJitterStats()
+    assert jitter_stats.std_secs == 0.0
+    for secs in lateness_secs.tolist():
+        jitter_stats.add(secs)
+    assert jitter_stats.num_events == NUM_JITTER_SAMPLES
+    assert jitter_stats.mean_secs == pytest.approx(np_mean(lateness_secs))
+    assert jitter_stats.std_secs == pytest.approx(np_std(lateness_secs))
+    assert jitter_stats.max_secs == lateness_secs.max()
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
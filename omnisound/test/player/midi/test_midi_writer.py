@@ -0,0 +1,113 @@
+# Copyright 2020 Mark S. Weiss
+
+from pathlib import Path
+
+from mido import Message, MidiFile
+import pytest
+
+from omnisound.src.container.measure import Measure
+from omnisound.src.container.song import Song
+from omnisound.src.container.track import MidiTrack
+from omnisound.src.modifier.meter import Meter, NoteDur
+from omnisound.src.note.adapter.note import MakeNoteConfig
+from omnisound.src.player.midi.midi_player import MidiEventType, MidiPlayerAppendMode, MidiPlayerEvent
+from omnisound.src.player.midi.midi_writer import MidiWriter
+import omnisound.src.note.adapter.midi_note as midi_note
+
+NUM_TRACKS = 3
+NUM_MEASURES = 4
+NUM_NOTES = 4
+DUR = float(NoteDur.QUARTER.value)
+PITCH = 60
+
+
+@pytest.fixture
+def make_note_config():
+    return MakeNoteConfig(cls_name=midi_note.CLASS_NAME,
+                          num_attributes=midi_note.NUM_ATTRIBUTES,
+                          make_note=midi_note.make_note,
+                          pitch_for_key=midi_note.pitch_for_key,
+                          attr_name_idx_map=midi_note.ATTR_NAME_IDX_MAP,
+                          attr_val_cast_map=midi_note.ATTR_VAL_CAST_MAP)
+
+
+def _song(mn) -> Song:
+    meter = Meter(beats_per_measure=4, beat_note_dur=NoteDur.QUARTER, tempo=120)
+    tracks = []
+    for track_idx in range(NUM_TRACKS):
+        measures = []
+        for i in range(NUM_MEASURES):
+            measure = Measure(meter=meter, num_notes=NUM_NOTES, mn=mn)
+            measure.set_column('time', [i + j * DUR for j in range(NUM_NOTES)])
+            measure.set_column('duration', DUR)
+            measure.set_column('velocity', 100)
+            measure.set_column('pitch', [PITCH + track_idx + j for j in range(NUM_NOTES)])
+            measures.append(measure)
+        tracks.append(MidiTrack(to_add=measures, meter=meter, channel=track_idx + 1, instrument=track_idx,
+                                contiguous=bool(track_idx % 2)))
+    # An empty track has no events
+    tracks.append(MidiTrack(meter=meter, channel=NUM_TRACKS + 1, instrument=NUM_TRACKS))
+    return Song(to_add=tracks, meter=meter)
+
+
+def _expected_messages(track: MidiTrack):
+    """The messages the mido path built for a Track before events were built as columns, from a `MidiPlayerEvent`
+       for each note on and note off, ordered by tick"""
+    event_list = []
+    for measure in track.measure_list:
+        for note in measure:
+            event_list.append(MidiPlayerEvent(note, measure, MidiEventType.NOTE_ON))
+            event_list.append(MidiPlayerEvent(note, measure, MidiEventType.NOTE_OFF))
+    MidiPlayerEvent.set_tick_deltas(event_list)
+    return [Message(event.event_type.value, time=event.tick_delta,
+                    velocity=midi_note.ATTR_VAL_CAST_MAP['velocity'](event.note.amplitude),
+                    note=midi_note.ATTR_VAL_CAST_MAP['pitch'](event.note.pitch),
+                    channel=track.channel - 1)
+            for event in event_list]
+
+
+def test_write_tracks(tmp_path, make_note_config):
+    song = Song(to_add=_song(make_note_config).track_list[:2])
+    writer = MidiWriter(song=song, append_mode=MidiPlayerAppendMode.AppendAfterPreviousNote,
+                        midi_file_path=tmp_path / 'song.mid')
+    writer.generate_and_write()
+
+    midi_file = MidiFile(str(tmp_path / 'song.mid'))
+    assert len(midi_file.tracks) == 2
+    for track_idx, (midi_track, track) in enumerate(zip(midi_file.tracks, song)):
+        assert midi_track[0].type == 'program_change'
+        assert midi_track[0].program == track.instrument
+        note_messages = [message for message in midi_track if message.type in ('note_on', 'note_off')]
+        # Each track has only its own notes, on its own channel
+        assert len(note_messages) == 2 * NUM_MEASURES * NUM_NOTES
+        assert {message.channel for message in note_messages} == {track_idx}
+        assert {message.note for message in note_messages} == \
+            {PITCH + track_idx + j for j in range(NUM_NOTES)}
+        # Ticks are the same as the mido path
+        assert note_messages == _expected_messages(track)
+        assert list(writer.track_events_list[track_idx].messages()) == _expected_messages(track)
+
+
+def _writer(mn, parallel: bool) -> MidiWriter:
+    return MidiWriter(song=_song(mn), append_mode=MidiPlayerAppendMode.AppendAfterPreviousNote,
+                      midi_file_path=Path('song.mid'), direct_encode=True, parallel=parallel, max_workers=2)
+
+
+def test_generate_parallel(make_note_config):
+    serial_writer = _writer(make_note_config, parallel=False)
+    parallel_writer = _writer(make_note_config, parallel=True)
+    serial_events_list = serial_writer.generate()
+    parallel_events_list = parallel_writer.generate()
+
+    # Events built in worker processes are returned in track order and are the same as building them serially
+    assert len(parallel_events_list) == NUM_TRACKS + 1
+    for parallel_events, serial_events in zip(parallel_events_list, serial_events_list):
+        assert parallel_events.ticks.tolist() == serial_events.ticks.tolist()
+        assert parallel_events.pitches.tolist() == serial_events.pitches.tolist()
+        assert parallel_events.channel == serial_events.channel
+    assert not len(parallel_events_list[-1])
+    assert parallel_writer.encode() == serial_writer.encode()
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
@@ -0,0 +1,40 @@
+# Copyright 2020 Mark S. Weiss
+
+from pathlib import Path
+import subprocess
+import sys
+
+import pytest
+
+# Core modules, which must be importable without loading any test dependency or sound backend
+CORE_MODULES = [
+    'omnisound.src.container.song',
+    'omnisound.src.generator.sequencer.sequencer',
+    'omnisound.src.player.midi.midi_player',
+    'omnisound.src.player.midi.midi_writer',
+    'omnisound.src.player.csound.csound_player',
+    'omnisound.src.player.csound.csound_writer',
+    'omnisound.src.player.supercollider.foxdot_supercollider_player',
+]
+# Packages that are only imported when they are used, e.g. when a player connects to a port or plays
+LAZY_MODULES = ['pytest', 'mido', 'ctcsound', 'FoxDot', 'PySimpleGUI']
+REPO_ROOT = Path(__file__).parents[2]
+
+
+def _modules_loaded_by_import(module_name: str):
+    # Import in a new interpreter, because this one has already imported pytest and likely the other modules
+    script = (f'import sys\n'
+              f'import {module_name}\n'
+              f'print(" ".join(m for m in {LAZY_MODULES!r} if m in sys.modules))\n')
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True,
+                            cwd=REPO_ROOT)
+    return result.stdout.split()
+
+
+@pytest.mark.parametrize('module_name', CORE_MODULES)
+def test_core_module_does_not_import_lazy_modules(module_name):
+    assert _modules_loaded_by_import(module_name) == []
+
+
+if __name__ == '__main__':
+    pytest.main(['-xrf'])
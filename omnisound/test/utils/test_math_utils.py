@@ -2,7 +2,9 @@
 
 import pytest
 
-from omnisound.src.utils.math_utils import sign
+from math import inf
+
+from omnisound.src.utils.math_utils import approx_equal, sign
 
 
 def test_sign():
@@ -10,5 +12,30 @@ def test_sign():
         assert sign() in {1, -1}
 
 
+def test_approx_equal():
+    assert approx_equal(1.0, 1.0)
+    assert approx_equal(0.1 + 0.2, 0.3)
+    assert approx_equal(1.0 + 1e-7, 1.0)
+    assert not approx_equal(1.0 + 1e-5, 1.0)
+    # Tolerance is relative to the expected value
+    assert approx_equal(1000000.5, 1000000.0)
+    assert not approx_equal(1.5, 1.0)
+    # Near zero the absolute tolerance applies
+    assert approx_equal(1e-13, 0.0)
+    assert not approx_equal(1e-11, 0.0)
+
+
+def test_approx_equal_tolerances():
+    assert approx_equal(1.05, 1.0, rel_tol=0.1)
+    assert not approx_equal(1.05, 1.0, rel_tol=0.01)
+    assert approx_equal(0.05, 0.0, abs_tol=0.1)
+
+
+def test_approx_equal_matches_pytest_approx():
+    for actual, expected in ((1.0, 1.0), (1.0000001, 1.0), (1.00001, 1.0), (0.0, 1e-13), (0.0, 1e-11),
+                             (inf, inf), (1e300, inf), (-inf, inf), (3, 3.0000001)):
+        assert approx_equal(actual, expected) == (actual == pytest.approx(expected))
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])
@@ -1,10 +1,19 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import threading
+
 import pytest
 
-from omnisound.src.utils.validation_utils import (validate_not_falsey, validate_not_none,
+from omnisound.src.utils.validation_utils import (get_validation_policy, is_validating, set_validation_policy,
+                                                  trusted, validate_not_falsey, validate_not_none,
                                                   validate_optional_sequence_of_type, validate_optional_type,
                                                   validate_optional_types, validate_sequence_of_type,
-                                                  validate_sequence_of_type_choice, validate_type_choice,
-                                                  validate_type_reference, validate_type_reference_choice)
+                                                  validate_sequence_of_type_choice, validate_type,
+                                                  validate_type_choice, validate_type_reference,
+                                                  validate_type_reference_choice, validation_policy,
+                                                  ValidationPolicy, VALIDATION_POLICY_ENV_VAR)
 
 
 ARG_NAME = 'arg'
@@ -230,5 +239,77 @@ def test_validate_not_falsey():
         validate_not_falsey(arg_name, set())
 
 
+def test_validation_policy_strict():
+    with validation_policy(ValidationPolicy.STRICT):
+        assert is_validating()
+        with trusted():
+            assert is_validating()
+            with pytest.raises(ValueError):
+                validate_type(ARG_NAME, 'NOT_AN_INT', int)
+
+
+def test_validation_policy_boundary():
+    with validation_policy(ValidationPolicy.BOUNDARY):
+        # Calls outside a trusted block are validated
+        assert is_validating()
+        with pytest.raises(ValueError):
+            validate_type(ARG_NAME, 'NOT_AN_INT', int)
+        # Calls inside a trusted block, including nested blocks, are not
+        with trusted():
+            assert not is_validating()
+            assert validate_type(ARG_NAME, 'NOT_AN_INT', int)
+            assert validate_sequence_of_type(ARG_NAME, ['NOT_AN_INT'], int)
+            assert validate_not_none(ARG_NAME, None)
+            with trusted():
+                assert not is_validating()
+            assert not is_validating()
+        assert is_validating()
+
+
+def test_validation_policy_off():
+    with validation_policy(ValidationPolicy.OFF):
+        assert not is_validating()
+        assert validate_type(ARG_NAME, 'NOT_AN_INT', int)
+        assert validate_optional_types((ARG_NAME, 'NOT_AN_INT', int))
+        assert validate_not_falsey(ARG_NAME, [])
+        # Choice validators still return the matched type, because callers use it, but don't raise if none matches
+        assert validate_type_choice(ARG_NAME, 1.0, (int, float)) == (True, float)
+        assert validate_type_choice(ARG_NAME, 'NOT_A_NUMBER', (int, float)) == (False, None)
+
+
+def test_validation_policy_context_manager_restores_policy():
+    prev_policy = get_validation_policy()
+    with pytest.raises(RuntimeError):
+        with validation_policy(ValidationPolicy.OFF):
+            assert get_validation_policy() is ValidationPolicy.OFF
+            raise RuntimeError()
+    assert get_validation_policy() is prev_policy
+
+    with pytest.raises(ValueError):
+        set_validation_policy('off')
+    assert get_validation_policy() is prev_policy
+
+
+def test_trusted_is_per_thread():
+    other_thread_is_validating = []
+    thread = threading.Thread(target=lambda: other_thread_is_validating.append(is_validating()))
+    with validation_policy(ValidationPolicy.BOUNDARY):
+        with trusted():
+            thread.start()
+            thread.join()
+    assert other_thread_is_validating == [True]
+
+
+@pytest.mark.parametrize('policy', list(ValidationPolicy))
+def test_validation_policy_from_env_var(policy):
+    env = dict(os.environ)
+    env[VALIDATION_POLICY_ENV_VAR] = policy.value.upper()
+    script = ('from omnisound.src.utils.validation_utils import get_validation_policy\n'
+              'print(get_validation_policy().value)\n')
+    result = subprocess.run([sys.executable, '-c', script], capture_output=True, text=True, check=True, env=env,
+                            cwd=Path(__file__).parents[3])
+    assert result.stdout.strip() == policy.value
+
+
 if __name__ == '__main__':
     pytest.main(['-xrf'])